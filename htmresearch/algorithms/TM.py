@@ -28,6 +28,16 @@ VERBOSITY = 0
 # The numpy equivalent to the floating point type used by NTA
 dtype = nupic.math.GetNTAReal()
 
+
+
+def _noCells():
+  """
+  Return an empty array of flat cell indices.
+  """
+  return numpy.zeros(0, dtype="intp")
+
+
+
 class TM(ConsolePrinterMixin):
 
   """
@@ -165,6 +175,14 @@ class TM(ConsolePrinterMixin):
     self.colConfidence["t"] = numpy.zeros(self.numberOfCols, dtype="float32")
     self.colConfidence["t-1"] = numpy.zeros(self.numberOfCols, dtype="float32")
 
+    # Sorted flat indices (col * cellsPerColumn + cell) of the cells that are
+    # on in activeState, predictedState and learnState. The confidence is only
+    # nonzero for predicted cells. Advancing a time step swaps the "t" and "t-1"
+    # arrays and only clears these cells, rather than copying whole arrays.
+    self.activeCells = {"t": _noCells(), "t-1": _noCells()}
+    self.predictedCells = {"t": _noCells(), "t-1": _noCells()}
+    self.learnCells = {"t": _noCells(), "t-1": _noCells()}
+
     # Cells are indexed by column and index in the column
     # Every self.cells[column][index] contains a list of segments
     # Each segment is a structure of class Segment
@@ -207,6 +225,8 @@ class TM(ConsolePrinterMixin):
       'segmentUpdates',
       '_internalStats',
       '_stats',
+      '_segmentArrays',
+      '_predictionBuffers',
       ]
 
   #############################################################################
@@ -223,6 +243,13 @@ class TM(ConsolePrinterMixin):
 
     self.sequenceSignatures = []
 
+    # Flat arrays of the segments in self.cells, rebuilt from them as needed.
+    self._segmentArrays = SegmentArrays(self)
+
+    # Scratch predictedState and confidence arrays for predict, allocated on
+    # first use.
+    self._predictionBuffers = None
+
     # Allocate and reset all stats
     self.resetStats()
 
@@ -256,6 +283,9 @@ class TM(ConsolePrinterMixin):
     self._random = pickle.loads(self._random)  # Must be done manually
     self._initEphemerals()
 
+    if "activeCells" not in state:
+      self.updateCellsFromState()
+
 
   ###########################################################################
   def __getattr__(self, name):
@@ -320,6 +350,9 @@ class TM(ConsolePrinterMixin):
     self.learnState['t'].fill(0)
     self.confidence['t-1'].fill(0)
     self.confidence['t'].fill(0)
+    for cells in (self.activeCells, self.predictedCells, self.learnCells):
+      cells['t'] = _noCells()
+      cells['t-1'] = _noCells()
 
     # Flush the segment update queue
     self.segmentUpdates = {}
@@ -924,16 +957,17 @@ class TM(ConsolePrinterMixin):
   def predict(self, nSteps):
     """
     This function gives the future predictions for <nSteps> timesteps starting
-    from the current TP state. The TP is returned to its original state at the
-    end before returning.
+    from the current TP state. The TP state is left unchanged.
+
+    Loop for nSteps
+       a) Set the predicted cells as the next step's active cells. This step
+          in learn and infer methods use input here to correct the predictions.
+          We don't use any input here.
+       b) Turn-on with lateral support from the current active cells
 
-    1) We save the TP state.
-    2) Loop for nSteps
-          a) Turn-on with lateral support from the current active cells
-          b) Set the predicted cells as the next step's active cells. This step
-             in learn and infer methods use input here to correct the predictions.
-             We don't use any input here.
-    3) Revert back the TP state to the time before prediction
+    The predicted state and confidence of each step are written to scratch
+    arrays, and the TP state is only read, so there is no state to save and
+    revert.
 
     Parameters:
     --------------------------------------------
@@ -945,47 +979,54 @@ class TM(ConsolePrinterMixin):
 
     """
 
-    # Save the TP dynamic state, we will use to revert back in the end
-    pristineTPDynamicState = self._getTPDynamicState()
-
     assert (nSteps>0)
 
     # multiStepColumnPredictions holds all the future prediction.
     multiStepColumnPredictions = numpy.zeros((nSteps, self.numberOfCols),
                                              dtype="float32")
 
-    # This is a (nSteps-1)+half loop. Phase 2 in both learn and infer methods
-    # already predicts for timestep (t+1). We use that prediction for free and save
-    # the half-a-loop of work.
-
-    step = 0
-    while True:
-
-      # We get the prediction for the columns in the next time step from
-      # the topDownCompute method. It internally uses confidences.
-      multiStepColumnPredictions[step,:] = self.topDownCompute()
-
-      # Cleanest way in python to handle one and half loops
-      if step == nSteps-1:
-        break
-      step += 1
-
-      # Copy t-1 into t
-      self.activeState['t-1'][:,:] = self.activeState['t'][:,:]
-      self.predictedState['t-1'][:,:] = self.predictedState['t'][:,:]
-      self.confidence['t-1'][:,:] = self.confidence['t'][:,:]
+    # Phase 2 in both learn and infer methods already predicts for timestep
+    # (t+1). We use that prediction for free.
+    multiStepColumnPredictions[0,:] = self.topDownCompute()
 
-      # Predicted state at "t-1" becomes the active state at "t"
-      self.activeState['t'][:,:] = self.predictedState['t-1'][:,:]
+    if nSteps == 1:
+      return multiStepColumnPredictions
 
-      # Predicted state and confidence are set in phase2.
-      self.predictedState['t'].fill(0)
-      self.confidence['t'].fill(0.0)
-      self.computePhase2(doLearn=False)
+    # Phase 2 below reads the active state at t and writes the predicted state
+    # and confidence at t. Point those at the scratch arrays; the predicted
+    # state of each step is the active state of the next one.
+    activeState = self.activeState
+    predictedState = self.predictedState
+    confidence = self.confidence
+    predictedCells = self.predictedCells
 
-    # Revert the dynamic state to the saved state
-    self._setTPDynamicState(pristineTPDynamicState)
+    (self.predictedState, self.confidence,
+     self.predictedCells) = self._getPredictionBuffers()
 
+    try:
+      lastPredictedState = predictedState['t']
+      for step in xrange(1, nSteps):
+        self._shiftStates(self.predictedCells, self.predictedState,
+                          self.confidence)
+
+        # Predicted state at "t-1" becomes the active state at "t"
+        self.activeState = {'t': lastPredictedState}
+        self.computePhase2(doLearn=False)
+
+        multiStepColumnPredictions[step,:] = self.topDownCompute()
+        lastPredictedState = self.predictedState['t']
+
+    finally:
+      # Leave the scratch arrays cleared for the next call
+      for timeStep in ('t', 't-1'):
+        self.predictedState[timeStep].flat[self.predictedCells[timeStep]] = 0
+        self.confidence[timeStep].flat[self.predictedCells[timeStep]] = 0
+        self.predictedCells[timeStep] = _noCells()
+
+      self.activeState = activeState
+      self.predictedState = predictedState
+      self.confidence = confidence
+      self.predictedCells = predictedCells
 
     return multiStepColumnPredictions
 
@@ -1002,7 +1043,10 @@ class TM(ConsolePrinterMixin):
     return ["activeState",
             "learnState",
             "predictedState",
-            "confidence"]
+            "confidence",
+            "activeCells",
+            "predictedCells",
+            "learnCells"]
 
   #############################################################################
   def _getTPDynamicState(self,):
@@ -1032,6 +1076,77 @@ class TM(ConsolePrinterMixin):
       self.__dict__[variableName] = tpDynamicState.pop(variableName)
 
 
+  #############################################################################
+  def _getPredictionBuffers(self):
+    """
+    Return the scratch (predictedState, confidence, predictedCells) dicts used
+    by predict. Their arrays are all zeros between calls.
+    """
+    if self._predictionBuffers is None:
+      stateShape = (self.numberOfCols, self.cellsPerColumn)
+      self._predictionBuffers = (
+        {"t": numpy.zeros(stateShape, dtype="int8"),
+         "t-1": numpy.zeros(stateShape, dtype="int8")},
+        {"t": numpy.zeros(stateShape, dtype="float32"),
+         "t-1": numpy.zeros(stateShape, dtype="float32")},
+        {"t": _noCells(), "t-1": _noCells()})
+
+    return self._predictionBuffers
+
+
+  #############################################################################
+  def _shiftStates(self, cells, *states):
+    """
+    Move to the next time step: the arrays at "t" become the arrays at "t-1",
+    and the old arrays at "t-1" are cleared and reused for "t".
+
+    @param cells (dict)
+    The cells that are on in the states, e.g. self.activeCells. Only these
+    cells are cleared.
+
+    @param states (dicts)
+    The states to shift, e.g. self.activeState
+    """
+    for state in states:
+      state['t'], state['t-1'] = state['t-1'], state['t']
+      state['t'].flat[cells['t-1']] = 0
+
+    cells['t-1'] = cells['t']
+    cells['t'] = _noCells()
+
+
+  #############################################################################
+  def _getCellsInColumns(self, state, columns):
+    """
+    Return the sorted flat indices of the cells that are on in the given
+    columns of a state array.
+
+    @param state (numpy array)
+    A (numberOfCols, cellsPerColumn) array of cell states
+
+    @param columns (numpy array)
+    Sorted column indices
+    """
+    cells = numpy.flatnonzero(state[columns])
+    return (columns[cells // self.cellsPerColumn] * self.cellsPerColumn +
+            cells % self.cellsPerColumn)
+
+
+  #############################################################################
+  def updateCellsFromState(self):
+    """
+    Recompute activeCells, predictedCells and learnCells from the state arrays.
+    Call this after writing to the state arrays directly.
+    """
+    def getCells(state):
+      return {"t": numpy.flatnonzero(state["t"]),
+              "t-1": numpy.flatnonzero(state["t-1"])}
+
+    self.activeCells = getCells(self.activeState)
+    self.predictedCells = getCells(self.predictedState)
+    self.learnCells = getCells(self.learnState)
+
+
   #############################################################################
   def computePhase2(self, doLearn=False):
     """
@@ -1051,32 +1166,37 @@ class TM(ConsolePrinterMixin):
     #   for reinforcement,
     # - if pooling is on, try to find the best weakly activated segment to
     #   reinforce it, else create a new pooling segment.
-    for c in xrange(self.numberOfCols):
+    # The activity of every segment is computed at once from the segment
+    # arrays. Only the active segments are visited, in the same order as
+    # looping over the columns, cells and segments.
+    (segments, segmentColumns, segmentCells,
+     activity) = self._segmentArrays.computeActivity(self.activeState['t'],
+                                                     connectedSynapsesOnly=True)
 
-      buPredicted = False # whether any cell in the column is predicted
-      for i in xrange(self.cellsPerColumn):
-        # Iterate over each of the segments of this cell
-        maxConfidence = 0
-        for s in self.cells[c][i]:
+    activeSegments = numpy.flatnonzero(activity >= self.activationThreshold)
 
-          # sum(connected synapses) >= activationThreshold?
-          if self.isSegmentActive(s, self.activeState['t']):
+    self.predictedCells['t'] = numpy.union1d(
+      self.predictedCells['t'],
+      segmentColumns[activeSegments] * self.cellsPerColumn +
+      segmentCells[activeSegments])
 
-            self.predictedState['t'][c,i] = 1
-            buPredicted = True
-            maxConfidence = max(maxConfidence, s.dutyCycle(readOnly=True))
+    for s in activeSegments:
+      c, i, segment = int(segmentColumns[s]), int(segmentCells[s]), segments[s]
 
-            if doLearn:
-              s.totalActivations += 1    # increment activationFrequency
-              s.lastActiveIteration = self.iterationIdx
-              # mark this segment for learning
-              activeUpdate = self.getSegmentActiveSynapses(c,i,s,'t')
-              activeUpdate.phase1Flag = False
-              self.addToSegmentUpdates(c, i, activeUpdate)
+      self.predictedState['t'][c,i] = 1
 
-        # Store the max confidence seen among all the weak and strong segments
-        #  as the cell's confidence.
-        self.confidence['t'][c,i] = maxConfidence
+      # Store the max confidence seen among all the weak and strong segments
+      #  as the cell's confidence.
+      self.confidence['t'][c,i] = max(self.confidence['t'][c,i],
+                                      segment.dutyCycle(readOnly=True))
+
+      if doLearn:
+        segment.totalActivations += 1    # increment activationFrequency
+        segment.lastActiveIteration = self.iterationIdx
+        # mark this segment for learning
+        activeUpdate = self.getSegmentActiveSynapses(c,i,segment,'t')
+        activeUpdate.phase1Flag = False
+        self.addToSegmentUpdates(c, i, activeUpdate)
 
 
   def compute(self, bottomUpInput, enableLearn, computeInfOutput=None):
@@ -1126,14 +1246,11 @@ class TM(ConsolePrinterMixin):
       print "\n==== Iteration: %d =====" % (self.iterationIdx)
       print "Active cols:", bottomUpInput.nonzero()[0]
 
-    # Copy t into t-1
-    # Don't need to copy learnState, which is not used in inference
-    self.activeState['t-1'][:,:] = self.activeState['t'][:,:]
-    self.predictedState['t-1'][:,:] = self.predictedState['t'][:,:]
-    self.confidence['t-1'][:,:] = self.confidence['t'][:,:]
-    self.activeState['t'].fill(0)
-    self.predictedState['t'].fill(0)
-    self.confidence['t'].fill(0.0)
+    # Shift t into t-1
+    # Don't need to shift learnState, which is not used in inference
+    self._shiftStates(self.activeCells, self.activeState)
+    self._shiftStates(self.predictedCells, self.predictedState,
+                      self.confidence)
 
     # Phase 1: calculate current state for each cell
     # For each column (winning in the SP):
@@ -1155,6 +1272,9 @@ class TM(ConsolePrinterMixin):
       if not buPredicted:
         self.activeState['t'][c,:] = 1 # whole column bursts
 
+    self.activeCells['t'] = self._getCellsInColumns(self.activeState['t'],
+                                                    activeColumns)
+
     # Phase 2: calculate predictive output for each cell
     # A cell turns on its predictedState if any of its segments
     # has enough horizontal connections currently firing due to
@@ -1221,16 +1341,12 @@ class TM(ConsolePrinterMixin):
           print 'timeStamp:', vv[0],
           print '/ src cells:', vv[1].activeSynapses
 
-    # Copy t into t-1
-    # This time also copy over learnState.
-    self.activeState['t-1'][:,:] = self.activeState['t'][:,:]
-    self.activeState['t'].fill(0)
-    self.predictedState['t-1'][:,:] = self.predictedState['t'][:,:]
-    self.predictedState['t'].fill(0)
-    self.learnState['t-1'][:,:] = self.learnState['t'][:,:]
-    self.learnState['t'][:,:] = 0
-    self.confidence['t-1'][:,:] = self.confidence['t'][:,:]
-    self.confidence['t'].fill(0.0)
+    # Shift t into t-1
+    # This time also shift learnState.
+    self._shiftStates(self.activeCells, self.activeState)
+    self._shiftStates(self.predictedCells, self.predictedState,
+                      self.confidence)
+    self._shiftStates(self.learnCells, self.learnState)
 
     # Update segment duty cycles if we are crossing a "tier"
     # We determine if it's time to update the segment duty cycles. Since the
@@ -1306,6 +1422,11 @@ class TM(ConsolePrinterMixin):
         segUpdate.phase1Flag = True
         self.addToSegmentUpdates(c, i, segUpdate)
 
+    self.activeCells['t'] = self._getCellsInColumns(self.activeState['t'],
+                                                    activeColumns)
+    self.learnCells['t'] = self._getCellsInColumns(self.learnState['t'],
+                                                   activeColumns)
+
     # ----------------------------------------------------------------------
     # Phase 2: compute predicted state for each cell
     # - if a segment has enough horizontal connections firing because of
@@ -1333,7 +1454,7 @@ class TM(ConsolePrinterMixin):
 
         segsToDel = [] # collect and remove outside the loop
         for segment in self.cells[c][i]:
-          age = self.iterationIdx - segment[0][self.kSegLastActiveIteration]
+          age = self.iterationIdx - segment.lastActiveIteration
           if age <= self.maxAge:
             continue
 
@@ -1356,6 +1477,9 @@ class TM(ConsolePrinterMixin):
           self.cleanUpdatesList(c,i,seg)
           self.cells[c][i].remove(seg)
 
+        if len(self.cells[c][i]) > 0 or len(segsToDel) > 0:
+          self._segmentArrays.markColumnChanged(c)
+
 
     # Update the prediction score stats
     # Learning always includes inference
@@ -1470,6 +1594,9 @@ class TM(ConsolePrinterMixin):
       self.cells[colIdx][cellIdx].remove(seg)
       nSynsRemoved += len(seg.syns)
 
+    if nSegsRemoved > 0 or nSynsRemoved > 0:
+      self._segmentArrays.markColumnChanged(colIdx)
+
     return nSegsRemoved, nSynsRemoved
 
 
@@ -1743,23 +1870,12 @@ class TM(ConsolePrinterMixin):
 
     # todo: put back preference for sequence segments.
 
-    nSegments = len(self.cells[c][i])
-
-    bestActivation = self.activationThreshold
-    which = -1
-
-    for j,s in enumerate(self.cells[c][i]):
-
-      activity = self.getSegmentActivityLevel(s, self.activeState[timeStep], connectedSynapsesOnly = True)
+    segments, activity = self._getCellSegmentActivity(
+      c, i, self.activeState[timeStep], connectedSynapsesOnly=True)
 
-      if activity >= bestActivation:
-        bestActivation = activity
-        which = j
-
-    if which != -1:
-      return self.cells[c][i][which]
-    else:
-      return None
+    # Ties go to the last segment
+    return self._getLastMostActiveSegment(segments, activity,
+                                          self.activationThreshold)
 
 
   ##############################################################################
@@ -1775,9 +1891,9 @@ class TM(ConsolePrinterMixin):
     tmpCandidates = [] # tmp because we'll refine just below with activeSynapses
 
     if timeStep == 't-1':
-      tmpCandidates = numpy.where(self.learnState['t-1'] == 1)
+      tmpCandidates = divmod(self.learnCells['t-1'], self.cellsPerColumn)
     else:
-      tmpCandidates = numpy.where(self.learnState['t'] == 1)
+      tmpCandidates = divmod(self.learnCells['t'], self.cellsPerColumn)
 
     # Candidates can be empty at this point, in which case we return
     # an empty segment list. adaptSegments will do nothing when getting
@@ -1815,21 +1931,26 @@ class TM(ConsolePrinterMixin):
     bestSegIdxInCol = -1
     bestCellInCol = -1
 
-    for i in xrange(self.cellsPerColumn):
-
-      maxSegActivity = 0
-      maxSegIdx = 0
+    (segments, _, segmentCells,
+     activity) = self._segmentArrays.computeColumnActivity(
+       c, activeState, connectedSynapsesOnly=False)
+    cellStarts = numpy.searchsorted(segmentCells,
+                                    numpy.arange(self.cellsPerColumn + 1))
 
-      for j,s in enumerate(self.cells[c][i]):
+    for i in xrange(self.cellsPerColumn):
 
-        activity = self.getSegmentActivityLevel(s, activeState, connectedSynapsesOnly =False)
+      cellActivity = activity[cellStarts[i]:cellStarts[i+1]]
 
-        if self.verbosity >= 6:
-          print " Segment Activity for column ", c, " cell ", i, " segment ", " j is ", activity
+      if self.verbosity >= 6:
+        for j, segActivity in enumerate(cellActivity):
+          print " Segment Activity for column ", c, " cell ", i, " segment ", " j is ", segActivity
 
-        if activity > maxSegActivity:
-          maxSegActivity = activity
-          maxSegIdx = j
+      # Ties go to the first segment
+      maxSegActivity = 0
+      maxSegIdx = 0
+      if len(cellActivity) > 0 and cellActivity.max() > 0:
+        maxSegIdx = cellActivity.argmax()
+        maxSegActivity = cellActivity[maxSegIdx]
 
       if maxSegActivity >= bestActivityInCol:
         bestActivityInCol = maxSegActivity
@@ -1852,19 +1973,39 @@ class TM(ConsolePrinterMixin):
     above minThreshold. The routine returns the segment index. If no segments are
     found, then an index of -1 is returned.
     """
-    maxActivity, which = self.minThreshold, -1
+    segments, activity = self._getCellSegmentActivity(
+      c, i, activeState, connectedSynapsesOnly=False)
 
-    for j,s in enumerate(self.cells[c][i]):
-      activity = self.getSegmentActivityLevel(s, activeState,
-                                              connectedSynapsesOnly=False)
+    # Ties go to the last segment
+    return self._getLastMostActiveSegment(segments, activity,
+                                          self.minThreshold)
 
-      if activity >= maxActivity:
-        maxActivity, which = activity, j
 
-    if which == -1:
+  #############################################################################
+  def _getCellSegmentActivity(self, c, i, activeState, connectedSynapsesOnly):
+    """Compute the activity level of each segment of cell (c,i), using the
+    segment arrays.
+
+    Returns the cell's segments and their activity levels.
+    """
+    (segments, _, segmentCells,
+     activity) = self._segmentArrays.computeColumnActivity(
+       c, activeState, connectedSynapsesOnly)
+    start, end = numpy.searchsorted(segmentCells, [i, i + 1])
+
+    return segments[start:end], activity[start:end]
+
+
+  #############################################################################
+  def _getLastMostActiveSegment(self, segments, activity, threshold):
+    """Return the last of the segments with the highest activity, if that
+    activity is at least threshold. Otherwise return None.
+    """
+    if len(segments) == 0 or activity.max() < threshold:
       return None
-    else:
-      return self.cells[c][i][which]
+
+    which = len(activity) - 1 - activity[::-1].argmax()
+    return segments[which]
 
   ################################################################################
   def getLeastUsedCell(self, c):
@@ -2014,6 +2155,7 @@ class TM(ConsolePrinterMixin):
 
     # segUpdate.segment is None when creating a new segment
     c, i, segment = segUpdate.columnIdx, segUpdate.cellIdx, segUpdate.segment
+    self._segmentArrays.markColumnChanged(c)
 
     # update.activeSynapses can be empty.
     # If not, it can contain either or both integers and tuples.
@@ -2452,3 +2594,277 @@ class Segment(object):
           reached0 = True
 
     return reached0
+
+
+
+class SegmentArrays(object):
+  """
+  Flat numpy arrays of the segments and synapses of a TM, used to compute the
+  activity of many segments at once.
+
+  The Segment objects in tm.cells are still where segments are stored, and
+  what gets pickled. The arrays are rebuilt from them one column at a time.
+  The TM marks a column as changed whenever it adds, adapts or removes
+  segments or synapses in it, and the column is rebuilt the next time its
+  arrays are needed. Code that edits segments directly should call
+  markColumnChanged too.
+
+  A column's segments are ordered by cell, then by their order in the cell's
+  segment list. The columns' arrays are concatenated in column order, and only
+  the ranges of the changed columns are updated in the concatenated arrays.
+  They're updated in place when the columns keep their number of segments and
+  synapses, so don't hold on to them across changes.
+  """
+
+  def __init__(self, tm):
+    self.tm = tm
+
+    # The arrays of each column:
+    # (segments, segmentCells, synapseSegments, synapseSources,
+    #  synapsePermanences)
+    # where segmentCells holds the cell index within the column of each
+    # segment, synapseSegments the index within the column of each synapse's
+    # segment, and synapseSources the flat index (col * cellsPerColumn + cell)
+    # of each synapse's presynaptic cell.
+    self.columnArrays = [None] * tm.numberOfCols
+    self.changedColumns = set(xrange(tm.numberOfCols))
+
+    # The concatenation of every column's arrays, plus segmentColumns, and the
+    # columns whose range in it is out of date
+    self.allArrays = None
+    self.allChangedColumns = set()
+
+    # The start of each column's segments and synapses in allArrays, with the
+    # total number of segments and synapses at the end
+    self.segmentStarts = None
+    self.synapseStarts = None
+
+
+  def markColumnChanged(self, c):
+    self.changedColumns.add(c)
+    self.allChangedColumns.add(c)
+
+
+  def getColumn(self, c):
+    """
+    @return (tuple)
+    (segments, segmentCells, synapseSegments, synapseSources,
+    synapsePermanences) for column c
+    """
+    if c in self.changedColumns:
+      self._buildColumn(c)
+      self.changedColumns.remove(c)
+
+    return self.columnArrays[c]
+
+
+  def getAll(self):
+    """
+    @return (tuple)
+    (segments, segmentColumns, segmentCells, synapseSegments, synapseSources,
+    synapsePermanences) for every column, where synapseSegments index into
+    segments.
+    """
+    for c in self.changedColumns:
+      self._buildColumn(c)
+    self.changedColumns.clear()
+
+    if self.allArrays is None:
+      self._buildAll()
+    elif self.allChangedColumns:
+      columns = sorted(self.allChangedColumns)
+      resizedColumns = [c for c in columns
+                        if (len(self.columnArrays[c][0]) !=
+                            self.segmentStarts[c + 1] - self.segmentStarts[c] or
+                            len(self.columnArrays[c][2]) !=
+                            self.synapseStarts[c + 1] - self.synapseStarts[c])]
+      if resizedColumns:
+        self._spliceColumnRanges(columns)
+      else:
+        self._updateColumnRanges(columns)
+    self.allChangedColumns.clear()
+
+    return self.allArrays
+
+
+  def computeActivity(self, activeState, connectedSynapsesOnly):
+    """
+    Compute the activity level of every segment, like the TM's
+    getSegmentActivityLevel.
+
+    @param activeState (numpy array)
+    A (numberOfCols, cellsPerColumn) array of cell states
+
+    @param connectedSynapsesOnly (bool)
+    Only count synapses with at least tm.connectedPerm permanence
+
+    @return (tuple)
+    (segments, segmentColumns, segmentCells, activity)
+    """
+    (segments, segmentColumns, segmentCells, synapseSegments, synapseSources,
+     synapsePermanences) = self.getAll()
+
+    activity = self._computeActivity(len(segments), synapseSegments,
+                                     synapseSources, synapsePermanences,
+                                     activeState, connectedSynapsesOnly)
+
+    return segments, segmentColumns, segmentCells, activity
+
+
+  def computeColumnActivity(self, c, activeState, connectedSynapsesOnly):
+    """
+    Compute the activity level of the segments in column c. See
+    computeActivity.
+
+    @return (tuple)
+    (segments, segmentColumns, segmentCells, activity) for column c. The
+    segmentColumns are None.
+    """
+    (segments, segmentCells, synapseSegments, synapseSources,
+     synapsePermanences) = self.getColumn(c)
+
+    activity = self._computeActivity(len(segments), synapseSegments,
+                                     synapseSources, synapsePermanences,
+                                     activeState, connectedSynapsesOnly)
+
+    return segments, None, segmentCells, activity
+
+
+  def _computeActivity(self, numSegments, synapseSegments, synapseSources,
+                       synapsePermanences, activeState, connectedSynapsesOnly):
+    isActive = activeState.reshape(-1)[synapseSources] != 0
+    if connectedSynapsesOnly:
+      isActive &= synapsePermanences >= self.tm.connectedPerm
+
+    # Older numpy versions reject a minlength of 0.
+    return numpy.bincount(synapseSegments[isActive],
+                          minlength=max(numSegments, 1))[:numSegments]
+
+
+  def _buildAll(self):
+    segments = []
+    segmentColumns = []
+    synapseSegments = []
+    for c, (columnSegments, _, columnSynapseSegments, _,
+            _) in enumerate(self.columnArrays):
+      synapseSegments.append(columnSynapseSegments + len(segments))
+      segmentColumns.append(numpy.full(len(columnSegments), c,
+                                       dtype="int32"))
+      segments += columnSegments
+
+    self.allArrays = (
+      segments,
+      numpy.concatenate(segmentColumns),
+      numpy.concatenate([arrays[1] for arrays in self.columnArrays]),
+      numpy.concatenate(synapseSegments),
+      numpy.concatenate([arrays[3] for arrays in self.columnArrays]),
+      numpy.concatenate([arrays[4] for arrays in self.columnArrays]))
+
+    self.segmentStarts = numpy.cumsum(
+      [0] + [len(arrays[0]) for arrays in self.columnArrays])
+    self.synapseStarts = numpy.cumsum(
+      [0] + [len(arrays[2]) for arrays in self.columnArrays])
+
+
+  def _updateColumnRanges(self, columns):
+    """
+    Copy the arrays of the given columns into their ranges of allArrays. The
+    columns must have kept their number of segments and synapses.
+    """
+    (segments, _, segmentCells, synapseSegments, synapseSources,
+     synapsePermanences) = self.allArrays
+
+    for c in columns:
+      (columnSegments, columnSegmentCells, columnSynapseSegments,
+       columnSynapseSources, columnSynapsePermanences) = self.columnArrays[c]
+      segmentStart, segmentEnd = self.segmentStarts[c:c + 2]
+      synapseStart, synapseEnd = self.synapseStarts[c:c + 2]
+
+      segments[segmentStart:segmentEnd] = columnSegments
+      segmentCells[segmentStart:segmentEnd] = columnSegmentCells
+      synapseSegments[synapseStart:synapseEnd] = (columnSynapseSegments +
+                                                  segmentStart)
+      synapseSources[synapseStart:synapseEnd] = columnSynapseSources
+      synapsePermanences[synapseStart:synapseEnd] = columnSynapsePermanences
+
+
+  def _spliceColumnRanges(self, columns):
+    """
+    Rebuild allArrays from the ranges of the unchanged columns and the arrays
+    of the given columns, shifting the segment indices of the columns after
+    each one that gained or lost segments.
+    """
+    (segments, segmentColumns, segmentCells, synapseSegments, synapseSources,
+     synapsePermanences) = self.allArrays
+
+    newSegments = []
+    pieces = ([], [], [], [], [])
+    segmentShift = 0
+    segmentEnd = 0
+    synapseEnd = 0
+    for c in columns:
+      # The unchanged columns since the previous changed one
+      segmentStart = self.segmentStarts[c]
+      synapseStart = self.synapseStarts[c]
+      newSegments += segments[segmentEnd:segmentStart]
+      pieces[0].append(segmentColumns[segmentEnd:segmentStart])
+      pieces[1].append(segmentCells[segmentEnd:segmentStart])
+      pieces[2].append(synapseSegments[synapseEnd:synapseStart] +
+                       segmentShift)
+      pieces[3].append(synapseSources[synapseEnd:synapseStart])
+      pieces[4].append(synapsePermanences[synapseEnd:synapseStart])
+
+      (columnSegments, columnSegmentCells, columnSynapseSegments,
+       columnSynapseSources, columnSynapsePermanences) = self.columnArrays[c]
+      pieces[2].append(columnSynapseSegments + len(newSegments))
+      newSegments += columnSegments
+      pieces[0].append(numpy.full(len(columnSegments), c, dtype="int32"))
+      pieces[1].append(columnSegmentCells)
+      pieces[3].append(columnSynapseSources)
+      pieces[4].append(columnSynapsePermanences)
+
+      segmentEnd = self.segmentStarts[c + 1]
+      synapseEnd = self.synapseStarts[c + 1]
+      segmentShift = len(newSegments) - int(segmentEnd)
+
+    newSegments += segments[segmentEnd:]
+    pieces[0].append(segmentColumns[segmentEnd:])
+    pieces[1].append(segmentCells[segmentEnd:])
+    pieces[2].append(synapseSegments[synapseEnd:] + segmentShift)
+    pieces[3].append(synapseSources[synapseEnd:])
+    pieces[4].append(synapsePermanences[synapseEnd:])
+
+    self.allArrays = (newSegments,) + tuple(numpy.concatenate(arrays)
+                                            for arrays in pieces)
+
+    segmentCounts = numpy.diff(self.segmentStarts)
+    synapseCounts = numpy.diff(self.synapseStarts)
+    for c in columns:
+      segmentCounts[c] = len(self.columnArrays[c][0])
+      synapseCounts[c] = len(self.columnArrays[c][2])
+    self.segmentStarts = numpy.concatenate(([0], numpy.cumsum(segmentCounts)))
+    self.synapseStarts = numpy.concatenate(([0], numpy.cumsum(synapseCounts)))
+
+
+  def _buildColumn(self, c):
+    segments = []
+    segmentCells = []
+    synapseSegments = []
+    synapseSources = []
+    synapsePermanences = []
+
+    for i, cellSegments in enumerate(self.tm.cells[c]):
+      for segment in cellSegments:
+        segmentCells.append(i)
+        for syn in segment.syns:
+          synapseSegments.append(len(segments))
+          synapseSources.append(syn[0] * self.tm.cellsPerColumn + syn[1])
+          synapsePermanences.append(syn[2])
+        segments.append(segment)
+
+    self.columnArrays[c] = (
+      segments,
+      numpy.array(segmentCells, dtype="int32"),
+      numpy.array(synapseSegments, dtype="int32"),
+      numpy.array(synapseSources, dtype="int32"),
+      numpy.array(synapsePermanences, dtype="float32"))
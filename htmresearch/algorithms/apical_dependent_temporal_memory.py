@@ -23,7 +23,9 @@
 
 import numpy as np
 
+from htmresearch.support import connections_checkpoint
 from htmresearch.support import numpy_helpers as np2
+from htmresearch.support.segment_activity import computeSegmentActivity
 from nupic.bindings.math import Random, SparseMatrixConnections
 
 
@@ -139,6 +141,11 @@ class ApicalDependentTemporalMemory(object):
     self.apicalConnections = SparseMatrixConnections(columnCount*cellsPerColumn,
                                                      apicalInputSize)
     self.rng = Random(seed)
+
+    # The total number of basal and apical segments on each cell, updated as
+    # segments are created.
+    self.segmentCounts = np.zeros(columnCount*cellsPerColumn, dtype="int32")
+
     self.activeCells = np.empty(0, dtype="uint32")
     self.winnerCells = np.empty(0, dtype="uint32")
     self.predictedCells = np.empty(0, dtype="uint32")
@@ -150,6 +157,25 @@ class ApicalDependentTemporalMemory(object):
     self.basalPotentialOverlaps = np.empty(0, dtype="int32")
     self.apicalPotentialOverlaps = np.empty(0, dtype="int32")
 
+    self._initEphemerals()
+
+
+  def _getEphemeralMembers(self):
+    """
+    List of members that are derived from the others. They aren't saved by
+    saveCheckpoint.
+    """
+    return [
+      "setOps",
+      ]
+
+
+  def _initEphemerals(self):
+    """
+    Initialize the members listed by _getEphemeralMembers.
+    """
+    self.setOps = np2.createSetOperations(self.columnCount*self.cellsPerColumn)
+
 
   def reset(self):
     """
@@ -167,6 +193,44 @@ class ApicalDependentTemporalMemory(object):
     self.apicalPotentialOverlaps = np.empty(0, dtype="int32")
 
 
+  def saveCheckpoint(self, directory, permanenceDtype="float32"):
+    """
+    Save this TM to a directory. The synapses are stored as flat arrays that
+    can be memory-mapped by loadCheckpoint.
+
+    @param directory (str)
+
+    @param permanenceDtype (str)
+    "float32", or "uint16" / "uint8" to store fixed-point permanences. A TM
+    loaded from fixed-point permanences computes the same active segments, but
+    its other permanences are rounded to the fixed-point resolution.
+    """
+    connections_checkpoint.saveModel(
+      self, directory, ("basalConnections", "apicalConnections"),
+      self._getEphemeralMembers(),
+      permanenceDtype=permanenceDtype,
+      connectedPermanences={"basalConnections": self.connectedPermanence,
+                            "apicalConnections": self.connectedPermanence})
+
+
+  @staticmethod
+  def loadCheckpoint(directory, mmap=True):
+    """
+    Load a TM saved by saveCheckpoint.
+
+    @param directory (str)
+
+    @param mmap (bool)
+    If True, the connections are memory-mapped read-only. Loading is nearly
+    instant, processes loading the same checkpoint share its memory, and
+    learning raises a ValueError. If False, the connections are copied into
+    memory and the TM can keep learning.
+
+    @return (ApicalDependentTemporalMemory)
+    """
+    return connections_checkpoint.loadModel(directory, mmap)
+
+
   def depolarizeCells(self, basalInput, apicalInput, learn):
     """
     Calculate predictions.
@@ -252,9 +316,10 @@ class ApicalDependentTemporalMemory(object):
 
     # Calculate active cells
     (correctPredictedCells,
-     burstingColumns) = np2.setCompare(self.predictedCells, activeColumns,
-                                       self.predictedCells / self.cellsPerColumn,
-                                       rightMinusLeft=True)
+     burstingColumns) = self.setOps.setCompare(
+       self.predictedCells, activeColumns,
+       self.predictedCells / self.cellsPerColumn,
+       rightMinusLeft=True)
 
     newActiveCells = np.concatenate((correctPredictedCells,
                                      np2.getAllCellsInColumns(
@@ -318,6 +383,7 @@ class ApicalDependentTemporalMemory(object):
                                  newSegmentCells, apicalGrowthCandidates,
                                  self.initialPermanence, self.sampleSize,
                                  self.maxSynapsesPerSegment)
+        self.segmentCounts[newSegmentCells] += 2
 
 
     # Save the results
@@ -395,7 +461,7 @@ class ApicalDependentTemporalMemory(object):
       cellsForMatchingBasal, cellsForMatchingApical)
 
     (matchingCellsInBurstingColumns,
-     burstingColumnsWithNoMatch) = np2.setCompare(
+     burstingColumnsWithNoMatch) = self.setOps.setCompare(
        matchingCells, burstingColumns, matchingCells / self.cellsPerColumn,
        rightMinusLeft=True)
 
@@ -461,8 +527,11 @@ class ApicalDependentTemporalMemory(object):
       The number of active potential synapses for each segment.
       Includes counts for active, matching, and nonmatching segments.
     """
+    overlaps, potentialOverlaps = computeSegmentActivity(
+      connections, activeInput, connectedPermanence,
+      min(activationThreshold, reducedThreshold))
+
     # Active apical segments lower the activation threshold for basal segments
-    overlaps = connections.computeActivity(activeInput, connectedPermanence)
     outrightActiveSegments = np.flatnonzero(overlaps >= activationThreshold)
     if (reducedThreshold != activationThreshold and
             len(reducedThresholdCells) > 0):
@@ -482,7 +551,6 @@ class ApicalDependentTemporalMemory(object):
 
 
     # Matching
-    potentialOverlaps = connections.computeActivity(activeInput)
     matchingSegments = np.flatnonzero(potentialOverlaps >= minThreshold)
 
     return (activeSegments,
@@ -590,12 +658,12 @@ class ApicalDependentTemporalMemory(object):
     self.apicalConnections.sortSegmentsByCell(apicalCandidateSegments)
 
     # Narrow it down to one pair per cell.
-    oneBasalPerCellFilter = np2.argmaxMulti(
+    oneBasalPerCellFilter = self.setOps.argmaxMulti(
       basalPotentialOverlaps[basalCandidateSegments],
       self.basalConnections.mapSegmentsToCells(basalCandidateSegments),
       assumeSorted=True)
     basalCandidateSegments = basalCandidateSegments[oneBasalPerCellFilter]
-    oneApicalPerCellFilter = np2.argmaxMulti(
+    oneApicalPerCellFilter = self.setOps.argmaxMulti(
       apicalPotentialOverlaps[apicalCandidateSegments],
       self.apicalConnections.mapSegmentsToCells(apicalCandidateSegments),
       assumeSorted=True)
@@ -607,8 +675,9 @@ class ApicalDependentTemporalMemory(object):
     columnsForCandidates = (
       self.basalConnections.mapSegmentsToCells(basalCandidateSegments) /
       self.cellsPerColumn)
-    onePerColumnFilter = np2.argmaxMulti(cellScores, columnsForCandidates,
-                                         assumeSorted=True)
+    onePerColumnFilter = self.setOps.argmaxMulti(cellScores,
+                                                 columnsForCandidates,
+                                                 assumeSorted=True)
 
     learningBasalSegments = basalCandidateSegments[onePerColumnFilter]
     learningApicalSegments = apicalCandidateSegments[onePerColumnFilter]
@@ -628,37 +697,17 @@ class ApicalDependentTemporalMemory(object):
     @return (numpy array)
     One cell for each of the provided columns
     """
-    candidateCells = np2.getAllCellsInColumns(columns, self.cellsPerColumn)
-
-    # Arrange the segment counts into one row per minicolumn.
-    segmentCounts = np.reshape(
-      self.basalConnections.getSegmentCounts(candidateCells) +
-      self.apicalConnections.getSegmentCounts(candidateCells),
-      newshape=(len(columns),
-                self.cellsPerColumn))
-
-    # Filter to just the cells that are tied for fewest in their minicolumn.
-    minSegmentCounts = np.amin(segmentCounts, axis=1, keepdims=True)
-    candidateCells = candidateCells[np.flatnonzero(segmentCounts ==
-                                                   minSegmentCounts)]
-
-    # Filter to one cell per column, choosing randomly from the minimums.
-    # To do the random choice, add a random offset to each index in-place, using
-    # casting to floor the result.
-    (_,
-     onePerColumnFilter,
-     numCandidatesInColumns) = np.unique(candidateCells / self.cellsPerColumn,
-                                         return_index=True, return_counts=True)
-
     offsetPercents = np.empty(len(columns), dtype="float32")
     self.rng.initializeReal32Array(offsetPercents)
 
-    np.add(onePerColumnFilter,
-           offsetPercents*numCandidatesInColumns,
-           out=onePerColumnFilter,
-           casting="unsafe")
-
-    return candidateCells[onePerColumnFilter]
+    # View the segment counts as one row per minicolumn, and choose randomly
+    # from the minimums of each row.
+    columns = np.asarray(columns, dtype="uint32")
+    segmentCountsByColumn = self.segmentCounts.reshape(
+      (-1, self.cellsPerColumn))
+    return (columns*self.cellsPerColumn +
+            np2.argminRows(segmentCountsByColumn[columns],
+                           offsetPercents)).astype("uint32")
 
 
   def getActiveCells(self):
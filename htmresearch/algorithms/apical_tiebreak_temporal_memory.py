@@ -21,12 +21,30 @@
 
 """An implementation of TemporalMemory"""
 
+import time
+
 import numpy as np
 
+from htmresearch.support import connections_checkpoint
 from htmresearch.support import numpy_helpers as np2
+from htmresearch.support.frozen_connections import FrozenConnections
+from htmresearch.support.phase_profiler import PhaseProfiler
+from htmresearch.support.segment_activity import computeSegmentActivity
 from nupic.bindings.math import Random, SparseMatrixConnections
 
 
+# Estimated memory used by one synapse (a presynaptic index and a permanence)
+# and by one segment (its row bookkeeping and its cell) in
+# SparseMatrixConnections.
+SYNAPSE_BYTES = 8
+SEGMENT_BYTES = 28
+
+# Phases and counts reported by the instrumentation
+PHASES = ("apicalActivity", "basalActivity", "predictedCells", "activeCells",
+          "basalLearning", "apicalLearning", "punishment", "segmentGrowth")
+TOUCHED_COUNTS = ("basalSegments", "basalSynapses", "apicalSegments",
+                  "apicalSynapses")
+
 
 class ApicalTiebreakTemporalMemory(object):
   """
@@ -143,6 +161,12 @@ class ApicalTiebreakTemporalMemory(object):
     self.apicalConnections = SparseMatrixConnections(columnCount*cellsPerColumn,
                                                      apicalInputSize)
     self.rng = Random(seed)
+
+    # The number of basal segments on each cell, updated as segments are
+    # created or removed.
+    self.basalSegmentCounts = np.zeros(columnCount*cellsPerColumn,
+                                       dtype="int32")
+
     self.activeCells = np.empty(0, dtype="uint32")
     self.winnerCells = np.empty(0, dtype="uint32")
     self.predictedCells = np.empty(0, dtype="uint32")
@@ -157,6 +181,168 @@ class ApicalTiebreakTemporalMemory(object):
     self.useApicalTiebreak=True
     self.useApicalModulationBasalThreshold=True
 
+    self.compactionInterval = 0
+    self.compactionParams = {}
+    self.stepsSinceCompaction = 0
+    self.matchCountingEnabled = False
+
+    self._initEphemerals()
+
+
+  def _getEphemeralMembers(self):
+    """
+    List of members that are derived from the others or only describe recent
+    activity. They aren't saved by saveCheckpoint.
+    """
+    return [
+      "setOps",
+      "frozenBasalConnections",
+      "frozenApicalConnections",
+      "basalSegmentMatchCounts",
+      "apicalSegmentMatchCounts",
+      "basalSegmentCountAtCompaction",
+      "apicalSegmentCountAtCompaction",
+      "lastBasalInput",
+      "lastApicalInput",
+      "lastCompactionReport",
+      "profiler",
+      ]
+
+
+  def _initEphemerals(self):
+    """
+    Initialize the members listed by _getEphemeralMembers. A loaded checkpoint
+    isn't frozen and has instrumentation disabled.
+    """
+    self.setOps = np2.createSetOperations(self.columnCount*self.cellsPerColumn)
+
+    self.frozenBasalConnections = None
+    self.frozenApicalConnections = None
+
+    # Compaction bookkeeping. Segments numbered at or above the segment count
+    # at the last compaction were created since then. Match counts restart
+    # when a checkpoint is loaded, so like in a new TM, the first compaction
+    # exempts every segment from minRecentActivity.
+    self.basalSegmentMatchCounts = np.zeros(0, dtype="int32")
+    self.apicalSegmentMatchCounts = np.zeros(0, dtype="int32")
+    self.basalSegmentCountAtCompaction = 0
+    self.apicalSegmentCountAtCompaction = 0
+    self.lastBasalInput = np.empty(0, dtype="uint32")
+    self.lastApicalInput = np.empty(0, dtype="uint32")
+    self.lastCompactionReport = None
+
+    # Instrumentation. None when disabled.
+    self.profiler = None
+
+
+  def freeze(self):
+    """
+    Switch to inference-only mode. The current connected basal and apical
+    synapses are compiled into read-only FrozenConnections, and until
+    'unfreeze' is called:
+
+    - Segment activity is computed from the compiled synapses, and only active
+      segments are computed. Matching segments and potential overlaps are
+      skipped.
+    - Learning is disabled. Calling with learn=True raises a ValueError.
+    - Winner cells aren't selected, so getWinnerCells returns an empty array,
+      and the random number generator isn't used.
+
+    Active cells and predicted cells are the same as with learn=False.
+    """
+    self.frozenBasalConnections = FrozenConnections(self.basalConnections,
+                                                    self.connectedPermanence)
+    self.frozenApicalConnections = FrozenConnections(self.apicalConnections,
+                                                     self.connectedPermanence)
+    self.matchingBasalSegments = np.empty(0, dtype="uint32")
+    self.matchingApicalSegments = np.empty(0, dtype="uint32")
+    self.basalPotentialOverlaps = np.empty(0, dtype="int32")
+    self.apicalPotentialOverlaps = np.empty(0, dtype="int32")
+
+
+  def unfreeze(self):
+    """
+    Leave inference-only mode and re-enable learning.
+    """
+    self.frozenBasalConnections = None
+    self.frozenApicalConnections = None
+
+
+  def isFrozen(self):
+    """
+    @return (bool)
+    Whether the connections are frozen for inference
+    """
+    return self.frozenBasalConnections is not None
+
+
+  def enableInstrumentation(self):
+    """
+    Start measuring the time spent in each phase of the compute, and the
+    number of segments and synapses touched by learning on each timestep.
+    Measurements restart from zero.
+    """
+    self.profiler = PhaseProfiler(PHASES, TOUCHED_COUNTS)
+
+
+  def disableInstrumentation(self):
+    """
+    Stop measuring. The instrumentation has no cost while disabled.
+    """
+    self.profiler = None
+
+
+  def getInstrumentation(self):
+    """
+    @return (dict or None)
+    The measurements since instrumentation was enabled, in the format of
+    PhaseProfiler.toDict. Use the profiler's toJSON for JSON. None if
+    instrumentation is disabled.
+    """
+    if self.profiler is None:
+      return None
+    return self.profiler.toDict()
+
+
+  def saveCheckpoint(self, directory, permanenceDtype="float32"):
+    """
+    Save this TM to a directory. The synapses are stored as flat arrays that
+    can be memory-mapped by loadCheckpoint. The members listed by
+    _getEphemeralMembers aren't saved, so the loaded TM isn't frozen and has
+    instrumentation disabled.
+
+    @param directory (str)
+
+    @param permanenceDtype (str)
+    "float32", or "uint16" / "uint8" to store fixed-point permanences. A TM
+    loaded from fixed-point permanences computes the same active segments, but
+    its other permanences are rounded to the fixed-point resolution.
+    """
+    connections_checkpoint.saveModel(
+      self, directory, ("basalConnections", "apicalConnections"),
+      self._getEphemeralMembers(),
+      permanenceDtype=permanenceDtype,
+      connectedPermanences={"basalConnections": self.connectedPermanence,
+                            "apicalConnections": self.connectedPermanence})
+
+
+  @staticmethod
+  def loadCheckpoint(directory, mmap=True):
+    """
+    Load a TM saved by saveCheckpoint.
+
+    @param directory (str)
+
+    @param mmap (bool)
+    If True, the connections are memory-mapped read-only. Loading is nearly
+    instant, processes loading the same checkpoint share its memory, and
+    learning raises a ValueError. If False, the connections are copied into
+    memory and the TM can keep learning.
+
+    @return (ApicalTiebreakTemporalMemory)
+    """
+    return connections_checkpoint.loadModel(directory, mmap)
+
 
   def reset(self):
     """
@@ -188,12 +374,23 @@ class ApicalTiebreakTemporalMemory(object):
     Whether learning is enabled. Some TM implementations may depolarize cells
     differently or do segment activity bookkeeping when learning is enabled.
     """
+    profiler = self.profiler
+    if profiler is not None:
+      profiler.mark()
+
+    if self.isFrozen():
+      self._depolarizeCellsFrozen(basalInput, apicalInput, learn)
+      return
+
     (activeApicalSegments,
      matchingApicalSegments,
      apicalPotentialOverlaps) = self._calculateApicalSegmentActivity(
        self.apicalConnections, apicalInput, self.connectedPermanence,
        self.activationThreshold, self.minThreshold)
 
+    if profiler is not None:
+      profiler.lap("apicalActivity")
+
     if learn or self.useApicalModulationBasalThreshold==False:
       reducedBasalThresholdCells = ()
     else:
@@ -207,9 +404,15 @@ class ApicalTiebreakTemporalMemory(object):
        self.connectedPermanence,
        self.activationThreshold, self.minThreshold, self.reducedBasalThreshold)
 
+    if profiler is not None:
+      profiler.lap("basalActivity")
+
     predictedCells = self._calculatePredictedCells(activeBasalSegments,
                                                    activeApicalSegments)
 
+    if profiler is not None:
+      profiler.lap("predictedCells")
+
     self.predictedCells = predictedCells
     self.activeBasalSegments = activeBasalSegments
     self.activeApicalSegments = activeApicalSegments
@@ -218,6 +421,74 @@ class ApicalTiebreakTemporalMemory(object):
     self.basalPotentialOverlaps = basalPotentialOverlaps
     self.apicalPotentialOverlaps = apicalPotentialOverlaps
 
+    if self.matchCountingEnabled:
+      self.basalSegmentMatchCounts = self._countMatches(
+        self.basalSegmentMatchCounts, len(basalPotentialOverlaps),
+        matchingBasalSegments)
+      self.apicalSegmentMatchCounts = self._countMatches(
+        self.apicalSegmentMatchCounts, len(apicalPotentialOverlaps),
+        matchingApicalSegments)
+    self.lastBasalInput = basalInput
+    self.lastApicalInput = apicalInput
+
+
+  @staticmethod
+  def _countMatches(matchCounts, segmentCount, matchingSegments):
+    """
+    Increment the match count of each matching segment, growing the array of
+    counts when new segments have been created.
+
+    @return (numpy array)
+    The updated match counts. This might be a new array.
+    """
+    if len(matchCounts) < segmentCount:
+      grown = np.zeros(max(segmentCount, 2*len(matchCounts)), dtype="int32")
+      grown[:len(matchCounts)] = matchCounts
+      matchCounts = grown
+
+    matchCounts[matchingSegments] += 1
+    return matchCounts
+
+
+  def _depolarizeCellsFrozen(self, basalInput, apicalInput, learn):
+    """
+    Calculate predictions from the frozen connections. Only active segments are
+    computed.
+    """
+    if learn:
+      raise ValueError("Can't learn while frozen. Call unfreeze() first.")
+
+    profiler = self.profiler
+
+    activeApicalSegments = self._calculateFrozenSegmentActivity(
+      self.frozenApicalConnections, self.apicalConnections, apicalInput,
+      self.activationThreshold, self.activationThreshold, ())
+
+    if profiler is not None:
+      profiler.lap("apicalActivity")
+
+    if self.useApicalModulationBasalThreshold==False:
+      reducedBasalThresholdCells = ()
+    else:
+      reducedBasalThresholdCells = self.apicalConnections.mapSegmentsToCells(
+        activeApicalSegments)
+
+    activeBasalSegments = self._calculateFrozenSegmentActivity(
+      self.frozenBasalConnections, self.basalConnections, basalInput,
+      self.activationThreshold, self.reducedBasalThreshold,
+      reducedBasalThresholdCells)
+
+    if profiler is not None:
+      profiler.lap("basalActivity")
+
+    self.predictedCells = self._calculatePredictedCells(activeBasalSegments,
+                                                        activeApicalSegments)
+
+    if profiler is not None:
+      profiler.lap("predictedCells")
+    self.activeBasalSegments = activeBasalSegments
+    self.activeApicalSegments = activeApicalSegments
+
 
   def activateCells(self,
                     activeColumns,
@@ -249,15 +520,37 @@ class ApicalTiebreakTemporalMemory(object):
     Whether to grow / reinforce / punish synapses
     """
 
+    profiler = self.profiler
+    if profiler is not None:
+      profiler.mark()
+
     # Calculate active cells
     (correctPredictedCells,
-     burstingColumns) = np2.setCompare(self.predictedCells, activeColumns,
-                                       self.predictedCells / self.cellsPerColumn,
-                                       rightMinusLeft=True)
+     burstingColumns) = self.setOps.setCompare(
+       self.predictedCells, activeColumns,
+       self.predictedCells / self.cellsPerColumn,
+       rightMinusLeft=True)
     newActiveCells = np.concatenate((correctPredictedCells,
                                      np2.getAllCellsInColumns(
                                        burstingColumns, self.cellsPerColumn)))
 
+    if self.isFrozen():
+      if learn:
+        raise ValueError("Can't learn while frozen. Call unfreeze() first.")
+
+      newActiveCells.sort()
+      self.activeCells = newActiveCells
+      self.winnerCells = np.empty(0, dtype="uint32")
+      self.predictedActiveCells = correctPredictedCells
+
+      if profiler is not None:
+        profiler.lap("activeCells")
+        profiler.endStep()
+      return
+
+    if profiler is not None:
+      profiler.lap("activeCells")
+
     # Calculate learning
     (learningActiveBasalSegments,
      learningMatchingBasalSegments,
@@ -268,6 +561,9 @@ class ApicalTiebreakTemporalMemory(object):
        self.activeBasalSegments, self.matchingBasalSegments,
        self.basalPotentialOverlaps)
 
+    if profiler is not None:
+      profiler.lap("basalLearning")
+
     (learningActiveApicalSegments,
      learningMatchingApicalSegments,
      apicalSegmentsToPunish,
@@ -275,6 +571,9 @@ class ApicalTiebreakTemporalMemory(object):
        learningCells, activeColumns, self.activeApicalSegments,
        self.matchingApicalSegments, self.apicalPotentialOverlaps)
 
+    if profiler is not None:
+      profiler.lap("apicalLearning")
+
     # Learn
     if learn:
       # Learn on existing segments
@@ -287,6 +586,9 @@ class ApicalTiebreakTemporalMemory(object):
                     self.permanenceIncrement, self.permanenceDecrement,
                     self.maxSynapsesPerSegment)
 
+      if profiler is not None:
+        profiler.lap("basalLearning", newCall=False)
+
       for learningSegments in (learningActiveApicalSegments,
                                learningMatchingApicalSegments):
 
@@ -296,6 +598,9 @@ class ApicalTiebreakTemporalMemory(object):
                     self.sampleSize, self.permanenceIncrement,
                     self.permanenceDecrement, self.maxSynapsesPerSegment)
 
+      if profiler is not None:
+        profiler.lap("apicalLearning", newCall=False)
+
       # Punish incorrect predictions
       if self.basalPredictedSegmentDecrement != 0.0:
         self.basalConnections.adjustActiveSynapses(
@@ -307,12 +612,20 @@ class ApicalTiebreakTemporalMemory(object):
           apicalSegmentsToPunish, apicalReinforceCandidates,
           -self.apicalPredictedSegmentDecrement)
 
+      if profiler is not None:
+        profiler.lap("punishment")
+        basalSegmentCount = self.basalConnections.matrix.nRows()
+        apicalSegmentCount = self.apicalConnections.matrix.nRows()
+        profiler.mark()
+
       # Grow new segments
       if len(basalGrowthCandidates) > 0:
-        self._learnOnNewSegments(self.basalConnections, self.rng,
-                                 newBasalSegmentCells, basalGrowthCandidates,
-                                 self.initialPermanence, self.sampleSize,
-                                 self.maxSynapsesPerSegment)
+        newBasalSegments = self._learnOnNewSegments(
+          self.basalConnections, self.rng, newBasalSegmentCells,
+          basalGrowthCandidates, self.initialPermanence, self.sampleSize,
+          self.maxSynapsesPerSegment)
+        self.basalSegmentCounts[
+          self.basalConnections.mapSegmentsToCells(newBasalSegments)] += 1
 
       if len(apicalGrowthCandidates) > 0:
         self._learnOnNewSegments(self.apicalConnections, self.rng,
@@ -320,6 +633,22 @@ class ApicalTiebreakTemporalMemory(object):
                                  self.initialPermanence, self.sampleSize,
                                  self.maxSynapsesPerSegment)
 
+      if profiler is not None:
+        profiler.lap("segmentGrowth")
+        self._countTouched(
+          profiler, "basal", self.basalConnections,
+          (learningActiveBasalSegments, learningMatchingBasalSegments,
+           basalSegmentsToPunish if self.basalPredictedSegmentDecrement != 0.0
+           else (),
+           np.arange(basalSegmentCount, self.basalConnections.matrix.nRows())))
+        self._countTouched(
+          profiler, "apical", self.apicalConnections,
+          (learningActiveApicalSegments, learningMatchingApicalSegments,
+           apicalSegmentsToPunish if self.apicalPredictedSegmentDecrement != 0.0
+           else (),
+           np.arange(apicalSegmentCount,
+                     self.apicalConnections.matrix.nRows())))
+
     # Save the results
     newActiveCells.sort()
     learningCells.sort()
@@ -327,6 +656,265 @@ class ApicalTiebreakTemporalMemory(object):
     self.winnerCells = learningCells
     self.predictedActiveCells = correctPredictedCells
 
+    if profiler is not None:
+      profiler.endStep()
+
+    if learn and self.compactionInterval > 0:
+      self.stepsSinceCompaction += 1
+      if self.stepsSinceCompaction >= self.compactionInterval:
+        self.lastCompactionReport = self.compactConnections(
+          **self.compactionParams)
+
+
+  @staticmethod
+  def _countTouched(profiler, name, connections, segmentLists):
+    """
+    Count the segments that were learned on, punished or created during this
+    timestep, and their synapses.
+    """
+    segments = np.concatenate([np.asarray(segmentList, dtype="uint32")
+                               for segmentList in segmentLists])
+    profiler.touch(name + "Segments", len(segments))
+    if len(segments) > 0:
+      profiler.touch(name + "Synapses",
+                     connections.mapSegmentsToSynapseCounts(segments).sum())
+
+
+  def setCompactionInterval(self, compactionInterval, minSynapses=1,
+                            minPermanence=0.0, minRecentActivity=0):
+    """
+    Run 'compactConnections' automatically every 'compactionInterval' calls to
+    'activateCells' with learning enabled. Inference steps don't count. The
+    report from the latest compaction is stored in 'lastCompactionReport'.
+
+    @param compactionInterval (int)
+    Number of learning timesteps between compactions. 0 disables automatic
+    compaction.
+
+    @param minRecentActivity (int)
+    If this is greater than 0, match counting is enabled (see
+    'enableMatchCounting').
+
+    The other parameters are passed to 'compactConnections'.
+    """
+    self.compactionInterval = compactionInterval
+    self.compactionParams = {
+      "minSynapses": minSynapses,
+      "minPermanence": minPermanence,
+      "minRecentActivity": minRecentActivity,
+    }
+    self.stepsSinceCompaction = 0
+
+    if minRecentActivity > 0 and not self.matchCountingEnabled:
+      self.enableMatchCounting()
+
+
+  def enableMatchCounting(self):
+    """
+    Start counting how often each segment matches, in every 'depolarizeCells'
+    call. Counting is needed to call 'compactConnections' with a
+    'minRecentActivity'. Counts restart from zero, and each compaction
+    restarts them.
+    """
+    self.matchCountingEnabled = True
+    self.basalSegmentMatchCounts = np.zeros(0, dtype="int32")
+    self.apicalSegmentMatchCounts = np.zeros(0, dtype="int32")
+
+
+  def disableMatchCounting(self):
+    """
+    Stop counting segment matches.
+    """
+    self.matchCountingEnabled = False
+    self.basalSegmentMatchCounts = np.zeros(0, dtype="int32")
+    self.apicalSegmentMatchCounts = np.zeros(0, dtype="int32")
+
+
+  def compactConnections(self, minSynapses=1, minPermanence=0.0,
+                         minRecentActivity=0):
+    """
+    Destroy dead synapses and segments, then renumber the remaining segments so
+    that they're contiguous. Segments keep their relative order, so ties
+    between segments are still broken the same way.
+
+    @param minSynapses (int)
+    Segments with fewer synapses than this are destroyed, after dead synapses
+    have been removed.
+
+    @param minPermanence (float)
+    Synapses with a permanence at or below this are destroyed.
+
+    @param minRecentActivity (int)
+    Segments that were matching fewer than this many times since the previous
+    compaction are destroyed. Segments created since the previous compaction
+    are exempt. 0 disables this check. Otherwise match counting must have been
+    enabled with 'enableMatchCounting'.
+
+    @return (dict)
+    - segmentsRemoved, synapsesRemoved (int)
+    - bytesReclaimed (int)
+      Estimated from SYNAPSE_BYTES and SEGMENT_BYTES
+    - activitySecondsBefore, activitySecondsAfter (float)
+      Time spent computing segment activity for the latest depolarizeCells
+      inputs with the old and with the compacted connections. This is the bulk
+      of the cost of the next depolarizeCells.
+    - activitySpeedup (float)
+    """
+    if not (isinstance(self.basalConnections, SparseMatrixConnections) and
+            isinstance(self.apicalConnections, SparseMatrixConnections)):
+      raise ValueError("These connections were loaded read-only from a "
+                       "checkpoint and can't be compacted. Load with "
+                       "mmap=False to compact.")
+
+    if minRecentActivity > 0 and not self.matchCountingEnabled:
+      raise ValueError("Segment matches aren't being counted. Call "
+                       "enableMatchCounting first.")
+
+    activitySecondsBefore = self._timeSegmentActivity()
+
+    cellCount = self.columnCount * self.cellsPerColumn
+    (self.basalConnections,
+     basalOldToNew,
+     basalSynapsesRemoved) = self._compactConnections(
+       self.basalConnections, cellCount, self.basalSegmentMatchCounts,
+       self.basalSegmentCountAtCompaction, minSynapses, minPermanence,
+       minRecentActivity)
+    (self.apicalConnections,
+     apicalOldToNew,
+     apicalSynapsesRemoved) = self._compactConnections(
+       self.apicalConnections, cellCount, self.apicalSegmentMatchCounts,
+       self.apicalSegmentCountAtCompaction, minSynapses, minPermanence,
+       minRecentActivity)
+
+    # Renumber the segments in the current state.
+    self.activeBasalSegments = self._remapSegments(self.activeBasalSegments,
+                                                   basalOldToNew)
+    self.matchingBasalSegments = self._remapSegments(
+      self.matchingBasalSegments, basalOldToNew)
+    self.basalPotentialOverlaps = self._remapOverlaps(
+      self.basalPotentialOverlaps, basalOldToNew)
+    self.activeApicalSegments = self._remapSegments(self.activeApicalSegments,
+                                                    apicalOldToNew)
+    self.matchingApicalSegments = self._remapSegments(
+      self.matchingApicalSegments, apicalOldToNew)
+    self.apicalPotentialOverlaps = self._remapOverlaps(
+      self.apicalPotentialOverlaps, apicalOldToNew)
+
+    self.basalSegmentCountAtCompaction = self.basalConnections.matrix.nRows()
+    self.apicalSegmentCountAtCompaction = self.apicalConnections.matrix.nRows()
+    self.basalSegmentMatchCounts = np.zeros(0, dtype="int32")
+    self.basalSegmentCounts = self.basalConnections.getSegmentCounts(
+      np.arange(cellCount, dtype="uint32"))
+    self.apicalSegmentMatchCounts = np.zeros(0, dtype="int32")
+    self.stepsSinceCompaction = 0
+
+    if self.isFrozen():
+      self.freeze()
+
+    activitySecondsAfter = self._timeSegmentActivity()
+
+    segmentsRemoved = (np.count_nonzero(basalOldToNew == -1) +
+                       np.count_nonzero(apicalOldToNew == -1))
+    synapsesRemoved = basalSynapsesRemoved + apicalSynapsesRemoved
+
+    return {
+      "segmentsRemoved": segmentsRemoved,
+      "synapsesRemoved": synapsesRemoved,
+      "bytesReclaimed": (segmentsRemoved*SEGMENT_BYTES +
+                         synapsesRemoved*SYNAPSE_BYTES),
+      "activitySecondsBefore": activitySecondsBefore,
+      "activitySecondsAfter": activitySecondsAfter,
+      "activitySpeedup": (activitySecondsBefore / activitySecondsAfter
+                          if activitySecondsAfter > 0 else float("inf")),
+    }
+
+
+  def _timeSegmentActivity(self):
+    """
+    Time the basal and apical segment activity calculation for the latest
+    depolarizeCells inputs.
+    """
+    start = time.time()
+    computeSegmentActivity(self.basalConnections, self.lastBasalInput,
+                           self.connectedPermanence,
+                           min(self.activationThreshold,
+                               self.reducedBasalThreshold))
+    computeSegmentActivity(self.apicalConnections, self.lastApicalInput,
+                           self.connectedPermanence, self.activationThreshold)
+    return time.time() - start
+
+
+  @staticmethod
+  def _compactConnections(connections, cellCount, matchCounts,
+                          segmentCountAtCompaction, minSynapses, minPermanence,
+                          minRecentActivity):
+    """
+    Copy the surviving segments and synapses into a new
+    SparseMatrixConnections. Segments numbered 'segmentCountAtCompaction' or
+    higher were created since the previous compaction, so they haven't had
+    the whole interval to match and are exempt from 'minRecentActivity'.
+
+    @return (tuple)
+    - newConnections (SparseMatrixConnections)
+    - oldToNew (numpy array)
+      The new number of each old segment, or -1 if it was destroyed
+    - synapsesRemoved (int)
+    """
+    segmentCount = connections.matrix.nRows()
+    inputCount = connections.matrix.nCols()
+
+    # Every synapse, in segment order
+    segments, inputs, permanences = connections.matrix.getAllNonZeros(True)
+    alive = permanences > minPermanence
+    synapsesRemoved = len(permanences) - np.count_nonzero(alive)
+    segments = segments[alive]
+    inputs = inputs[alive]
+    permanences = permanences[alive]
+
+    # Older numpy versions reject a minlength of 0.
+    synapseCounts = np.bincount(
+      segments, minlength=max(segmentCount, 1))[:segmentCount]
+
+    keepSegment = synapseCounts >= minSynapses
+    if minRecentActivity > 0:
+      recentActivity = np.zeros(segmentCount, dtype="int32")
+      n = min(segmentCount, len(matchCounts))
+      recentActivity[:n] = matchCounts[:n]
+      recentActivity[segmentCountAtCompaction:] = minRecentActivity
+      keepSegment &= recentActivity >= minRecentActivity
+
+    keptSegments = np.flatnonzero(keepSegment).astype("uint32")
+    oldToNew = np.full(segmentCount, -1, dtype="int64")
+    oldToNew[keptSegments] = np.arange(len(keptSegments))
+
+    # Synapses on destroyed segments are destroyed too.
+    synapseKept = keepSegment[segments]
+    synapsesRemoved += len(segments) - np.count_nonzero(synapseKept)
+
+    newConnections = SparseMatrixConnections(cellCount, inputCount)
+    if len(keptSegments) > 0:
+      newConnections.createSegments(
+        connections.mapSegmentsToCells(keptSegments))
+    if np.any(synapseKept):
+      newConnections.matrix.setElements(
+        oldToNew[segments[synapseKept]].astype("uint32"),
+        inputs[synapseKept], permanences[synapseKept])
+
+    return newConnections, oldToNew, int(synapsesRemoved)
+
+
+  @staticmethod
+  def _remapSegments(segments, oldToNew):
+    newSegments = oldToNew[segments]
+    return newSegments[newSegments != -1].astype("uint32")
+
+
+  @staticmethod
+  def _remapOverlaps(overlaps, oldToNew):
+    if len(overlaps) != len(oldToNew):
+      return np.empty(0, dtype="int32")
+    return overlaps[oldToNew != -1]
+
 
   def _calculateBasalLearning(self,
                               activeColumns,
@@ -378,7 +966,7 @@ class ApicalTiebreakTemporalMemory(object):
     matchingCells = np.unique(cellsForMatchingBasal)
 
     (matchingCellsInBurstingColumns,
-     burstingColumnsWithNoMatch) = np2.setCompare(
+     burstingColumnsWithNoMatch) = self.setOps.setCompare(
        matchingCells, burstingColumns, matchingCells / self.cellsPerColumn,
        rightMinusLeft=True)
 
@@ -386,7 +974,7 @@ class ApicalTiebreakTemporalMemory(object):
       self.basalConnections, matchingCellsInBurstingColumns,
       matchingBasalSegments, basalPotentialOverlaps, self.cellsPerColumn)
     newBasalSegmentCells = self._getCellsWithFewestSegments(
-      self.basalConnections, self.rng, burstingColumnsWithNoMatch,
+      self.basalSegmentCounts, self.rng, burstingColumnsWithNoMatch,
       self.cellsPerColumn)
 
     learningCells = np.concatenate(
@@ -498,12 +1086,13 @@ class ApicalTiebreakTemporalMemory(object):
       Includes counts for active, matching, and nonmatching segments.
     """
 
+    overlaps, potentialOverlaps = computeSegmentActivity(
+      connections, activeInput, connectedPermanence, activationThreshold)
+
     # Active
-    overlaps = connections.computeActivity(activeInput, connectedPermanence)
     activeSegments = np.flatnonzero(overlaps >= activationThreshold)
 
     # Matching
-    potentialOverlaps = connections.computeActivity(activeInput)
     matchingSegments = np.flatnonzero(potentialOverlaps >= minThreshold)
 
     return (activeSegments,
@@ -539,8 +1128,11 @@ class ApicalTiebreakTemporalMemory(object):
       The number of active potential synapses for each segment.
       Includes counts for active, matching, and nonmatching segments.
     """
+    overlaps, potentialOverlaps = computeSegmentActivity(
+      connections, activeInput, connectedPermanence,
+      min(activationThreshold, reducedBasalThreshold))
+
     # Active apical segments lower the activation threshold for basal (lateral) segments
-    overlaps = connections.computeActivity(activeInput, connectedPermanence)
     outrightActiveSegments = np.flatnonzero(overlaps >= activationThreshold)
     if reducedBasalThreshold != activationThreshold and len(reducedBasalThresholdCells) > 0:
         potentiallyActiveSegments = np.flatnonzero((overlaps < activationThreshold)
@@ -556,7 +1148,6 @@ class ApicalTiebreakTemporalMemory(object):
 
 
     # Matching
-    potentialOverlaps = connections.computeActivity(activeInput)
     matchingSegments = np.flatnonzero(potentialOverlaps >= minThreshold)
 
     return (activeSegments,
@@ -564,6 +1155,38 @@ class ApicalTiebreakTemporalMemory(object):
             potentialOverlaps)
 
 
+  @staticmethod
+  def _calculateFrozenSegmentActivity(frozenConnections, connections,
+                                      activeInput, activationThreshold,
+                                      reducedThreshold, reducedThresholdCells):
+    """
+    Calculate the active segments for this timestep using frozen connections.
+    Segments on reducedThresholdCells are active if they reach the
+    reducedThreshold.
+
+    @param frozenConnections (FrozenConnections)
+    @param connections (SparseMatrixConnections)
+    @param activeInput (numpy array)
+
+    @return (numpy array)
+    Active segments
+    """
+    segments, overlaps = frozenConnections.computeActivity(activeInput)
+    activeSegments = segments[overlaps >= activationThreshold]
+
+    if reducedThreshold != activationThreshold and len(reducedThresholdCells) > 0:
+      potentiallyActiveSegments = segments[(overlaps < activationThreshold) &
+                                           (overlaps >= reducedThreshold)]
+      cellsOfCASegments = connections.mapSegmentsToCells(
+        potentiallyActiveSegments)
+      conditionallyActiveSegments = potentiallyActiveSegments[
+        np.in1d(cellsOfCASegments, reducedThresholdCells)]
+      activeSegments = np.concatenate((activeSegments,
+                                       conditionallyActiveSegments))
+
+    return activeSegments
+
+
   def _calculatePredictedCells(self, activeBasalSegments, activeApicalSegments):
     """
     Calculate the predicted cells, given the set of active segments.
@@ -655,9 +1278,10 @@ class ApicalTiebreakTemporalMemory(object):
                                      numNewSynapses, initialPermanence,
                                      rng)
 
+    return newSegments
 
-  @classmethod
-  def _chooseBestSegmentPerCell(cls,
+
+  def _chooseBestSegmentPerCell(self,
                                 connections,
                                 cells,
                                 allMatchingSegments,
@@ -679,16 +1303,15 @@ class ApicalTiebreakTemporalMemory(object):
                                                          cells)
 
     # Narrow it down to one pair per cell.
-    onePerCellFilter = np2.argmaxMulti(potentialOverlaps[candidateSegments],
-                                       connections.mapSegmentsToCells(
-                                         candidateSegments))
+    onePerCellFilter = self.setOps.argmaxMulti(
+      potentialOverlaps[candidateSegments],
+      connections.mapSegmentsToCells(candidateSegments))
     learningSegments = candidateSegments[onePerCellFilter]
 
     return learningSegments
 
 
-  @classmethod
-  def _chooseBestSegmentPerColumn(cls, connections, matchingCells,
+  def _chooseBestSegmentPerColumn(self, connections, matchingCells,
                                   allMatchingSegments, potentialOverlaps,
                                   cellsPerColumn):
     """
@@ -709,7 +1332,8 @@ class ApicalTiebreakTemporalMemory(object):
     cellScores = potentialOverlaps[candidateSegments]
     columnsForCandidates = (connections.mapSegmentsToCells(candidateSegments) /
                             cellsPerColumn)
-    onePerColumnFilter = np2.argmaxMulti(cellScores, columnsForCandidates)
+    onePerColumnFilter = self.setOps.argmaxMulti(cellScores,
+                                                 columnsForCandidates)
 
     learningSegments = candidateSegments[onePerColumnFilter]
 
@@ -717,48 +1341,47 @@ class ApicalTiebreakTemporalMemory(object):
 
 
   @classmethod
-  def _getCellsWithFewestSegments(cls, connections, rng, columns,
+  def _getCellsWithFewestSegments(cls, segmentCounts, rng, columns,
                                   cellsPerColumn):
     """
     For each column, get the cell that has the fewest total basal segments.
     Break ties randomly.
 
-    @param connections (SparseMatrixConnections)
+    @param segmentCounts (numpy array)
+    The number of segments on each cell
+
     @param rng (Random)
     @param columns (numpy array) Columns to check
 
     @return (numpy array)
     One cell for each of the provided columns
     """
-    candidateCells = np2.getAllCellsInColumns(columns, cellsPerColumn)
-
-    # Arrange the segment counts into one row per minicolumn.
-    segmentCounts = np.reshape(connections.getSegmentCounts(candidateCells),
-                               newshape=(len(columns),
-                                         cellsPerColumn))
+    offsetPercents = np.empty(len(columns), dtype="float32")
+    rng.initializeReal32Array(offsetPercents)
 
-    # Filter to just the cells that are tied for fewest in their minicolumn.
-    minSegmentCounts = np.amin(segmentCounts, axis=1, keepdims=True)
-    candidateCells = candidateCells[np.flatnonzero(segmentCounts ==
-                                                   minSegmentCounts)]
+    # View the segment counts as one row per minicolumn, and choose randomly
+    # from the minimums of each row.
+    return cls._chooseCellsWithFewestSegments(segmentCounts, columns,
+                                              cellsPerColumn, offsetPercents)
 
-    # Filter to one cell per column, choosing randomly from the minimums.
-    # To do the random choice, add a random offset to each index in-place, using
-    # casting to floor the result.
-    (_,
-     onePerColumnFilter,
-     numCandidatesInColumns) = np.unique(candidateCells / cellsPerColumn,
-                                         return_index=True, return_counts=True)
 
-    offsetPercents = np.empty(len(columns), dtype="float32")
-    rng.initializeReal32Array(offsetPercents)
+  @staticmethod
+  def _chooseCellsWithFewestSegments(segmentCounts, columns, cellsPerColumn,
+                                     offsetPercents):
+    """
+    Choose one of the cells with the fewest segments in each column.
 
-    np.add(onePerColumnFilter,
-           offsetPercents*numCandidatesInColumns,
-           out=onePerColumnFilter,
-           casting="unsafe")
+    @param offsetPercents (numpy array)
+    One random tiebreak in [0, 1) per column
 
-    return candidateCells[onePerColumnFilter]
+    @return (numpy array)
+    One cell for each of the provided columns
+    """
+    columns = np.asarray(columns, dtype="uint32")
+    segmentCountsByColumn = segmentCounts.reshape((-1, cellsPerColumn))
+    return (columns*cellsPerColumn +
+            np2.argminRows(segmentCountsByColumn[columns],
+                           offsetPercents)).astype("uint32")
 
 
   def getActiveCells(self):
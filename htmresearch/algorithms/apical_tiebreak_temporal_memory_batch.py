@@ -0,0 +1,363 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Many independent ApicalTiebreakSequenceMemory streams behind one object"""
+
+import numbers
+
+import numpy as np
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakSequenceMemory)
+from nupic.bindings.math import Random
+
+
+
+class ApicalTiebreakSequenceMemoryBatch(ApicalTiebreakSequenceMemory):
+  """
+  Steps many independent ApicalTiebreakSequenceMemory streams in one call.
+
+  Stream i owns columns [i*columnCount, (i+1)*columnCount) of one large
+  sequence memory, and its cells and apical input bits are offset in the same
+  way. A stream's segments only ever receive that stream's cells and apical
+  bits as input, so streams never grow synapses to each other. Segment
+  activity and all of the set operations are then computed for every stream
+  at once, with the same number of numpy / SparseMatrixConnections calls as a
+  single instance.
+
+  The only per-stream work is random sampling. Every stream has its own random
+  number generator, and it's consumed in exactly the same order as it would be
+  in a standalone ApicalTiebreakSequenceMemory. So stream i's output is
+  identical to the output of ApicalTiebreakSequenceMemory(seed=seeds[i], ...)
+  fed the same inputs.
+
+  The inherited single-instance API (compute, getActiveCells, ...) works on
+  global cell / column numbers. Use the "ByStream" variants to work with
+  per-stream numbers.
+  """
+
+  def __init__(self,
+               streamCount=1,
+               columnCount=2048,
+               apicalInputSize=0,
+               cellsPerColumn=32,
+               activationThreshold=13,
+               reducedBasalThreshold=13,
+               initialPermanence=0.21,
+               connectedPermanence=0.50,
+               minThreshold=10,
+               sampleSize=20,
+               permanenceIncrement=0.1,
+               permanenceDecrement=0.1,
+               basalPredictedSegmentDecrement=0.0,
+               apicalPredictedSegmentDecrement=0.0,
+               maxSynapsesPerSegment=-1,
+               seed=42):
+    """
+    @param streamCount (int)
+    The number of independent streams
+
+    @param columnCount (int)
+    The number of minicolumns in each stream
+
+    @param apicalInputSize (int)
+    The number of bits in each stream's apical input
+
+    @param seed (int or sequence)
+    Seed for the random number generators. If it's a sequence, it contains one
+    seed per stream. Otherwise every stream uses this seed.
+
+    All other parameters are the same as in ApicalTiebreakSequenceMemory and
+    apply to every stream.
+    """
+
+    super(ApicalTiebreakSequenceMemoryBatch, self).__init__(
+      columnCount=columnCount*streamCount,
+      apicalInputSize=apicalInputSize*streamCount,
+      cellsPerColumn=cellsPerColumn,
+      activationThreshold=activationThreshold,
+      reducedBasalThreshold=reducedBasalThreshold,
+      initialPermanence=initialPermanence,
+      connectedPermanence=connectedPermanence,
+      minThreshold=minThreshold,
+      sampleSize=sampleSize,
+      permanenceIncrement=permanenceIncrement,
+      permanenceDecrement=permanenceDecrement,
+      basalPredictedSegmentDecrement=basalPredictedSegmentDecrement,
+      apicalPredictedSegmentDecrement=apicalPredictedSegmentDecrement,
+      maxSynapsesPerSegment=maxSynapsesPerSegment,
+      seed=seed if isinstance(seed, numbers.Integral) else 42)
+
+    if isinstance(seed, numbers.Integral):
+      seeds = [seed] * streamCount
+    else:
+      seeds = list(seed)
+      assert len(seeds) == streamCount
+
+    self.streamCount = streamCount
+    self.streamColumnCount = columnCount
+    self.streamCellCount = columnCount * cellsPerColumn
+    self.streamApicalInputSize = apicalInputSize
+    self.rngs = [Random(s) for s in seeds]
+
+
+  def computeByStream(self,
+                      activeColumnsByStream,
+                      apicalInputByStream=None,
+                      apicalGrowthCandidatesByStream=None,
+                      learn=True):
+    """
+    Perform one timestep for every stream.
+
+    @param activeColumnsByStream (list of numpy arrays)
+    Sorted active columns for each stream
+
+    @param apicalInputByStream (list of numpy arrays or None)
+    Active apical input bits for each stream. If None, there's no apical input.
+
+    @param apicalGrowthCandidatesByStream (list of numpy arrays or None)
+    Apical growth candidates for each stream. If None, each stream's
+    apicalInput is assumed to be growth candidates.
+
+    @param learn (bool)
+    Whether to grow / reinforce / punish synapses
+    """
+    activeColumns = self._joinStreams(activeColumnsByStream,
+                                      self.streamColumnCount)
+
+    if apicalInputByStream is None:
+      apicalInput = np.empty(0, dtype="uint32")
+    else:
+      apicalInput = self._joinStreams(apicalInputByStream,
+                                      self.streamApicalInputSize)
+
+    if apicalGrowthCandidatesByStream is None:
+      apicalGrowthCandidates = None
+    else:
+      apicalGrowthCandidates = self._joinStreams(
+        apicalGrowthCandidatesByStream, self.streamApicalInputSize)
+
+    self.compute(activeColumns, apicalInput, apicalGrowthCandidates, learn)
+
+
+  def getActiveCellsByStream(self):
+    """
+    @return (list of numpy arrays)
+    Active cells of each stream
+    """
+    return self._splitStreams(self.activeCells, self.streamCellCount)
+
+
+  def getWinnerCellsByStream(self):
+    """
+    @return (list of numpy arrays)
+    Cells that were selected for learning in each stream
+    """
+    return self._splitStreams(self.winnerCells, self.streamCellCount)
+
+
+  def getPredictedActiveCellsByStream(self):
+    """
+    @return (list of numpy arrays)
+    Active cells that were correctly predicted in each stream
+    """
+    return self._splitStreams(self.predictedActiveCells, self.streamCellCount)
+
+
+  def getPredictedCellsByStream(self):
+    """
+    @return (list of numpy arrays)
+    The prediction from the previous timestep for each stream
+    """
+    return self._splitStreams(self.prevPredictedCells, self.streamCellCount)
+
+
+  def getNextPredictedCellsByStream(self):
+    """
+    @return (list of numpy arrays)
+    The prediction for the next timestep for each stream
+    """
+    return self._splitStreams(self.predictedCells, self.streamCellCount)
+
+
+  def _joinStreams(self, arraysByStream, streamSize):
+    """
+    Convert a list of per-stream index arrays into one array of global indices.
+    """
+    assert len(arraysByStream) == self.streamCount
+
+    lengths = [len(a) for a in arraysByStream]
+    joined = np.concatenate([np.asarray(a, dtype="uint32")
+                             for a in arraysByStream]
+                            + [np.empty(0, dtype="uint32")])
+    joined += np.repeat(np.arange(self.streamCount, dtype="uint32") * streamSize,
+                        lengths)
+
+    return joined
+
+
+  def _splitStreams(self, indices, streamSize):
+    """
+    Convert an array of global indices into one array of per-stream indices for
+    each stream, keeping the original order within each stream.
+    """
+    streams = indices // streamSize
+    sorter = np.argsort(streams, kind="mergesort")
+    bounds = np.cumsum(np.bincount(streams, minlength=self.streamCount))
+
+    local = (indices - streams*streamSize)[sorter].astype("uint32")
+
+    return np.split(local, bounds[:-1])
+
+
+  def _streamInputSize(self, connections):
+    if connections is self.basalConnections:
+      return self.streamCellCount
+    else:
+      return self.streamApicalInputSize
+
+
+  def _getCandidateBounds(self, connections, growthCandidates):
+    """
+    @return (numpy array)
+    Stream i's growth candidates are
+    growthCandidates[candidateBounds[i]:candidateBounds[i+1]]
+    """
+    if len(growthCandidates) > 0:
+      candidateCounts = np.bincount(
+        growthCandidates // self._streamInputSize(connections),
+        minlength=self.streamCount)
+    else:
+      candidateCounts = np.zeros(self.streamCount, dtype="int64")
+
+    return np.append(0, np.cumsum(candidateCounts))
+
+
+  def _growSynapsesByStream(self, connections, segments, segmentStreams,
+                            growthCandidates, candidateBounds, maxNew,
+                            initialPermanence):
+    """
+    Call growSynapsesToSample once per stream with that stream's segments,
+    growth candidates and random number generator.
+    """
+    sorter = np.argsort(segmentStreams, kind="mergesort")
+    streams, starts = np.unique(segmentStreams[sorter], return_index=True)
+    ends = np.append(starts[1:], len(sorter))
+
+    for stream, start, end in zip(streams, starts, ends):
+      streamSorter = sorter[start:end]
+      connections.growSynapsesToSample(
+        segments[streamSorter],
+        growthCandidates[candidateBounds[stream]:candidateBounds[stream+1]],
+        maxNew[streamSorter], initialPermanence, self.rngs[stream])
+
+
+  def _learn(self, connections, rng, learningSegments, activeInput,
+             growthCandidates, potentialOverlaps, initialPermanence, sampleSize,
+             permanenceIncrement, permanenceDecrement, maxSynapsesPerSegment):
+    """
+    Same as ApicalTiebreakTemporalMemory._learn, but each stream samples its
+    new synapses from its own growth candidates with its own rng.
+    """
+
+    # Streams never share inputs, so this is done for all streams at once.
+    connections.adjustSynapses(learningSegments, activeInput,
+                               permanenceIncrement, -permanenceDecrement)
+
+    if len(learningSegments) == 0:
+      return
+
+    segmentStreams = (connections.mapSegmentsToCells(learningSegments) //
+                      self.streamCellCount)
+    candidateBounds = self._getCandidateBounds(connections, growthCandidates)
+
+    if sampleSize == -1:
+      maxNew = np.diff(candidateBounds)[segmentStreams]
+    else:
+      maxNew = sampleSize - potentialOverlaps[learningSegments]
+
+    if maxSynapsesPerSegment != -1:
+      synapseCounts = connections.mapSegmentsToSynapseCounts(
+        learningSegments)
+      numSynapsesToReachMax = maxSynapsesPerSegment - synapseCounts
+      maxNew = np.where(maxNew <= numSynapsesToReachMax,
+                        maxNew, numSynapsesToReachMax)
+
+    self._growSynapsesByStream(connections, learningSegments, segmentStreams,
+                               growthCandidates, candidateBounds, maxNew,
+                               initialPermanence)
+
+
+  def _learnOnNewSegments(self, connections, rng, newSegmentCells,
+                          growthCandidates, initialPermanence, sampleSize,
+                          maxSynapsesPerSegment):
+    """
+    Same as ApicalTiebreakTemporalMemory._learnOnNewSegments, but each stream
+    samples from its own growth candidates with its own rng. Like a standalone
+    instance, a stream with no growth candidates doesn't grow segments.
+    """
+    candidateBounds = self._getCandidateBounds(connections, growthCandidates)
+    candidateCounts = np.diff(candidateBounds)
+
+    cellStreams = newSegmentCells // self.streamCellCount
+    newSegmentCells = newSegmentCells[candidateCounts[cellStreams] > 0]
+    if len(newSegmentCells) == 0:
+      return np.empty(0, dtype="uint32")
+
+    newSegments = connections.createSegments(newSegmentCells)
+    segmentStreams = newSegmentCells // self.streamCellCount
+
+    numNewSynapses = candidateCounts[segmentStreams]
+
+    if sampleSize != -1:
+      numNewSynapses = np.minimum(numNewSynapses, sampleSize)
+
+    if maxSynapsesPerSegment != -1:
+      numNewSynapses = np.minimum(numNewSynapses, maxSynapsesPerSegment)
+
+    self._growSynapsesByStream(connections, newSegments, segmentStreams,
+                               growthCandidates, candidateBounds,
+                               numNewSynapses, initialPermanence)
+
+    return newSegments
+
+
+  def _getCellsWithFewestSegments(self, segmentCounts, rng, columns,
+                                  cellsPerColumn):
+    """
+    Same as ApicalTiebreakTemporalMemory._getCellsWithFewestSegments, but the
+    random tiebreak for each column is drawn from its stream's rng.
+
+    @param columns (numpy array)
+    Sorted columns to check
+    """
+    # Draw each stream's random offsets first, in column order, exactly like a
+    # standalone instance.
+    offsetPercents = np.empty(len(columns), dtype="float32")
+    streams, starts, counts = np.unique(columns // self.streamColumnCount,
+                                        return_index=True, return_counts=True)
+    for stream, start, count in zip(streams, starts, counts):
+      streamOffsetPercents = np.empty(count, dtype="float32")
+      self.rngs[stream].initializeReal32Array(streamOffsetPercents)
+      offsetPercents[start:start+count] = streamOffsetPercents
+
+    return self._chooseCellsWithFewestSegments(segmentCounts, columns,
+                                               cellsPerColumn, offsetPercents)
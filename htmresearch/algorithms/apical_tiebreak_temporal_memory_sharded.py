@@ -0,0 +1,530 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""An ApicalTiebreakTemporalMemory with its columns split across processes"""
+
+import multiprocessing
+import numbers
+import traceback
+
+import numpy as np
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakTemporalMemory)
+
+
+# Order of the shared input buffers
+INPUT_NAMES = ("activeColumns", "basalInput", "apicalInput",
+               "basalReinforceCandidates", "apicalReinforceCandidates",
+               "basalGrowthCandidates", "apicalGrowthCandidates")
+
+# Order of the shared output buffers
+OUTPUT_NAMES = ("activeCells", "winnerCells", "predictedCells",
+                "predictedActiveCells")
+
+
+
+class ShardedApicalTiebreakTemporalMemory(object):
+  """
+  Splits the columns of an ApicalTiebreakTemporalMemory into contiguous
+  shards. Each shard is an ApicalTiebreakTemporalMemory that receives the full
+  basal and apical input. Learning only ever involves the segments of the
+  active columns' cells, so the shards are independent.
+
+  With useProcesses=True, each shard lives in a worker process that owns its
+  segments. Every timestep, the inputs are written once into buffers that
+  are shared with all workers, and each worker writes its shard's cells into
+  its own shared output buffers. Only short commands go through pipes.
+
+  With useProcesses=False, the shards run one after the other in this
+  process. This is the reference implementation: for a given shard layout and
+  seeds, both modes give identical results.
+
+  The API matches ApicalTiebreakTemporalMemory, using global column and cell
+  numbers.
+  """
+
+  def __init__(self,
+               columnCount=2048,
+               basalInputSize=0,
+               apicalInputSize=0,
+               cellsPerColumn=32,
+               shardCount=2,
+               useProcesses=True,
+               seed=42,
+               **params):
+    """
+    @param shardCount (int)
+    The number of shards. Columns are split as evenly as possible.
+
+    @param useProcesses (bool)
+    Whether to run each shard in its own process.
+
+    @param seed (int or sequence)
+    Either one seed per shard, or a single int. Shard i then uses seed + i.
+
+    The other parameters are passed to each shard's
+    ApicalTiebreakTemporalMemory.
+    """
+    if isinstance(seed, numbers.Integral):
+      seeds = [seed + i for i in xrange(shardCount)]
+    else:
+      seeds = list(seed)
+      if len(seeds) != shardCount:
+        raise ValueError("Expected {} seeds, got {}".format(shardCount,
+                                                            len(seeds)))
+
+    self.columnCount = columnCount
+    self.cellsPerColumn = cellsPerColumn
+    self.basalInputSize = basalInputSize
+    self.apicalInputSize = apicalInputSize
+    self.shardCount = shardCount
+    self.useProcesses = useProcesses
+
+    shardColumnCounts = [len(columns)
+                         for columns in np.array_split(np.arange(columnCount),
+                                                       shardCount)]
+    self.shardColumnStarts = np.concatenate(
+      ([0], np.cumsum(shardColumnCounts)[:-1])).astype("uint32")
+    self.shardColumnCounts = np.array(shardColumnCounts, dtype="uint32")
+
+    shardParams = [dict(params,
+                        columnCount=shardColumnCounts[i],
+                        basalInputSize=basalInputSize,
+                        apicalInputSize=apicalInputSize,
+                        cellsPerColumn=cellsPerColumn,
+                        seed=seeds[i])
+                   for i in xrange(shardCount)]
+
+    if useProcesses:
+      self._startWorkers(shardParams)
+    else:
+      self.shards = [ApicalTiebreakTemporalMemory(**shardParams[i])
+                     for i in xrange(shardCount)]
+
+    self.activeCells = np.empty(0, dtype="uint32")
+    self.winnerCells = np.empty(0, dtype="uint32")
+    self.predictedCells = np.empty(0, dtype="uint32")
+    self.predictedActiveCells = np.empty(0, dtype="uint32")
+
+
+  def _startWorkers(self, shardParams):
+    inputCapacities = (self.columnCount,
+                       self.basalInputSize, self.apicalInputSize,
+                       self.basalInputSize, self.apicalInputSize,
+                       self.basalInputSize, self.apicalInputSize)
+    self.inputBuffers = [multiprocessing.RawArray("I", max(capacity, 1))
+                         for capacity in inputCapacities]
+    self.inputLengths = multiprocessing.RawArray("l", len(INPUT_NAMES))
+
+    self.outputBuffers = []
+    self.outputLengths = []
+    self.pipes = []
+    self.workers = []
+    for i in xrange(self.shardCount):
+      cellCount = int(self.shardColumnCounts[i]) * self.cellsPerColumn
+      outputBuffers = [multiprocessing.RawArray("I", max(cellCount, 1))
+                       for _ in OUTPUT_NAMES]
+      outputLengths = multiprocessing.RawArray("l", len(OUTPUT_NAMES))
+
+      pipe, workerPipe = multiprocessing.Pipe()
+      worker = multiprocessing.Process(
+        target=_runShardWorker,
+        args=(workerPipe, shardParams[i], int(self.shardColumnStarts[i]),
+              self.inputBuffers, self.inputLengths, outputBuffers,
+              outputLengths))
+      worker.daemon = True
+      worker.start()
+
+      self.outputBuffers.append(outputBuffers)
+      self.outputLengths.append(outputLengths)
+      self.pipes.append(pipe)
+      self.workers.append(worker)
+
+    self._sendCommand(("ping",))
+
+
+  def close(self):
+    """
+    Stop the worker processes.
+    """
+    if self.useProcesses and self.workers:
+      for pipe in self.pipes:
+        pipe.send(("close",))
+      for worker in self.workers:
+        worker.join()
+      self.workers = []
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, *args):
+    self.close()
+
+
+  def reset(self):
+    """
+    Clear all cell and segment activity.
+    """
+    if self.useProcesses:
+      self._sendCommand(("reset",))
+    else:
+      for shard in self.shards:
+        shard.reset()
+
+    self.activeCells = np.empty(0, dtype="uint32")
+    self.winnerCells = np.empty(0, dtype="uint32")
+    self.predictedCells = np.empty(0, dtype="uint32")
+    self.predictedActiveCells = np.empty(0, dtype="uint32")
+
+
+  def depolarizeCells(self, basalInput, apicalInput, learn):
+    """
+    Calculate predictions. See ApicalTiebreakTemporalMemory.depolarizeCells.
+    """
+    inputs = {"basalInput": basalInput,
+              "apicalInput": apicalInput}
+
+    if self.useProcesses:
+      self._writeInputs(inputs)
+      self._sendCommand(("depolarize", learn))
+      self.predictedCells = self._gatherOutputs("predictedCells")
+    else:
+      self.predictedCells = self._gatherResults([
+        _depolarizeShard(shard, learn, **inputs)
+        for shard in self.shards])[0]
+
+
+  def activateCells(self,
+                    activeColumns,
+                    basalReinforceCandidates,
+                    apicalReinforceCandidates,
+                    basalGrowthCandidates,
+                    apicalGrowthCandidates,
+                    learn=True):
+    """
+    Activate cells in the specified columns, then learn. See
+    ApicalTiebreakTemporalMemory.activateCells.
+    """
+    inputs = {"activeColumns": activeColumns,
+              "basalReinforceCandidates": basalReinforceCandidates,
+              "apicalReinforceCandidates": apicalReinforceCandidates,
+              "basalGrowthCandidates": basalGrowthCandidates,
+              "apicalGrowthCandidates": apicalGrowthCandidates}
+
+    if self.useProcesses:
+      self._writeInputs(inputs)
+      self._sendCommand(("activate", learn))
+      (self.activeCells,
+       self.winnerCells,
+       self.predictedActiveCells) = [self._gatherOutputs(name)
+                                     for name in ("activeCells",
+                                                  "winnerCells",
+                                                  "predictedActiveCells")]
+    else:
+      (self.activeCells,
+       self.winnerCells,
+       self.predictedActiveCells) = self._gatherResults([
+         _activateShard(shard, columnStart, learn, **inputs)
+         for shard, columnStart in zip(self.shards,
+                                       self.shardColumnStarts)])
+
+
+  def _writeInputs(self, inputs):
+    """
+    Broadcast the inputs to every worker by writing them to the shared buffers.
+    """
+    for name, values in inputs.iteritems():
+      i = INPUT_NAMES.index(name)
+      values = np.asarray(values, dtype="uint32")
+      np.frombuffer(self.inputBuffers[i], dtype="uint32")[:len(values)] = values
+      self.inputLengths[i] = len(values)
+
+
+  def _sendCommand(self, command):
+    for pipe in self.pipes:
+      pipe.send(command)
+
+    errors = [error for error in (pipe.recv() for pipe in self.pipes)
+              if error is not None]
+    if errors:
+      raise RuntimeError("Shard worker failed:\n" + errors[0])
+
+
+  def _gatherOutputs(self, name):
+    """
+    Concatenate the shards' output cells, converted to global cell numbers.
+    The shards are in column order, so the result stays sorted.
+    """
+    i = OUTPUT_NAMES.index(name)
+    return np.concatenate(
+      [np.frombuffer(outputBuffers[i],
+                     dtype="uint32")[:outputLengths[i]] +
+       columnStart*self.cellsPerColumn
+       for outputBuffers, outputLengths, columnStart
+       in zip(self.outputBuffers, self.outputLengths,
+              self.shardColumnStarts)]).astype("uint32")
+
+
+  def _gatherResults(self, resultsByShard):
+    """
+    Like _gatherOutputs, for shards that run in this process.
+    """
+    cellStarts = self.shardColumnStarts * self.cellsPerColumn
+    return [np.concatenate([results[i] + cellStart
+                            for results, cellStart in zip(resultsByShard,
+                                                          cellStarts)])
+            .astype("uint32")
+            for i in xrange(len(resultsByShard[0]))]
+
+
+  def getActiveCells(self):
+    return self.activeCells
+
+
+  def getWinnerCells(self):
+    return self.winnerCells
+
+
+  def getPredictedActiveCells(self):
+    return self.predictedActiveCells
+
+
+  def numberOfColumns(self):
+    return self.columnCount
+
+
+  def numberOfCells(self):
+    return self.columnCount * self.cellsPerColumn
+
+
+  def getCellsPerColumn(self):
+    return self.cellsPerColumn
+
+
+
+class ShardedApicalTiebreakPairMemory(ShardedApicalTiebreakTemporalMemory):
+  """
+  Sharded ApicalTiebreakPairMemory.
+  """
+
+  def compute(self,
+              activeColumns,
+              basalInput,
+              apicalInput=(),
+              basalGrowthCandidates=None,
+              apicalGrowthCandidates=None,
+              learn=True):
+    """
+    Perform one timestep. See ApicalTiebreakPairMemory.compute.
+    """
+    if basalGrowthCandidates is None:
+      basalGrowthCandidates = basalInput
+
+    if apicalGrowthCandidates is None:
+      apicalGrowthCandidates = apicalInput
+
+    self.depolarizeCells(basalInput, apicalInput, learn)
+    self.activateCells(activeColumns, basalInput, apicalInput,
+                       basalGrowthCandidates, apicalGrowthCandidates, learn)
+
+
+  def getPredictedCells(self):
+    """
+    @return (numpy array)
+    Cells that were predicted for this timestep
+    """
+    return self.predictedCells
+
+
+
+class ShardedApicalTiebreakSequenceMemory(ShardedApicalTiebreakTemporalMemory):
+  """
+  Sharded ApicalTiebreakSequenceMemory. Every shard's basal input is the
+  previous active cells of all shards, so each timestep needs two rounds:
+  activate all shards, then depolarize all shards.
+  """
+
+  def __init__(self,
+               columnCount=2048,
+               apicalInputSize=0,
+               cellsPerColumn=32,
+               shardCount=2,
+               useProcesses=True,
+               seed=42,
+               **params):
+    super(ShardedApicalTiebreakSequenceMemory, self).__init__(
+      columnCount=columnCount,
+      basalInputSize=columnCount*cellsPerColumn,
+      apicalInputSize=apicalInputSize,
+      cellsPerColumn=cellsPerColumn,
+      shardCount=shardCount,
+      useProcesses=useProcesses,
+      seed=seed,
+      **params)
+
+    self.prevApicalInput = np.empty(0, dtype="uint32")
+    self.prevApicalGrowthCandidates = np.empty(0, dtype="uint32")
+    self.prevPredictedCells = np.empty(0, dtype="uint32")
+
+
+  def reset(self):
+    """
+    Clear all cell and segment activity.
+    """
+    super(ShardedApicalTiebreakSequenceMemory, self).reset()
+
+    self.prevApicalInput = np.empty(0, dtype="uint32")
+    self.prevApicalGrowthCandidates = np.empty(0, dtype="uint32")
+    self.prevPredictedCells = np.empty(0, dtype="uint32")
+
+
+  def compute(self,
+              activeColumns,
+              apicalInput=(),
+              apicalGrowthCandidates=None,
+              learn=True):
+    """
+    Perform one timestep. See ApicalTiebreakSequenceMemory.compute.
+    """
+    apicalInput = np.asarray(apicalInput, dtype="uint32")
+
+    if apicalGrowthCandidates is None:
+      apicalGrowthCandidates = apicalInput
+    apicalGrowthCandidates = np.asarray(apicalGrowthCandidates, dtype="uint32")
+
+    self.prevPredictedCells = self.predictedCells
+
+    self.activateCells(activeColumns, self.activeCells, self.prevApicalInput,
+                       self.winnerCells, self.prevApicalGrowthCandidates, learn)
+    self.depolarizeCells(self.activeCells, apicalInput, learn)
+
+    self.prevApicalInput = apicalInput.copy()
+    self.prevApicalGrowthCandidates = apicalGrowthCandidates.copy()
+
+
+  def getPredictedCells(self):
+    """
+    @return (numpy array)
+    The prediction from the previous timestep
+    """
+    return self.prevPredictedCells
+
+
+  def getNextPredictedCells(self):
+    """
+    @return (numpy array)
+    The prediction for the next timestep
+    """
+    return self.predictedCells
+
+
+
+def _depolarizeShard(shard, learn, basalInput, apicalInput):
+  """
+  @return (tuple)
+  The shard's predicted cells, in shard-local cell numbers
+  """
+  shard.depolarizeCells(np.asarray(basalInput, dtype="uint32"),
+                        np.asarray(apicalInput, dtype="uint32"), learn)
+  return (shard.predictedCells,)
+
+
+
+def _activateShard(shard, columnStart, learn, activeColumns,
+                   basalReinforceCandidates, apicalReinforceCandidates,
+                   basalGrowthCandidates, apicalGrowthCandidates):
+  """
+  Activate the shard's columns among the global active columns.
+
+  @return (tuple)
+  The shard's active, winner and predicted active cells, in shard-local cell
+  numbers
+  """
+  activeColumns = np.asarray(activeColumns, dtype="uint32")
+  shardColumns = activeColumns[(activeColumns >= columnStart) &
+                               (activeColumns < columnStart + shard.columnCount)]
+
+  shard.activateCells((shardColumns - columnStart).astype("uint32"),
+                      np.asarray(basalReinforceCandidates, dtype="uint32"),
+                      np.asarray(apicalReinforceCandidates, dtype="uint32"),
+                      np.asarray(basalGrowthCandidates, dtype="uint32"),
+                      np.asarray(apicalGrowthCandidates, dtype="uint32"),
+                      learn)
+  return (shard.activeCells, shard.winnerCells, shard.predictedActiveCells)
+
+
+
+def _runShardWorker(pipe, shardParams, columnStart, inputBuffers, inputLengths,
+                    outputBuffers, outputLengths):
+  """
+  Main loop of a shard's worker process. Reads commands from the pipe and
+  answers each with None, or with a traceback if the command failed.
+  """
+  shard = ApicalTiebreakTemporalMemory(**shardParams)
+  inputArrays = [np.frombuffer(inputBuffer, dtype="uint32")
+                 for inputBuffer in inputBuffers]
+  outputArrays = [np.frombuffer(outputBuffer, dtype="uint32")
+                  for outputBuffer in outputBuffers]
+
+  def readInput(name):
+    # Copy, because the shard may keep references to its inputs.
+    i = INPUT_NAMES.index(name)
+    return inputArrays[i][:inputLengths[i]].copy()
+
+  def writeOutputs(names, results):
+    for name, cells in zip(names, results):
+      i = OUTPUT_NAMES.index(name)
+      outputArrays[i][:len(cells)] = cells
+      outputLengths[i] = len(cells)
+
+  while True:
+    command = pipe.recv()
+    if command[0] == "close":
+      break
+
+    try:
+      if command[0] == "depolarize":
+        learn = command[1]
+        writeOutputs(("predictedCells",),
+                     _depolarizeShard(shard, learn,
+                                      readInput("basalInput"),
+                                      readInput("apicalInput")))
+      elif command[0] == "activate":
+        learn = command[1]
+        writeOutputs(("activeCells", "winnerCells", "predictedActiveCells"),
+                     _activateShard(
+                       shard, columnStart, learn,
+                       readInput("activeColumns"),
+                       readInput("basalReinforceCandidates"),
+                       readInput("apicalReinforceCandidates"),
+                       readInput("basalGrowthCandidates"),
+                       readInput("apicalGrowthCandidates")))
+      elif command[0] == "reset":
+        shard.reset()
+
+      pipe.send(None)
+    except Exception:
+      pipe.send(traceback.format_exc())
+
+  pipe.close()
@@ -20,7 +20,9 @@
 # ----------------------------------------------------------------------
 
 import numpy
+import scipy.sparse
 
+from htmresearch.support import connections_checkpoint
 from nupic.bindings.math import SparseMatrix, GetNTAReal, Random
 
 
@@ -183,12 +185,41 @@ class ColumnPooler(object):
     # Each row represents one segment on a cell, so each cell potentially has
     # 1 proximal segment and 1+len(lateralInputWidths) distal segments.
     self.proximalPermanences = SparseMatrix(cellCount, inputWidth)
-    self.internalDistalPermanences = SparseMatrix(cellCount, cellCount)
-    self.distalPermanences = tuple(SparseMatrix(cellCount, n)
-                                   for n in lateralInputWidths)
+
+    # All distal segments are stored in one block diagonal matrix, so that the
+    # activity of every distal source is computed in one pass. Distal source 0
+    # is this layer's own previous activity, and source i+1 is lateral input i.
+    # The segments of source s are rows [s*cellCount, (s+1)*cellCount), and its
+    # inputs are columns [distalInputOffsets[s], distalInputOffsets[s+1]).
+    distalInputWidths = (cellCount,) + tuple(lateralInputWidths)
+    self.distalInputOffsets = numpy.concatenate(
+      ([0], numpy.cumsum(distalInputWidths))).astype("uint32")
+    self.distalPermanences = SparseMatrix(cellCount * len(distalInputWidths),
+                                          self.distalInputOffsets[-1])
 
     self.useInertia=True
 
+    self._initEphemerals()
+
+
+  def _getEphemeralMembers(self):
+    """
+    List of members that are derived from the others. They aren't saved by
+    saveCheckpoint.
+    """
+    return [
+      "_connectedMatrices",
+      ]
+
+
+  def _initEphemerals(self):
+    """
+    Initialize the members listed by _getEphemeralMembers.
+    """
+    # The connected synapses used by inferBatch, computed on first use and
+    # cleared whenever the permanences are learned on.
+    self._connectedMatrices = None
+
 
   def compute(self, feedforwardInput=(), lateralInputs=(),
               feedforwardGrowthCandidates=None, learn=True,
@@ -296,26 +327,30 @@ class ColumnPooler(object):
     # Finally, now that we have decided which cells we should be learning on, do
     # the actual learning.
     if len(feedforwardInput) > 0:
+      self._connectedMatrices = None
+
       self._learn(self.proximalPermanences, self._random,
                   self.activeCells, feedforwardInput,
                   feedforwardGrowthCandidates, self.sampleSizeProximal,
                   self.initialProximalPermanence, self.synPermProximalInc,
                   self.synPermProximalDec, self.connectedPermanenceProximal)
 
-      # External distal learning
-      for i, lateralInput in enumerate(lateralInputs):
-        self._learn(self.distalPermanences[i], self._random,
-                    self.activeCells, lateralInput, lateralInput,
-                    self.sampleSizeDistal, self.initialDistalPermanence,
-                    self.synPermDistalInc, self.synPermDistalDec,
-                    self.connectedPermanenceDistal)
+      # Distal learning. Adjust the permanences of every source at once, then
+      # grow synapses on the external sources, then on the internal source.
+      distalInputs = (prevActiveCells,) + tuple(lateralInputs)
+      distalSegments = self._getDistalSegments(self.activeCells,
+                                               len(distalInputs))
+      self._adjustPermanences(self.distalPermanences, distalSegments,
+                              self._getDistalInput(distalInputs),
+                              self.synPermDistalInc, self.synPermDistalDec)
 
-      # Internal distal learning
-      self._learn(self.internalDistalPermanences, self._random,
-                  self.activeCells, prevActiveCells, prevActiveCells,
-                  self.sampleSizeDistal, self.initialDistalPermanence,
-                  self.synPermDistalInc, self.synPermDistalDec,
-                  self.connectedPermanenceDistal)
+      for source in range(1, len(distalInputs)) + [0]:
+        self._growSynapses(
+          self.distalPermanences, self._random,
+          self._getDistalSegments(self.activeCells, 1, source),
+          numpy.asarray(distalInputs[source], dtype="uint32") +
+          self.distalInputOffsets[source],
+          self.sampleSizeDistal, self.initialDistalPermanence)
 
 
   def _computeInferenceMode(self, feedforwardInput, lateralInputs):
@@ -344,17 +379,144 @@ class ColumnPooler(object):
     feedforwardSupportedCells = numpy.where(
       overlaps >= self.minThresholdProximal)[0]
 
-    # Calculate the number of active segments on each cell
-    numActiveSegmentsByCell = numpy.zeros(self.cellCount, dtype="int")
-    overlaps = self.internalDistalPermanences.rightVecSumAtNZGteThresholdSparse(
-      prevActiveCells, self.connectedPermanenceDistal)
-    numActiveSegmentsByCell[overlaps >= self.activationThresholdDistal] += 1
-    for i, lateralInput in enumerate(lateralInputs):
-      overlaps = self.distalPermanences[i].rightVecSumAtNZGteThresholdSparse(
-        lateralInput, self.connectedPermanenceDistal)
-      numActiveSegmentsByCell[overlaps >= self.activationThresholdDistal] += 1
+    # Calculate the number of active segments on each cell, with one pass over
+    # the distal segments of all sources. Sources without input don't count.
+    distalInputs = (prevActiveCells,) + tuple(lateralInputs)
+    overlaps = self.distalPermanences.rightVecSumAtNZGteThresholdSparse(
+      self._getDistalInput(distalInputs), self.connectedPermanenceDistal)
+    numActiveSegmentsByCell = numpy.count_nonzero(
+      overlaps.reshape(-1, self.cellCount)[:len(distalInputs)] >=
+      self.activationThresholdDistal, axis=0)
+
+    self.activeCells = self._selectActiveCells(feedforwardSupportedCells,
+                                               numActiveSegmentsByCell,
+                                               prevActiveCells)
+
 
-    chosenCells = []
+  def inferBatch(self, feedforwardInputs, lateralInputs=None):
+    """
+    Run inference on a batch of independent trials. The result is the same as
+    running the trials one at a time with compute(learn=False), with a reset
+    before each trial, but the proximal and lateral overlaps of every
+    sensation in the batch are computed with one sparse matrix product each.
+
+    The pooler is reset afterwards.
+
+    Parameters:
+    ----------------------------
+    @param  feedforwardInputs (list of lists of sequences)
+            For each trial, the sorted indices of the active feedforward input
+            bits of each sensation
+
+    @param  lateralInputs (list of lists of lists of sequences, or None)
+            For each trial, the lateral inputs of each sensation, as passed to
+            compute. If None, there is no lateral input.
+
+    @return (list of numpy arrays)
+            For each trial, the active cells after its last sensation
+    """
+    if lateralInputs is None:
+      lateralInputs = [[()] * len(trial) for trial in feedforwardInputs]
+
+    sensations = [(trial, step)
+                  for trial, steps in enumerate(feedforwardInputs)
+                  for step in xrange(len(steps))]
+    numLateralSources = [len(lateralInputs[trial][step])
+                         for trial, step in sensations]
+
+    # Compute the overlaps of every sensation at once. Only the internal
+    # distal overlaps depend on the previous activity, so they are computed
+    # step by step.
+    (connectedProximal,
+     connectedInternal,
+     connectedLateral) = self._getConnectedMatrices()
+
+    proximalOverlaps = connectedProximal.dot(
+      _getInputMatrix([feedforwardInputs[trial][step]
+                       for trial, step in sensations],
+                      self.inputWidth)).tocsc()
+
+    lateralOverlaps = connectedLateral.dot(
+      _getInputMatrix(
+        [self._getDistalInput(((),) + tuple(lateralInputs[trial][step])) -
+         self.cellCount
+         for trial, step in sensations],
+        self.distalInputOffsets[-1] - self.cellCount)).tocsc()
+
+    activeCellsByTrial = []
+    for i, (trial, step) in enumerate(sensations):
+      if step == 0:
+        self.reset()
+      prevActiveCells = self.activeCells
+
+      feedforwardSupportedCells = numpy.where(
+        _getColumn(proximalOverlaps, i) >= self.minThresholdProximal)[0]
+
+      overlaps = numpy.concatenate((
+        numpy.asarray(
+          connectedInternal[:, prevActiveCells].sum(axis=1)).ravel(),
+        _getColumn(lateralOverlaps, i)))
+      numActiveSegmentsByCell = numpy.count_nonzero(
+        overlaps.reshape(-1, self.cellCount)[:1 + numLateralSources[i]] >=
+        self.activationThresholdDistal, axis=0)
+
+      self.activeCells = self._selectActiveCells(feedforwardSupportedCells,
+                                                 numActiveSegmentsByCell,
+                                                 prevActiveCells)
+
+      if step == len(feedforwardInputs[trial]) - 1:
+        activeCellsByTrial.append(self.activeCells)
+
+    self.reset()
+    return activeCellsByTrial
+
+
+  def _getConnectedMatrices(self):
+    """
+    Get the connected synapses as scipy matrices, computing them if the
+    permanences were learned on since the last call.
+
+    @return (tuple)
+    - connectedProximal: CSR matrix of the proximal synapses
+    - connectedInternal: CSC matrix of the distal synapses of source 0, the
+      layer's own previous activity
+    - connectedLateral: CSR matrix of the distal synapses of the lateral
+      sources, with the lateral inputs' columns starting at 0
+    """
+    key = (self.connectedPermanenceProximal, self.connectedPermanenceDistal)
+    if self._connectedMatrices is None or self._connectedMatrices[0] != key:
+      connectedProximal = _getConnectedMatrix(
+        self.proximalPermanences, self.connectedPermanenceProximal)
+      connectedDistal = _getConnectedMatrix(
+        self.distalPermanences, self.connectedPermanenceDistal)
+      self._connectedMatrices = (
+        key,
+        (connectedProximal,
+         connectedDistal[:self.cellCount, :self.cellCount].tocsc(),
+         connectedDistal[self.cellCount:, self.cellCount:]))
+
+    return self._connectedMatrices[1]
+
+
+  def _selectActiveCells(self, feedforwardSupportedCells,
+                         numActiveSegmentsByCell, prevActiveCells):
+    """
+    Choose the active cells from their feedforward and lateral support.
+
+    Parameters:
+    ----------------------------
+    @param  feedforwardSupportedCells (numpy array)
+            Sorted cells with enough proximal overlap
+
+    @param  numActiveSegmentsByCell (numpy array)
+            The number of active distal segments of each cell
+
+    @param  prevActiveCells (numpy array)
+            The previously active cells
+
+    @return (numpy array) The sorted active cells
+    """
+    chosenCells = numpy.empty(0, dtype="uint32")
 
     # First, activate the FF-supported cells that have the highest number of
     # lateral active segments (as long as it's not 0)
@@ -364,14 +526,12 @@ class ColumnPooler(object):
       numActiveSegsForFFSuppCells = numActiveSegmentsByCell[
         feedforwardSupportedCells]
 
-      # This loop will select the FF-supported AND laterally-active cells, in
-      # order of descending lateral activation, until we exceed the sdrSize
-      # quorum - but will exclude cells with 0 lateral active segments.
-      ttop = numpy.max(numActiveSegsForFFSuppCells)
-      while ttop > 0 and len(chosenCells) < self.sdrSize:
-        chosenCells = numpy.union1d(chosenCells,
-                    feedforwardSupportedCells[numActiveSegsForFFSuppCells >= ttop])
-        ttop -= 1
+      # Select the FF-supported AND laterally-active cells, in order of
+      # descending lateral activation, until we exceed the sdrSize quorum - but
+      # exclude cells with 0 lateral active segments.
+      chosenCells = _selectByDescendingCount(
+        feedforwardSupportedCells.astype("uint32"),
+        numActiveSegsForFFSuppCells, self.sdrSize, minCount=1)
 
     # If we haven't filled the sdrSize quorum, add in inertial cells.
     if len(chosenCells) < self.sdrSize:
@@ -393,12 +553,13 @@ class ColumnPooler(object):
           numActiveSegsForPrevCells = numActiveSegsForPrevCells[:inertialCap]
 
           # Activate groups of previously active cells by order of their lateral
-          # support until we either meet quota or run out of cells.
-          ttop = numpy.max(numActiveSegsForPrevCells)
-          while ttop >= 0 and len(chosenCells) < self.sdrSize:
-            chosenCells = numpy.union1d(chosenCells,
-                        prevCells[numActiveSegsForPrevCells >= ttop])
-            ttop -= 1
+          # support until we either meet quota or run out of cells. These cells
+          # aren't in chosenCells yet.
+          chosenCells = numpy.union1d(
+            chosenCells,
+            _selectByDescendingCount(prevCells, numActiveSegsForPrevCells,
+                                     self.sdrSize - len(chosenCells),
+                                     minCount=0))
 
     # If we haven't filled the sdrSize quorum, add cells that have feedforward
     # support and no lateral support.
@@ -426,7 +587,7 @@ class ColumnPooler(object):
         chosenCells = numpy.append(chosenCells, remFFcells)
 
     chosenCells.sort()
-    self.activeCells = numpy.asarray(chosenCells, dtype="uint32")
+    return numpy.asarray(chosenCells, dtype="uint32")
 
 
   def numberOfInputs(self):
@@ -502,14 +663,10 @@ class ColumnPooler(object):
 
     n = 0
 
-    for cell in cells:
-      if self.internalDistalPermanences.nNonZerosOnRow(cell) > 0:
+    for segment in self._getDistalSegments(cells, self._numDistalSources()):
+      if self.distalPermanences.nNonZerosOnRow(segment) > 0:
         n += 1
 
-      for permanences in self.distalPermanences:
-        if permanences.nNonZerosOnRow(cell) > 0:
-          n += 1
-
     return n
 
 
@@ -525,14 +682,10 @@ class ColumnPooler(object):
     if cells is None:
       cells = xrange(self.numberOfCells())
 
-    n = _countWhereGreaterEqualInRows(self.internalDistalPermanences, cells,
-                                      self.connectedPermanenceDistal)
-
-    for permanences in self.distalPermanences:
-      n += _countWhereGreaterEqualInRows(permanences, cells,
-                                         self.connectedPermanenceDistal)
-
-    return n
+    return _countWhereGreaterEqualInRows(
+      self.distalPermanences,
+      self._getDistalSegments(cells, self._numDistalSources()),
+      self.connectedPermanenceDistal)
 
 
   def numberOfDistalSynapses(self, cells=None):
@@ -547,14 +700,60 @@ class ColumnPooler(object):
     if cells is None:
       cells = xrange(self.numberOfCells())
     n = 0
-    for cell in cells:
-      n += self.internalDistalPermanences.nNonZerosOnRow(cell)
-
-      for permanences in self.distalPermanences:
-        n += permanences.nNonZerosOnRow(cell)
+    for segment in self._getDistalSegments(cells, self._numDistalSources()):
+      n += self.distalPermanences.nNonZerosOnRow(segment)
     return n
 
 
+  def getDistalSegmentPermanences(self, cell, source):
+    """
+    Returns the permanences of one distal segment.
+
+    Parameters:
+    ----------------------------
+    @param  cell (int)
+            Index of the cell
+
+    @param  source (int)
+            0 for the segment that receives this layer's previous activity,
+            i+1 for the segment that receives lateral input i
+
+    @return (numpy array) One permanence per bit of the source's input
+    """
+    row = self.distalPermanences.getRow(source*self.cellCount + cell)
+    return row[self.distalInputOffsets[source]:
+               self.distalInputOffsets[source + 1]]
+
+
+  def _numDistalSources(self):
+    return len(self.distalInputOffsets) - 1
+
+
+  def _getDistalSegments(self, cells, numSources, firstSource=0):
+    """
+    Returns the distal segments of these cells for numSources consecutive
+    sources, sorted if the cells are sorted.
+    """
+    if isinstance(cells, numpy.ndarray):
+      cells = cells.astype("uint32", copy=False)
+    else:
+      # Any iterable, e.g. an xrange or a set
+      cells = numpy.fromiter(cells, dtype="uint32")
+    sources = numpy.arange(firstSource, firstSource + numSources,
+                           dtype="uint32")
+    return (sources[:, numpy.newaxis]*self.cellCount + cells).ravel()
+
+
+  def _getDistalInput(self, distalInputs):
+    """
+    Concatenates the active bits of the first len(distalInputs) sources into
+    the distal matrix's column space.
+    """
+    return numpy.concatenate(
+      [numpy.asarray(activeInput, dtype="uint32") + self.distalInputOffsets[i]
+       for i, activeInput in enumerate(distalInputs)]).astype("uint32")
+
+
   def reset(self):
     """
     Reset internal states. When learning this signifies we are to learn a
@@ -562,6 +761,45 @@ class ColumnPooler(object):
     """
     self.activeCells = numpy.empty(0, dtype="uint32")
 
+
+  def saveCheckpoint(self, directory, permanenceDtype="float32"):
+    """
+    Save this pooler to a directory. The synapses are stored as flat arrays
+    that can be memory-mapped by loadCheckpoint.
+
+    @param directory (str)
+
+    @param permanenceDtype (str)
+    "float32", or "uint16" / "uint8" to store fixed-point permanences. A pooler
+    loaded from fixed-point permanences infers the same cells, but its other
+    permanences are rounded to the fixed-point resolution.
+    """
+    connections_checkpoint.saveModel(
+      self, directory,
+      ("proximalPermanences", "distalPermanences"),
+      self._getEphemeralMembers(),
+      permanenceDtype=permanenceDtype,
+      connectedPermanences={
+        "proximalPermanences": self.connectedPermanenceProximal,
+        "distalPermanences": self.connectedPermanenceDistal})
+
+
+  @staticmethod
+  def loadCheckpoint(directory, mmap=True):
+    """
+    Load a pooler saved by saveCheckpoint.
+
+    @param directory (str)
+
+    @param mmap (bool)
+    If True, the permanences are memory-mapped read-only, and learning raises a
+    ValueError. If False, they are copied into memory and the pooler can keep
+    learning.
+
+    @return (ColumnPooler)
+    """
+    return connections_checkpoint.loadModel(directory, mmap)
+
   def getUseInertia(self):
     """
     Get whether we actually use inertia  (i.e. a fraction of the
@@ -615,13 +853,41 @@ class ColumnPooler(object):
 
     For remaining parameters, see the __init__ docstring.
     """
+    ColumnPooler._adjustPermanences(permanences, activeCells, activeInput,
+                                    permanenceIncrement, permanenceDecrement)
+    ColumnPooler._growSynapses(permanences, rng, activeCells,
+                               growthCandidateInput, sampleSize,
+                               initialPermanence, activeInput)
+
 
+  @staticmethod
+  def _adjustPermanences(permanences, activeCells, activeInput,
+                         permanenceIncrement, permanenceDecrement):
+    """
+    Reinforce the active synapses of the active cells and punish their
+    inactive synapses. Only existing synapses are touched, so the rows of a
+    block diagonal matrix can be adjusted together, using the active input of
+    every block.
+    """
     permanences.incrementNonZerosOnOuter(
       activeCells, activeInput, permanenceIncrement)
     permanences.incrementNonZerosOnRowsExcludingCols(
       activeCells, activeInput, -permanenceDecrement)
     permanences.clipRowsBelowAndAbove(
       activeCells, 0.0, 1.0)
+
+
+  @staticmethod
+  def _growSynapses(permanences, rng, activeCells, growthCandidateInput,
+                    sampleSize, initialPermanence, activeInput=None):
+    """
+    Grow new synapses from the active cells to the growth candidates, up to
+    sampleSize synapses to the active input per cell. If activeInput is None,
+    the growth candidates are the active input.
+    """
+    if activeInput is None:
+      activeInput = growthCandidateInput
+
     if sampleSize == -1:
       permanences.setZerosOnOuter(
         activeCells, activeInput, initialPermanence)
@@ -669,6 +935,86 @@ def _sample(rng, arr, k):
   return selected
 
 
+def _getConnectedMatrix(permanences, connectedPermanence):
+  """
+  Returns a scipy CSR matrix with a 1 for every synapse of this permanence
+  matrix that is at least connectedPermanence.
+  """
+  if isinstance(permanences, connections_checkpoint.CheckpointMatrix):
+    segments, inputStarts = permanences.getConnectedSynapses(
+      connectedPermanence)
+    return scipy.sparse.csc_matrix(
+      (numpy.ones(len(segments), dtype="int32"), segments, inputStarts),
+      shape=(permanences.nRows(), permanences.nCols())).tocsr()
+
+  # Every synapse, sorted by row and then by column
+  rows, columns, values = permanences.getAllNonZeros(True)
+  connected = values >= numpy.float32(connectedPermanence)
+  rows = rows[connected]
+
+  # Older numpy versions reject a minlength of 0.
+  rowLengths = numpy.bincount(
+    rows, minlength=max(permanences.nRows(), 1))[:permanences.nRows()]
+  indptr = numpy.concatenate(([0], numpy.cumsum(rowLengths))).astype("int32")
+
+  return scipy.sparse.csr_matrix(
+    (numpy.ones(len(rows), dtype="int32"),
+     columns[connected].astype("int32"), indptr),
+    shape=(permanences.nRows(), permanences.nCols()))
+
+
+def _getInputMatrix(activeInputs, inputWidth):
+  """
+  Returns a scipy CSC matrix with one column per input, with a 1 at each of
+  its active bits.
+  """
+  lengths = [len(activeInput) for activeInput in activeInputs]
+  indptr = numpy.concatenate(([0], numpy.cumsum(lengths))).astype("int32")
+  indices = numpy.concatenate(
+    [numpy.empty(0, dtype="int32")] +
+    [numpy.asarray(activeInput, dtype="int32")
+     for activeInput in activeInputs])
+
+  return scipy.sparse.csc_matrix(
+    (numpy.ones(len(indices), dtype="int32"), indices, indptr),
+    shape=(inputWidth, len(activeInputs)))
+
+
+def _getColumn(matrix, column):
+  """
+  Returns a column of a scipy CSC matrix as a dense array.
+  """
+  dense = numpy.zeros(matrix.shape[0], dtype=matrix.dtype)
+  begin, end = matrix.indptr[column], matrix.indptr[column + 1]
+  dense[matrix.indices[begin:end]] = matrix.data[begin:end]
+  return dense
+
+
+def _selectByDescendingCount(cells, counts, k, minCount):
+  """
+  Equivalent to:
+
+  selected = []
+  ttop = max(counts)
+  while ttop >= minCount and len(selected) < k:
+    selected = union1d(selected, cells[counts >= ttop])
+    ttop -= 1
+
+  but with one partition instead of one union per count value. The cells
+  whose count ties with the k-th largest count are all selected.
+  """
+  if k <= 0 or len(cells) == 0:
+    return cells[:0]
+
+  if len(counts) >= k:
+    kthLargest = numpy.partition(counts, len(counts) - k)[len(counts) - k]
+    threshold = max(kthLargest, minCount)
+  else:
+    threshold = minCount
+
+  return cells[counts >= threshold]
+
+
 def _countWhereGreaterEqualInRows(sparseMatrix, rows, threshold):
   """
   Like countWhereGreaterOrEqual, but for an arbitrary selection of rows, and
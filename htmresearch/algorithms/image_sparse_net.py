@@ -33,6 +33,12 @@ Example use:
   images = net.loadMatlabImages("../data/IMAGES.mat", "IMAGES")
   net.train(images, numIterations=1000)
 
+  # or, for image sets that don't fit in memory, stored in one or several .npy
+  # files along the last axis
+  images = net.loadChunkedNumpyImages(["../data/images_0.npy",
+                                       "../data/images_1.npy"])
+  net.train(images, numIterations=1000, prefetch=True)
+
   # visualize loss history and basis
   net.plotLoss(filename="loss_history.png")
   net.plotBasis(filename="basis_functions.png")
@@ -73,18 +79,21 @@ class ImageSparseNet(SparseNet):
     return images
 
 
-  def loadNumpyImages(self, path, key=None):
+  def loadNumpyImages(self, path, key=None, mmapMode=None):
     """
     Loads images using numpy.
 
     :param path:      (string)   Path to data file
     :param key:       (string)   Object key in data file if it's a dict
+    :param mmapMode:  (string)   If not None, memory-map a .npy file with this
+                                 mode (e.g. 'r') instead of reading it, so
+                                 that only the sampled patches are loaded
 
     Also stores image dimensions to later the original images. If there are
     multiple channels, self.numChannels will store the number of channels,
     otherwise it will be set to None.
     """
-    data = np.load(path)
+    data = np.load(path, mmap_mode=mmapMode)
 
     if isinstance(data, dict):
       if key is None:
@@ -102,6 +111,24 @@ class ImageSparseNet(SparseNet):
     return data
 
 
+  def loadChunkedNumpyImages(self, paths, mmapMode="r"):
+    """
+    Loads images stored in several .npy files, each holding some of the images
+    along the last axis. The files are memory-mapped, so only the sampled
+    patches are loaded.
+
+    :param paths:     (list)     Paths to the .npy files, in image order
+    :param mmapMode:  (string)   Mode used to memory-map the files
+
+    Also stores image dimensions, like loadNumpyImages.
+    """
+    data = ChunkedImages([np.load(path, mmap_mode=mmapMode) for path in paths])
+
+    self._initializeDimensions(data)
+
+    return data
+
+
   def _initializeDimensions(self, inputData):
     """
     Stores the training images' dimensions, for convenience.
@@ -152,18 +179,18 @@ class ImageSparseNet(SparseNet):
 
     for i in xrange(self.batchSize):
       # choose random image
-      imageIdx = np.random.choice(range(self.numImages))
+      imageIdx = np.random.choice(self.numImages)
 
       # pick random starting row
       rows = self.imageHeight - 2 * patchSize
-      rowNumber = minIndex + np.random.choice(range(rows))
+      rowNumber = minIndex + np.random.choice(rows)
 
       if self.imageHeight is None:
         patch = inputData[rowNumber : rowNumber + patchSize, imageIdx]
       else:
         # pick random starting column
         cols = self.imageWidth - 2 * patchSize
-        colNumber = minIndex + np.random.choice(range(cols))
+        colNumber = minIndex + np.random.choice(cols)
 
         if self.numChannels is None:
           patch = inputData[rowNumber : rowNumber + patchSize,
@@ -177,3 +204,36 @@ class ImageSparseNet(SparseNet):
       batch[:, i] = patch
 
     return batch
+
+
+
+class ChunkedImages(object):
+  """
+  Image set split into several arrays (e.g. memory-mapped .npy files) along
+  the last axis, indexed like their concatenation.
+
+  Only indexing with a single image index as the last index is supported, as
+  done when sampling patches.
+  """
+
+  def __init__(self, chunks):
+    """
+    :param chunks:    (list)     Arrays of images, with the same dimensions
+                                 except the last one
+    """
+    if len(set(chunk.shape[:-1] for chunk in chunks)) != 1:
+      raise ValueError("All chunks must have the same image dimensions.")
+
+    self.chunks = chunks
+    self._chunkStarts = np.cumsum([0] + [chunk.shape[-1] for chunk in chunks])
+    self.shape = chunks[0].shape[:-1] + (int(self._chunkStarts[-1]),)
+
+
+  def __getitem__(self, key):
+    imageIdx = key[-1]
+    if imageIdx < 0 or imageIdx >= self.shape[-1]:
+      raise IndexError("Image index out of range.")
+
+    chunkIdx = np.searchsorted(self._chunkStarts, imageIdx, side="right") - 1
+    return self.chunks[chunkIdx][key[:-1] +
+                                 (imageIdx - self._chunkStarts[chunkIdx],)]
@@ -145,9 +145,27 @@ class SuperficialLocationModule2D(object):
 
     self.pointOffsets = pointOffsets
 
-    # These coordinates are in units of "cell fields".
-    self.activePoints = np.empty((0,2), dtype="float")
-    self.cellsForActivePoints = np.empty(0, dtype="int")
+    # The offsets of the points placed in a newly activated cell, in units of
+    # "cell fields".
+    self.newPointOffsets = np.array([[iOffset, jOffset]
+                                     for iOffset in pointOffsets
+                                     for jOffset in pointOffsets],
+                                    dtype="float")
+
+    # The active points are stored in preallocated buffers. Only the first
+    # numActivePoints rows are in use, and removing points compacts the rows
+    # in place. The buffers grow if the points ever outnumber them.
+    cellCount = np.prod(self.cellDimensions)
+    capacity = max(cellCount * len(self.newPointOffsets), 1)
+    self.numActivePoints = 0
+    self._points = np.empty((capacity, 2), dtype="float")
+    self._flooredPoints = np.empty((capacity, 2), dtype="int")
+    self._cellsForPoints = np.empty(capacity, dtype="int")
+
+    # The number of active points in each cell. A cell is active iff its count
+    # is nonzero.
+    self.pointCountsByCell = np.zeros(cellCount, dtype="int")
+    self._sensorySupportedMask = np.zeros(cellCount, dtype="bool")
 
     self.activeCells = np.empty(0, dtype="int")
     self.activeSegments = np.empty(0, dtype="uint32")
@@ -167,30 +185,87 @@ class SuperficialLocationModule2D(object):
     self.rng = Random(seed)
 
 
+  @property
+  def activePoints(self):
+    """
+    The coordinates of the active points, in units of "cell fields". This is a
+    view into the point buffer, so it changes with the next shift or anchor.
+    """
+    return self._points[:self.numActivePoints]
+
+
+  @property
+  def cellsForActivePoints(self):
+    """
+    The cell of each active point.
+    """
+    return self._cellsForPoints[:self.numActivePoints]
+
+
   def reset(self):
     """
     Clear the active cells.
     """
-    self.activePoints = np.empty((0,2), dtype="float")
-    self.cellsForActivePoints = np.empty(0, dtype="int")
+    self.numActivePoints = 0
+    self.pointCountsByCell.fill(0)
     self.activeCells = np.empty(0, dtype="int")
 
 
-  def _computeActiveCells(self):
-    # Round each coordinate to the nearest cell.
-    flooredActivePoints = np.floor(self.activePoints).astype("int")
+  def _reservePoints(self, numPoints):
+    """
+    Make sure the buffers can hold this many points.
+    """
+    capacity = len(self._points)
+    if numPoints <= capacity:
+      return
+
+    while capacity < numPoints:
+      capacity *= 2
+
+    n = self.numActivePoints
+    points = np.empty((capacity, 2), dtype="float")
+    points[:n] = self._points[:n]
+    cellsForPoints = np.empty(capacity, dtype="int")
+    cellsForPoints[:n] = self._cellsForPoints[:n]
+
+    self._points = points
+    self._cellsForPoints = cellsForPoints
+    self._flooredPoints = np.empty((capacity, 2), dtype="int")
+
+
+  def _computeCellsForPoints(self, start):
+    """
+    Compute the cell of each active point from index 'start' onward.
+    """
+    n = self.numActivePoints
+
+    # Round each coordinate down to its cell. The coordinates are never
+    # negative, so truncating them is enough.
+    flooredPoints = self._flooredPoints[start:n]
+    flooredPoints[:] = self._points[start:n]
 
     # Convert coordinates to cell numbers.
-    self.cellsForActivePoints = (
-      np.ravel_multi_index(flooredActivePoints.T, self.cellDimensions))
-    self.activeCells = np.unique(self.cellsForActivePoints)
+    cells = self._cellsForPoints[start:n]
+    np.multiply(flooredPoints[:, 0], self.cellDimensions[1], out=cells)
+    np.add(cells, flooredPoints[:, 1], out=cells)
+
+
+  def _computeActiveCells(self):
+    """
+    Recompute the cells of all of the active points.
+    """
+    self._computeCellsForPoints(0)
+    self.pointCountsByCell[:] = np.bincount(
+      self.cellsForActivePoints, minlength=len(self.pointCountsByCell))
+    self.activeCells = np.flatnonzero(self.pointCountsByCell)
 
 
   def activateRandomLocation(self):
     """
     Set the location to a random point.
     """
-    self.activePoints = np.array([np.random.random(2) * self.cellDimensions])
+    self.numActivePoints = 1
+    self._points[0] = np.random.random(2) * self.cellDimensions
     self._computeActiveCells()
 
 
@@ -206,8 +281,9 @@ class SuperficialLocationModule2D(object):
                                  self.cellFieldsPerUnitDistance)
 
     # Shift the active coordinates.
-    np.add(self.activePoints, deltaLocationInCellFields, out=self.activePoints)
-    np.mod(self.activePoints, self.cellDimensions, out=self.activePoints)
+    activePoints = self.activePoints
+    np.add(activePoints, deltaLocationInCellFields, out=activePoints)
+    np.mod(activePoints, self.cellDimensions, out=activePoints)
 
     self._computeActiveCells()
 
@@ -230,27 +306,41 @@ class SuperficialLocationModule2D(object):
     sensorySupportedCells = np.unique(
       self.connections.mapSegmentsToCells(activeSegments))
 
-    inactivated = np.setdiff1d(self.activeCells, sensorySupportedCells)
-    inactivatedIndices = np.in1d(self.cellsForActivePoints,
-                                 inactivated).nonzero()[0]
-    if inactivatedIndices.size > 0:
-      self.activePoints = np.delete(self.activePoints, inactivatedIndices,
-                                    axis=0)
-
-    activated = np.setdiff1d(sensorySupportedCells, self.activeCells)
-
-    activatedCoordsBase = np.transpose(
-      np.unravel_index(activated, self.cellDimensions)).astype('float')
-
-    activatedCoords = np.concatenate(
-      [activatedCoordsBase + [iOffset, jOffset]
-       for iOffset in self.pointOffsets
-       for jOffset in self.pointOffsets]
-    )
-    if activatedCoords.size > 0:
-      self.activePoints = np.append(self.activePoints, activatedCoords, axis=0)
-
-    self._computeActiveCells()
+    # Remove the points in inactivated cells, compacting the buffers in place.
+    self._sensorySupportedMask[sensorySupportedCells] = True
+    inactivated = self.activeCells[
+      ~self._sensorySupportedMask[self.activeCells]]
+    if inactivated.size > 0:
+      keep = self._sensorySupportedMask[self.cellsForActivePoints]
+      numKept = np.count_nonzero(keep)
+      self._points[:numKept] = self.activePoints[keep]
+      self._cellsForPoints[:numKept] = self.cellsForActivePoints[keep]
+      self.numActivePoints = numKept
+      self.pointCountsByCell[inactivated] = 0
+    self._sensorySupportedMask[sensorySupportedCells] = False
+
+    # Add points to the activated cells.
+    activated = sensorySupportedCells[
+      self.pointCountsByCell[sensorySupportedCells] == 0]
+    if activated.size > 0:
+      start = self.numActivePoints
+      self._reservePoints(start +
+                          len(activated) * len(self.newPointOffsets))
+
+      activatedCoordsBase = np.transpose(
+        np.unravel_index(activated, self.cellDimensions))
+      for offset in self.newPointOffsets:
+        end = self.numActivePoints + len(activated)
+        np.add(activatedCoordsBase, offset,
+               out=self._points[self.numActivePoints:end])
+        self.numActivePoints = end
+
+      self._computeCellsForPoints(start)
+      self.pointCountsByCell += np.bincount(
+        self._cellsForPoints[start:self.numActivePoints],
+        minlength=len(self.pointCountsByCell))
+
+    self.activeCells = np.flatnonzero(self.pointCountsByCell)
     self.activeSegments = activeSegments
 
 
@@ -362,6 +452,107 @@ class SuperficialLocationModule2D(object):
 
 
 
+class SuperficialLocationModuleBank2D(SuperficialLocationModule2D):
+  """
+  A bank of SuperficialLocationModule2D modules that have the same cell
+  dimensions but different scales and orientations. Rather than calling
+  shift, anchor and learn on each module, these methods run on all modules
+  at once, with a constant number of numpy operations.
+
+  The modules are stacked vertically into one tall module. Module m's cell
+  [i, j] is the bank's cell [m*rows + i, j], so the bank's cells are the
+  modules' cells concatenated in order, and its cellDimensions are
+  (moduleCount*rows, columns). The active points, anchor connections and
+  active cells are all stored once for the whole bank. Only shift needs to
+  know which module each point is in, so that it can rotate and scale the
+  movement and wrap the point around its own module.
+  """
+
+  def __init__(self,
+               cellDimensions,
+               moduleMapDimensions,
+               orientations,
+               anchorInputSize,
+               **kwargs):
+    """
+    @param cellDimensions (tuple(int, int))
+    The number of cells in each module.
+
+    @param moduleMapDimensions (list of tuple(float, float))
+    The scale of each module.
+
+    @param orientations (list of floats)
+    The rotation of each module, measured in radians.
+
+    @param anchorInputSize (int)
+    The number of input bits in the anchor input.
+
+    Other parameters are the same as SuperficialLocationModule2D's, and they
+    apply to every module.
+    """
+    self.moduleCount = len(orientations)
+    self.moduleCellDimensions = np.asarray(cellDimensions, dtype="int")
+    self.cellsPerModule = np.prod(self.moduleCellDimensions)
+
+    super(SuperficialLocationModuleBank2D, self).__init__(
+      cellDimensions=(self.moduleCount * self.moduleCellDimensions[0],
+                      self.moduleCellDimensions[1]),
+      moduleMapDimensions=(1.0, 1.0),
+      orientation=0.0,
+      anchorInputSize=anchorInputSize,
+      **kwargs)
+
+    # One row per module.
+    self.moduleMapDimensions = np.asarray(moduleMapDimensions, dtype="float")
+    self.cellFieldsPerUnitDistance = (self.moduleCellDimensions /
+                                      self.moduleMapDimensions)
+
+    self.orientation = np.asarray(orientations, dtype="float")
+    self.rotationMatrix = np.array(
+      [[np.cos(self.orientation), -np.sin(self.orientation)],
+       [np.sin(self.orientation), np.cos(self.orientation)]]).transpose(2, 0, 1)
+
+
+  def activateRandomLocation(self):
+    """
+    Set each module's location to a random point.
+    """
+    self.numActivePoints = self.moduleCount
+    activePoints = self.activePoints
+    activePoints[:] = (np.random.random((self.moduleCount, 2)) *
+                       self.moduleCellDimensions)
+    activePoints[:, 0] += (np.arange(self.moduleCount) *
+                           self.moduleCellDimensions[0])
+    self._computeActiveCells()
+
+
+  def shift(self, deltaLocation):
+    """
+    Shift every module's active cells by a vector.
+
+    @param deltaLocation (pair of floats)
+    A translation vector [di, dj].
+    """
+    # Calculate delta in each module's coordinates.
+    deltaLocationInCellFields = (
+      np.matmul(self.rotationMatrix, deltaLocation) *
+      self.cellFieldsPerUnitDistance)
+
+    # Shift the points within their modules, then move them back to their
+    # rows in the bank.
+    modules = self.cellsForActivePoints // self.cellsPerModule
+    moduleRows = modules * self.moduleCellDimensions[0]
+
+    activePoints = self.activePoints
+    activePoints[:, 0] -= moduleRows
+    activePoints += deltaLocationInCellFields[modules]
+    np.mod(activePoints, self.moduleCellDimensions, out=activePoints)
+    activePoints[:, 0] += moduleRows
+
+    self._computeActiveCells()
+
+
+
 class BodyToSpecificObjectModule2D(object):
   """
   Represents the body's location relative to a specific object. Typically
@@ -530,6 +721,16 @@ class BodyToSpecificObjectModule2D(object):
 
       self.activeSegmentsByColumn.append(activeSegments)
 
+    self._activateCandidates(votesByCell)
+
+
+  def _activateCandidates(self, votesByCell):
+    """
+    Activate the cells with the most votes.
+
+    @param votesByCell (numpy array)
+    The number of columns that voted for each cell
+    """
     candidates = np.where(votesByCell == np.max(votesByCell))[0]
 
     # If possible, select only from current active cells.
@@ -549,6 +750,132 @@ class BodyToSpecificObjectModule2D(object):
 
 
 
+class ImplicitBodyToSpecificObjectModule2D(BodyToSpecificObjectModule2D):
+  """
+  Same as BodyToSpecificObjectModule2D, but the reciprocal connections are
+  computed rather than stored.
+
+  BodyToSpecificObjectModule2D grows 4 * cellCount^2 segments per cortical
+  column, plus as many in each SensorToSpecificObjectModule, so its memory and
+  setup time are quadratic in the module size. Those segments encode a fixed
+  relation between body locations, sensor offsets and sensor locations. This
+  class computes the relation with index arithmetic on the 2D cell grid, so it
+  stores no synapses, and its cells and the SensorToSpecificObjectModules'
+  metric cells match the explicit version.
+
+  Because there are no segments, the "activeSegmentsByColumn" and
+  "activeMetricSegments" attributes aren't set.
+  """
+
+  def formReciprocalSynapses(self, sensorToSpecificObjectByColumn):
+    self.connectivity = OffsetConnectivity2D(self.cellDimensions)
+
+    for sensorToSpecificObject in sensorToSpecificObjectByColumn:
+      sensorToSpecificObject.metricConnectivity = self.connectivity
+
+
+  def compute(self, sensorToBodyByColumn, sensorToSpecificObjectByColumn):
+    """
+    Same as BodyToSpecificObjectModule2D.compute.
+    """
+    votesByCell = np.zeros(self.cellCount, dtype="int")
+
+    for (activeSensorToBodyCells,
+         activeSensorToSpecificObjectCells) in zip(
+           sensorToBodyByColumn, sensorToSpecificObjectByColumn):
+      # Each column votes for a cell at most once.
+      votes = self.connectivity.getBodyLocations(
+        activeSensorToSpecificObjectCells, activeSensorToBodyCells)
+      votesByCell[votes] += 1
+
+    self._activateCandidates(votesByCell)
+
+
+
+class OffsetConnectivity2D(object):
+  """
+  The fixed relation between a body location, a sensor offset and a sensor
+  location in a 2D module, i.e. the connectivity that
+  BodyToSpecificObjectModule2D stores as segments.
+
+  Sensor offset cell o represents the offset vector
+    d(o) = (o_i - rows/2, o_j - cols/2)
+  and it covers a 1x1 range of offsets, so each body location b and offset o
+  are related to four sensor locations:
+    s = b + d(o) + e  (mod cellDimensions),  e in {0, -1} x {0, -1}
+  """
+
+  def __init__(self, cellDimensions):
+    """
+    @param cellDimensions (sequence of ints)
+    """
+    self.cellDimensions = np.asarray(cellDimensions)
+    cellCount = np.prod(self.cellDimensions)
+
+    # The four shifts of each offset cell, one row per cell.
+    offset_i, offset_j = np.unravel_index(np.arange(cellCount),
+                                          self.cellDimensions)
+    self.shifts_i = ((offset_i - self.cellDimensions[0] // 2).reshape((-1, 1)) +
+                     [0, -1, 0, -1])
+    self.shifts_j = ((offset_j - self.cellDimensions[1] // 2).reshape((-1, 1)) +
+                     [0, 0, -1, -1])
+
+
+  def getSensorLocations(self, bodyLocationCells, sensorOffsetCells):
+    """
+    Get every sensor location related to an active body location and an active
+    sensor offset.
+
+    @param bodyLocationCells (numpy array)
+    @param sensorOffsetCells (numpy array)
+
+    @return (numpy array)
+    Sorted sensor location cells
+    """
+    return self._shiftCells(bodyLocationCells, sensorOffsetCells, 1)
+
+
+  def getBodyLocations(self, sensorLocationCells, sensorOffsetCells):
+    """
+    Get every body location related to an active sensor location and an active
+    sensor offset.
+
+    @param sensorLocationCells (numpy array)
+    @param sensorOffsetCells (numpy array)
+
+    @return (numpy array)
+    Sorted body location cells
+    """
+    return self._shiftCells(sensorLocationCells, sensorOffsetCells, -1)
+
+
+  def _shiftCells(self, cells, sensorOffsetCells, sign):
+    cells = np.asarray(cells, dtype="int")
+    sensorOffsetCells = np.asarray(sensorOffsetCells, dtype="int")
+    if len(cells) == 0 or len(sensorOffsetCells) == 0:
+      return np.empty(0, dtype="uint32")
+
+    # Many active offsets share shifts, so apply each distinct shift once.
+    shifts = np.unique(np.ravel_multi_index(
+      (np.mod(sign*self.shifts_i[sensorOffsetCells].ravel(),
+              self.cellDimensions[0]),
+       np.mod(sign*self.shifts_j[sensorOffsetCells].ravel(),
+              self.cellDimensions[1])),
+      self.cellDimensions))
+    shift_i, shift_j = np.unravel_index(shifts, self.cellDimensions)
+
+    cell_i, cell_j = np.unravel_index(cells, self.cellDimensions)
+    shifted_i = np.mod(cell_i.reshape((-1, 1)) + shift_i,
+                       self.cellDimensions[0])
+    shifted_j = np.mod(cell_j.reshape((-1, 1)) + shift_j,
+                       self.cellDimensions[1])
+
+    return np.unique(np.ravel_multi_index((shifted_i.ravel(),
+                                           shifted_j.ravel()),
+                                          self.cellDimensions)).astype("uint32")
+
+
+
 class SensorToSpecificObjectModule(object):
   """
   Represents the sensor location relative to a specific object. Typically
@@ -610,6 +937,10 @@ class SensorToSpecificObjectModule(object):
     }
     self.metricConnections = Multiconnections(self.cellCount,
                                               cellCountBySource)
+
+    # Set by ImplicitBodyToSpecificObjectModule2D to compute the metric
+    # connections instead of storing them.
+    self.metricConnectivity = None
     self.anchorConnections = SparseMatrixConnections(self.cellCount,
                                                      anchorInputSize)
 
@@ -635,6 +966,11 @@ class SensorToSpecificObjectModule(object):
     Active cells of a single module that represents the body's location relative
     to a specific object
     """
+    if self.metricConnectivity is not None:
+      self.activeCells = self.metricConnectivity.getSensorLocations(
+        bodyToSpecificObject, sensorToBody)
+      return
+
     overlaps = self.metricConnections.computeActivity({
       "bodyToSpecificObject": bodyToSpecificObject,
       "sensorToBody": sensorToBody,
@@ -31,8 +31,10 @@ class Multiconnections(object):
   A Connections class that organizes its connections by presynaptic layer.
   Every segment can form synapses to multiple presynaptic layers.
 
-  We could port this class to C++ and reduce a lot of redundant segment
-  bookkeeping.
+  All of the sources share one SparseMatrixConnections. Its presynaptic cells
+  are the concatenation of the sources' cells, in order of source name, so
+  source s's cell c is presynaptic cell offsetsBySource[s] + c. Segments are
+  created once, and activity is computed in one pass over all sources.
   """
   def __init__(self, cellCount, cellCountBySource):
     """
@@ -41,10 +43,16 @@ class Multiconnections(object):
       {"customInputName1": 16,
        "customInputName2": 42}
     """
+    self.sources = sorted(cellCountBySource.iterkeys())
+    self.cellCountBySource = dict(cellCountBySource)
 
-    self.connectionsBySource = dict(
-      (source, SparseMatrixConnections(cellCount, presynapticCellCount))
-      for source, presynapticCellCount in cellCountBySource.iteritems())
+    self.offsetsBySource = {}
+    offset = 0
+    for source in self.sources:
+      self.offsetsBySource[source] = offset
+      offset += cellCountBySource[source]
+
+    self.connections = SparseMatrixConnections(cellCount, offset)
 
 
   def computeActivity(self, activeInputsBySource, permanenceThreshold=None):
@@ -55,17 +63,9 @@ class Multiconnections(object):
     The active cells in each source. Example:
       {"customInputName1": np.array([42, 69])}
     """
-    overlaps = None
-
-    for source, connections in self.connectionsBySource.iteritems():
-      o = connections.computeActivity(activeInputsBySource[source],
-                                      permanenceThreshold)
-      if overlaps is None:
-        overlaps = o
-      else:
-        overlaps += o
-
-    return overlaps
+    return self.connections.computeActivity(
+      self._getPresynapticCells(activeInputsBySource, self.sources),
+      permanenceThreshold)
 
 
   def createSegments(self, cells):
@@ -74,18 +74,7 @@ class Multiconnections(object):
 
     @param cells (numpy array)
     """
-    segments = None
-
-    for connections in self.connectionsBySource.itervalues():
-      created = connections.createSegments(cells)
-
-      if segments is None:
-        segments = created
-      else:
-        # Sanity-check that the segment numbers are the same.
-        np.testing.assert_equal(segments, created)
-
-    return segments
+    return self.connections.createSegments(cells)
 
 
   def growSynapses(self, segments, activeInputsBySource, initialPermanence):
@@ -101,9 +90,9 @@ class Multiconnections(object):
 
     @param initialPermanence (float)
     """
-    for source, connections in self.connectionsBySource.iteritems():
-      connections.growSynapses(segments, activeInputsBySource[source],
-                               initialPermanence)
+    self.connections.growSynapses(
+      segments, self._getPresynapticCells(activeInputsBySource, self.sources),
+      initialPermanence)
 
 
   def setPermanences(self, segments, presynapticCellsBySource, permanence):
@@ -129,17 +118,53 @@ class Multiconnections(object):
     @param permanence (float)
     The permanence to assign the synapse
     """
+    sources = [source for source in self.sources
+               if source in presynapticCellsBySource]
+
+    segments = np.tile(np.asarray(segments, dtype="uint32"), len(sources))
     permanences = np.repeat(np.float32(permanence), len(segments))
 
-    for source, connections in self.connectionsBySource.iteritems():
-      if source in presynapticCellsBySource:
-        connections.matrix.setElements(segments, presynapticCellsBySource[source],
-                                       permanences)
+    self.connections.matrix.setElements(
+      segments, self._getPresynapticCells(presynapticCellsBySource, sources),
+      permanences)
 
 
   def mapSegmentsToCells(self, segments):
     """
     @param segments (numpy array)
     """
-    connections = next(self.connectionsBySource.itervalues())
-    return connections.mapSegmentsToCells(segments)
+    return self.connections.mapSegmentsToCells(segments)
+
+
+  def filterSegmentsByCell(self, segments, cells):
+    """
+    @param segments (numpy array)
+    @param cells (numpy array)
+    """
+    return self.connections.filterSegmentsByCell(segments, cells)
+
+
+  def getSegmentPermanences(self, segment, source):
+    """
+    Get the permanences of a segment's synapses to one source.
+
+    @param segment (int)
+    @param source (str)
+
+    @return (numpy array)
+    One permanence per cell of the source
+    """
+    offset = self.offsetsBySource[source]
+    return self.connections.matrix.getRow(segment)[
+      offset:offset + self.cellCountBySource[source]]
+
+
+  def _getPresynapticCells(self, cellsBySource, sources):
+    """
+    Concatenate the cells of these sources into the shared presynaptic space.
+    """
+    return np.concatenate(
+      [np.empty(0, dtype="uint32")] +
+      [np.asarray(cellsBySource[source], dtype="uint32") +
+       np.uint32(self.offsetsBySource[source])
+       for source in sources])
@@ -26,6 +26,8 @@ A single-layer approach to computing a location
 import numpy as np
 
 from htmresearch.support import numpy_helpers as np2
+from htmresearch.support.segment_activity import (
+  computeSegmentActivity, computeCandidateSegmentActivity)
 from nupic.bindings.math import SparseMatrixConnections, Random
 
 
@@ -120,23 +122,39 @@ class SingleLayerLocationMemory(object):
     @param featureLocationGrowthCandidates (sorted numpy array)
     """
     prevActiveCells = self.activeCells
+    learnTransition = learn and len(newLocation) > 0
+
+    # The potential overlaps are computed in the same pass, and they're reused
+    # for learning.
+    (prevLocationOverlaps,
+     prevLocationPotentialOverlaps) = computeSegmentActivity(
+       self.internalConnections, prevActiveCells, self.connectedPermanence,
+       self.activationThreshold)
+
+    # A segment pair can only be active or matching if its internal part is.
+    # Only compute the delta activity of these segments.
+    deltaCandidates = prevLocationOverlaps >= self.activationThreshold
+    if learnTransition:
+      deltaCandidates |= (prevLocationPotentialOverlaps >=
+                          self.learningThreshold)
+    (deltaOverlaps,
+     deltaPotentialOverlaps) = self._computeDeltaActivity(
+       deltaLocation, np.flatnonzero(deltaCandidates))
 
     self.activeDeltaSegments = np.where(
-      (self.internalConnections.computeActivity(
-        prevActiveCells, self.connectedPermanence
-      ) >= self.activationThreshold)
-      &
-      (self.deltaConnections.computeActivity(
-        deltaLocation, self.connectedPermanence
-      ) >= self.activationThreshold))[0]
+      (prevLocationOverlaps >= self.activationThreshold) &
+      (deltaOverlaps >= self.activationThreshold))[0]
 
     # When we're moving, the feature-location input has no effect.
     if len(deltaLocation) == 0:
+      (featureLocationOverlaps,
+       featureLocationPotentialOverlaps) = computeSegmentActivity(
+         self.featureLocationConnections, featureLocationInput,
+         self.connectedPermanence, self.activationThreshold)
       self.activeFeatureLocationSegments = np.where(
-        self.featureLocationConnections.computeActivity(
-          featureLocationInput, self.connectedPermanence
-        ) >= self.activationThreshold)[0]
+        featureLocationOverlaps >= self.activationThreshold)[0]
     else:
+      featureLocationPotentialOverlaps = None
       self.activeFeatureLocationSegments = np.empty(0, dtype="uint32")
 
 
@@ -146,11 +164,18 @@ class SingleLayerLocationMemory(object):
 
       if learn:
         # Learn the delta.
-        self._learnTransition(prevActiveCells, deltaLocation, newLocation)
+        self._learnTransition(prevActiveCells, deltaLocation, newLocation,
+                              prevLocationPotentialOverlaps,
+                              deltaPotentialOverlaps)
 
         # Learn the featureLocationInput.
+        if featureLocationPotentialOverlaps is None:
+          featureLocationPotentialOverlaps = (
+            self.featureLocationConnections.computeActivity(
+              featureLocationInput))
         self._learnFeatureLocationPair(newLocation, featureLocationInput,
-                                       featureLocationGrowthCandidates)
+                                       featureLocationGrowthCandidates,
+                                       featureLocationPotentialOverlaps)
 
 
     elif len(prevActiveCells) > 0:
@@ -187,19 +212,32 @@ class SingleLayerLocationMemory(object):
       self.activeCells = np.unique(cellsForFeatureLocationSegments)
 
 
-  def _learnTransition(self, prevActiveCells, deltaLocation, newLocation):
+  def _computeDeltaActivity(self, deltaLocation, candidates):
+    """
+    Compute the delta parts' connected and potential overlaps.
+
+    @param candidates (numpy array)
+    The segments whose internal part is active or matching. Other segments'
+    overlaps are never used.
+    """
+    return computeCandidateSegmentActivity(
+      self.deltaConnections, deltaLocation, self.connectedPermanence,
+      candidates)
+
+
+  def _learnTransition(self, prevActiveCells, deltaLocation, newLocation,
+                       prevLocationPotentialOverlaps, deltaPotentialOverlaps):
     """
     For each cell in the newLocation SDR, learn the transition of prevLocation
     (i.e. prevActiveCells) + deltaLocation.
 
     The transition might be already known. In that case, just reinforce the
     existing segments.
-    """
 
-    prevLocationPotentialOverlaps = self.internalConnections.computeActivity(
-      prevActiveCells)
-    deltaPotentialOverlaps = self.deltaConnections.computeActivity(
-      deltaLocation)
+    @param prevLocationPotentialOverlaps (numpy array)
+    @param deltaPotentialOverlaps (numpy array)
+    The potential overlaps computed during inference on this timestep
+    """
 
     matchingDeltaSegments = np.where(
       (prevLocationPotentialOverlaps >= self.learningThreshold) &
@@ -271,14 +309,16 @@ class SingleLayerLocationMemory(object):
 
 
   def _learnFeatureLocationPair(self, newLocation, featureLocationInput,
-                                featureLocationGrowthCandidates):
+                                featureLocationGrowthCandidates,
+                                potentialOverlaps):
     """
     Grow / reinforce synapses between the location layer's dendrites and the
     input layer's active cells.
+
+    @param potentialOverlaps (numpy array)
+    The feature-location potential overlaps for this timestep
     """
 
-    potentialOverlaps = self.featureLocationConnections.computeActivity(
-      featureLocationInput)
     matchingSegments = np.where(potentialOverlaps > self.learningThreshold)[0]
 
     # Cells with a active segment pair: reinforce the segment
@@ -38,6 +38,8 @@ dimensions.
 """
 
 import random
+import threading
+import Queue
 from abc import ABCMeta, abstractmethod
 
 import numpy as np
@@ -72,6 +74,8 @@ class SparseNet(object):
                thresholdDecay=0.95,
                minThreshold=0.1,
                thresholdType='soft',
+               warmStart=False,
+               dtype="float64",
                verbosity=0,
                showEvery=500,
                seed=42):
@@ -87,12 +91,19 @@ class SparseNet(object):
     :param lcaLearningRate          (float) Learning rate in LCA
     :param minThreshold:            (float) Minimum activation threshold
                                             during decay
+    :param warmStart:               (bool)  Start the LCA states of each
+                                            encoded batch from those of the
+                                            previous batch of the same size
+                                            rather than from zero
+    :param dtype:                   (str)   Float type used by the LCA,
+                                            "float64" or "float32"
     :param verbosity:               (int)   Verbosity level
     :param seed:                    (int)   Seed for random number generators
     """
     self.filterDim = filterDim
     self.outputDim = outputDim
     self.batchSize = batchSize
+    self.dtype = np.dtype(dtype).name
     self._reset()
 
     # training parameters
@@ -106,6 +117,7 @@ class SparseNet(object):
     self.thresholdDecay = thresholdDecay
     self.minThreshold = minThreshold
     self.thresholdType = thresholdType
+    self.warmStart = warmStart
 
     # debugging
     self.verbosity = verbosity
@@ -116,27 +128,55 @@ class SparseNet(object):
       random.seed(seed)
 
 
-  def train(self, inputData, numIterations, reset=False):
+  @property
+  def basis(self):
+    """
+    The basis functions, of dimension (filterDim, outputDim). Assigning a new
+    basis, including through in-place operators like +=, clears the matrices
+    cached for the LCA. Changing items of the basis array doesn't, so assign
+    the changed array back to the basis.
+    """
+    return self._basis
+
+
+  @basis.setter
+  def basis(self, basis):
+    self._basis = basis
+    self._lcaMatrices = None
+
+
+  def train(self, inputData, numIterations, reset=False, prefetch=False):
     """
     Trains the SparseNet, with the provided data.
 
     The reset parameter can be set to False if the network should not be
     reset before training (for example for continuing a previous started
     training).
+
+    The prefetch parameter can be set to True to build each batch in a
+    background thread while the network encodes and learns on the previous
+    one, for example when the data is memory-mapped from disk. The batches
+    are the same as without prefetching, as long as nothing else uses numpy's
+    global random number generator during training.
     :param inputData:     (array) Input data, of dimension (inputDim, numPoints)
     :param numIterations: (int)   Number of training iterations
     :param reset:         (bool)  If set to True, reset basis and history
+    :param prefetch:      (bool)  If set to True, prefetch batches in a
+                                  background thread
     """
-    if not isinstance(inputData, np.ndarray):
+    if not hasattr(inputData, "shape"):
       inputData = np.array(inputData)
 
     if reset:
       self._reset()
 
-    for _ in xrange(numIterations):
-      self._iteration += 1
+    if prefetch:
+      batches = self._prefetchDataBatches(inputData, numIterations)
+    else:
+      batches = (self._getDataBatch(inputData) for _ in xrange(numIterations))
 
-      batch = self._getDataBatch(inputData)
+    for batch in batches:
+      self._iteration += 1
 
       # check input dimension, change if necessary
       if batch.shape[0] != self.filterDim:
@@ -185,22 +225,34 @@ class SparseNet(object):
       data = data[:, np.newaxis]
 
 
-    projection = self.basis.T.dot(data)
-    representation = self.basis.T.dot(self.basis) - np.eye(self.outputDim)
-    states = np.zeros((self.outputDim, data.shape[1]))
+    basisT, representation = self._getLcaMatrices()
+    projection = basisT.dot(data.astype(self.dtype, copy=False))
+    numPoints = data.shape[1]
+
+    states = self._lcaStates
+    if (states is None or states.shape[1] != numPoints or
+        states.dtype != self.dtype):
+      states = np.zeros((self.outputDim, numPoints), dtype=self.dtype)
+      self._lcaStates = states
+    elif not self.warmStart:
+      states.fill(0.)
 
     threshold = 0.5 * np.max(np.abs(projection), axis=0)
     activations = self._thresholdNonLinearity(states, threshold)
+    update = np.empty_like(states)
 
     for _ in xrange(self.numLcaIterations):
       # update dynamic system
       states *= (1 - self.lcaLearningRate)
-      states += self.lcaLearningRate * (projection - representation.dot(activations))
-      activations = self._thresholdNonLinearity(states, threshold)
+      np.dot(representation, activations, out=update)
+      update -= projection
+      update *= self.lcaLearningRate
+      states -= update
+      self._thresholdNonLinearity(states, threshold, out=activations)
 
       # decay threshold
       threshold *= self.thresholdDecay
-      threshold[threshold < self.minThreshold] = self.minThreshold
+      np.maximum(threshold, self.minThreshold, out=threshold)
 
     return activations
 
@@ -278,6 +330,7 @@ class SparseNet(object):
     self.basis /= np.sqrt(np.sum(self.basis ** 2, axis=0))
     self._iteration = 0
     self.losses = {}
+    self._lcaStates = None
 
 
   def _learn(self, batch, activations):
@@ -304,29 +357,98 @@ class SparseNet(object):
     self.basis /= np.sqrt(np.sum(self.basis ** 2, axis=0))
 
 
-  def _thresholdNonLinearity(self, input, threshold, thresholdType=None):
+  def _getLcaMatrices(self):
+    """
+    Returns the transposed basis and the matrix of competition between
+    activations used by the LCA, in self.dtype. They are computed once per
+    basis, and cleared by the basis setter.
+    :returns:    (tuple)   (basis.T, basis.T.dot(basis) - identity)
+    """
+    if self._lcaMatrices is None:
+      representation = self.basis.T.dot(self.basis) - np.eye(self.outputDim)
+      self._lcaMatrices = (
+        self.basis.T.astype(self.dtype, copy=False),
+        representation.astype(self.dtype, copy=False))
+
+    return self._lcaMatrices
+
+
+  def _thresholdNonLinearity(self, input, threshold, thresholdType=None,
+                             out=None):
     """
     Non linearity function, to transform the activations during training and
     encoding.
     :param input:          (array)  Activations
     :param threshold:      (array)  Thresholds
     :param thresholdType:  (string) 'soft', 'absoluteHard' or 'relativeHard'
+    :param out:            (array)  Array to store the result in, of the same
+                                    shape as input. A new array is allocated
+                                    if None.
     """
     if thresholdType == None:
       thresholdType = self.thresholdType
 
-    activation = np.copy(input)
+    if out is None:
+      out = np.empty_like(input)
 
     if thresholdType == 'soft':
-      return np.maximum(np.abs(activation) - threshold, 0.) * np.sign(activation)
+      np.abs(input, out=out)
+      out -= threshold
+      np.maximum(out, 0., out=out)
+      return np.copysign(out, input, out=out)
 
     if thresholdType == 'absoluteHard':
-      activation[np.abs(activation) < threshold] = 0.
-      return activation
+      np.copyto(out, input)
+      out[np.abs(input) < threshold] = 0.
+      return out
 
     if thresholdType == 'relativeHard':
-      activation[activation < threshold] = 0.
-      return activation
+      np.copyto(out, input)
+      out[input < threshold] = 0.
+      return out
+
+
+  def _prefetchDataBatches(self, inputData, numBatches):
+    """
+    Generates numBatches batches from _getDataBatch, each one built in a
+    background thread while the previous one is being used.
+    :param inputData:     (array)   Input data passed to _getDataBatch
+    :param numBatches:    (int)     Number of batches to generate
+    """
+    batches = Queue.Queue(maxsize=1)
+    stop = threading.Event()
+
+    def put(item):
+      # Don't block forever if the consumer stopped early
+      while not stop.is_set():
+        try:
+          batches.put(item, timeout=0.1)
+          return True
+        except Queue.Full:
+          pass
+      return False
+
+    def getBatches():
+      try:
+        for _ in xrange(numBatches):
+          if not put((self._getDataBatch(inputData), None)):
+            return
+      except Exception as e:
+        put((None, e))
+
+    thread = threading.Thread(target=getBatches)
+    thread.daemon = True
+    thread.start()
+
+    try:
+      for _ in xrange(numBatches):
+        batch, error = batches.get()
+        if error is not None:
+          raise error
+        yield batch
+    finally:
+      stop.set()
+      thread.join()
 
 
   @abstractmethod
@@ -364,6 +486,8 @@ class SparseNet(object):
 
     sparsenet.basis = np.reshape(proto.basis, newshape=(sparsenet.filterDim,
                                                         sparsenet.outputDim))
+    sparsenet.dtype = proto.dtype or "float64"
+    sparsenet._lcaStates = None
 
     # training parameters
     sparsenet.learningRate = proto.learningRate
@@ -376,6 +500,7 @@ class SparseNet(object):
     sparsenet.thresholdDecay = proto.thresholdDecay
     sparsenet.minThreshold = proto.minThreshold
     sparsenet.thresholdType = proto.thresholdType
+    sparsenet.warmStart = proto.warmStart
 
     # debugging
     sparsenet.verbosity = proto.verbosity
@@ -423,6 +548,8 @@ class SparseNet(object):
     proto.thresholdDecay = self.thresholdDecay
     proto.minThreshold = self.minThreshold
     proto.thresholdType = self.thresholdType
+    proto.warmStart = self.warmStart
+    proto.dtype = self.dtype
 
     # debugging
     proto.verbosity = self.verbosity
@@ -468,6 +595,10 @@ class SparseNet(object):
       return False
     if self.thresholdType != other.thresholdType:
       return False
+    if self.warmStart != other.warmStart:
+      return False
+    if self.dtype != other.dtype:
+      return False
 
     if self.seed != other.seed:
       return False
@@ -308,6 +308,11 @@ class TemporalPooler(SpatialPooler):
     # stored separately for efficiency purposes.
     self._connectedCounts = numpy.zeros(numColumns, dtype=realDType)
 
+    # Copies of 'self._connectedSynapses' and 'self._potentialPools' as
+    # SparseMatrix objects. These compute the overlaps with sparse input by
+    # looking only at the active inputs of each row.
+    self._connectedInputs = SparseMatrix(numColumns, numInputs)
+    self._potentialInputs = SparseMatrix(numColumns, numInputs)
 
     # Initialize the set of permanence values for each column. Ensure that
     # each column is connected to enough input bits to allow it to be
@@ -315,6 +320,7 @@ class TemporalPooler(SpatialPooler):
     for i in xrange(numColumns):
       potential = self._mapPotential(i, wrapAround=self._wrapAround)
       self._potentialPools.replaceSparseRow(i, potential.nonzero()[0])
+      self._updatePotentialInputs(i)
       perm = self._initPermanence(potential, initConnectedPct)
       self._updatePermanencesForColumn(perm, i, raisePerm=True)
 
@@ -402,14 +408,46 @@ class TemporalPooler(SpatialPooler):
     assert (numpy.size(inputVector) == self._numInputs)
     assert (numpy.size(predictedCells) == self._numInputs)
 
+    return self._compute(numpy.flatnonzero(inputVector).astype(uintType), learn,
+                         activeArray, burstingColumns,
+                         numpy.flatnonzero(predictedCells).astype(uintType))
+
+
+  def computeSparse(self, activeInput, learn, activeArray, burstingColumns,
+                    predictedActiveInput):
+    """
+    Like compute(), but with the input given as indices. The results are the
+    same as compute() with the equivalent dense input.
+
+    @param activeInput:          Sorted indices of the active cells from a
+                                 Temporal Memory
+    @param learn:                A Boolean specifying whether learning will be
+                                 performed
+    @param activeArray:          An array representing the active columns
+                                 produced by this method
+    @param burstingColumns:      A numpy array with numColumns elements having
+                                 binary values with 1 representing a
+                                 currently bursting column in Temporal Memory.
+    @param predictedActiveInput: Sorted indices of the cells that switched from
+                                 predicted state in the previous time step to
+                                 active state in the current timestep
+    """
+    return self._compute(numpy.array(activeInput, dtype=uintType), learn,
+                         activeArray, burstingColumns,
+                         numpy.array(predictedActiveInput, dtype=uintType))
+
+
+  def _compute(self, activeInput, learn, activeArray, burstingColumns,
+               predictedActiveInput):
+    """
+    Computes one step, with the input given as sorted indices. See
+    computeSparse() for the parameters.
+    """
     self._updateBookeepingVars(learn)
-    inputVector = numpy.array(inputVector, dtype=realDType)
-    predictedCells = numpy.array(predictedCells, dtype=realDType)
-    inputVector.reshape(-1)
 
     if self._spVerbosity > 3:
-      print " Input bits: ", inputVector.nonzero()[0]
-      print " predictedCells: ", predictedCells.nonzero()[0]
+      print " Input bits: ", activeInput
+      print " predictedCells: ", predictedActiveInput
 
     # Phase 1: Calculate overlap scores
     # The overlap score has 4 components:
@@ -421,7 +459,8 @@ class TemporalPooler(SpatialPooler):
 
     # 1) Calculate pooling overlap
     if self.usePoolingRule:
-      overlapsPooling = self._calculatePoolingActivity(predictedCells, learn)
+      overlapsPooling = self._calculatePoolingActivity(predictedActiveInput,
+                                                       learn)
 
       if self._spVerbosity > 4:
         print "usePoolingRule: Overlaps after step 1:"
@@ -431,7 +470,7 @@ class TemporalPooler(SpatialPooler):
       overlapsPooling = 0
 
     # 2) Calculate overlap between active input cells and connected synapses
-    overlapsAllInput = self._calculateOverlap(inputVector)
+    overlapsAllInput = self._calculateOverlapSparse(activeInput)
 
     # 3) overlap with predicted inputs
     # NEW: Isn't this redundant with 1 and 2)? This looks at connected synapses
@@ -440,11 +479,11 @@ class TemporalPooler(SpatialPooler):
     # it is somewhat redundant although there is a boosting factor in 1) which
     # makes 1's effect stronger. If 1) is called with learning=True it's less
     # redundant
-    overlapsPredicted = self._calculateOverlap(predictedCells)
+    overlapsPredicted = self._calculateOverlapSparse(predictedActiveInput)
 
     if self._spVerbosity > 4:
       print "Overlaps with all inputs:"
-      print " Number of On Bits: ", inputVector.sum()
+      print " Number of On Bits: ", len(activeInput)
       print "   ", overlapsAllInput
 
       print "Overlaps with predicted inputs:"
@@ -478,7 +517,7 @@ class TemporalPooler(SpatialPooler):
     activeColumns = self._inhibitColumns(boostedOverlaps)
 
     if learn:
-      self._adaptSynapses(inputVector, activeColumns, predictedCells)
+      self._adaptSynapses(activeInput, activeColumns, predictedActiveInput)
       self._updateDutyCycles(overlaps, activeColumns)
       self._bumpUpWeakColumns()
       self._updateBoostFactors()
@@ -495,7 +534,9 @@ class TemporalPooler(SpatialPooler):
     activeColWithPredictedInput = activeColumns[activeColumnIndices]
 
     numUnPredictedInput = float(len(burstingColumns.nonzero()[0]))
-    numPredictedInput = float(len(predictedCells))
+    # compute() has always counted the length of the dense predicted cells
+    # vector here, which is the number of inputs.
+    numPredictedInput = float(self._numInputs)
     fracUnPredicted = numUnPredictedInput / (numUnPredictedInput +
                                              numPredictedInput)
 
@@ -557,10 +598,9 @@ class TemporalPooler(SpatialPooler):
 
     Parameters:
     ----------------------------
-    predictedActiveCells: a numpy array with numInputs elements. A 1 indicates
-                          that this cell switched from a predicted state in
-                          the previous time step to active state in the current
-                          timestep
+    predictedActiveCells: sorted indices of the cells that switched from a
+                          predicted state in the previous time step to active
+                          state in the current timestep
     returns:              an array of overlap values due to predicted
                           active TM cells
     """
@@ -570,15 +610,17 @@ class TemporalPooler(SpatialPooler):
 
     # If no pooling columns or no predicted active inputs, return all zeros
     if (sum(self._poolingActivation) == 0 or
-       len(predictedActiveCells.nonzero()[0]) == 0):
+       len(predictedActiveCells) == 0):
       return overlaps
 
     if learn:
       # During learning, overlap is calculated based on potential synapses.
-      self._potentialPools.rightVecSumAtNZ_fast(predictedActiveCells, overlaps)
+      overlaps = self._potentialInputs.rightVecSumAtNZSparse(
+        predictedActiveCells)
     else:
       # At inference stage, overlap is calculated based on connected synapses.
-      self._connectedSynapses.rightVecSumAtNZ_fast(predictedActiveCells, overlaps)
+      overlaps = self._connectedInputs.rightVecSumAtNZSparse(
+        predictedActiveCells)
 
     poolingColumns = self._poolingColumns
 
@@ -595,7 +637,7 @@ class TemporalPooler(SpatialPooler):
     if self._spVerbosity > 3:
       print "\n============== In _calculatePoolingActivity ======"
       print "Received predicted cell inputs from following indices:"
-      print "   ", predictedActiveCells.nonzero()[0]
+      print "   ", predictedActiveCells
       print "The following column indices are in pooling state:"
       print "   ", poolingColumns
       print "Overlap score of pooling columns:"
@@ -605,6 +647,22 @@ class TemporalPooler(SpatialPooler):
     return overlaps
 
 
+  def _calculateOverlapSparse(self, activeInput):
+    """
+    Counts each column's connected synapses to the active inputs. This is
+    _calculateOverlap for sparse input.
+
+    Parameters:
+    ----------------------------
+    activeInput: sorted indices of the active inputs
+    returns:     an array of overlap values
+    """
+    if len(activeInput) == 0:
+      return numpy.zeros(self._numColumns, dtype=realDType)
+
+    return self._connectedInputs.rightVecSumAtNZSparse(activeInput)
+
+
   def _calculateBurstingColumns(self, burstingColumns):
     """
     Returns the contribution to overlap due to bursting columns. If any
@@ -621,7 +679,7 @@ class TemporalPooler(SpatialPooler):
     return overlaps
 
 
-  def _adaptSynapses(self, inputVector, activeColumns, predictedActiveCells):
+  def _adaptSynapses(self, activeInput, activeColumns, predictedActiveInput):
     """
     This is the primary learning method. It updates synapses' permanence based
     on the bottom-up input to the TP and the TP's active cells.
@@ -635,32 +693,17 @@ class TemporalPooler(SpatialPooler):
 
     Parameters:
     ----------------------------
-    inputVector:    a numpy array whose ON bits represent the active cells from
-                    temporal memory
+    activeInput:    sorted indices of the active cells from temporal memory
     activeColumns:  an array containing the indices of the columns that
                     survived the inhibition step
-    predictedActiveCells: a numpy array with numInputs elements. A 1 indicates
-                          that this cell switched from predicted state in
-                          the previous time step to active state in the current
-                          timestep
+    predictedActiveInput: sorted indices of the cells that switched from
+                          predicted state in the previous time step to active
+                          state in the current timestep
     """
-    inputIndices = numpy.where(inputVector > 0)[0]
-    predictedIndices = numpy.where(predictedActiveCells > 0)[0]
-    permChanges = numpy.zeros(self._numInputs)
-
-    # Decrement inactive TM cell -> active TP cell connections
-    permChanges.fill(-1 * self._synPermInactiveDec)
-
-    # Increment active TM cell -> active TP cell connections
-    permChanges[inputIndices] = self._synPermActiveInc
-
-    # Increment correctly predicted TM cell -> active TP cell connections
-    permChanges[predictedIndices] = self._synPredictedInc
-
     if self._spVerbosity > 4:
       print "\n============== _adaptSynapses ======"
-      print "Active input indices:",inputIndices
-      print "predicted input indices:",predictedIndices
+      print "Active input indices:",activeInput
+      print "predicted input indices:",predictedActiveInput
       print "\n============== _adaptSynapses ======\n"
 
     for i in activeColumns:
@@ -669,10 +712,55 @@ class TemporalPooler(SpatialPooler):
 
       # Only consider connections in column's potential pool (receptive field)
       maskPotential = numpy.where(self._potentialPools.getRow(i) > 0)[0]
-      perm[maskPotential] += permChanges[maskPotential]
+
+      # Decrement inactive TM cell -> active TP cell connections
+      permChanges = numpy.empty(len(maskPotential))
+      permChanges.fill(-1 * self._synPermInactiveDec)
+
+      # Increment active TM cell -> active TP cell connections
+      permChanges[numpy.in1d(maskPotential, activeInput,
+                             assume_unique=True)] = self._synPermActiveInc
+
+      # Increment correctly predicted TM cell -> active TP cell connections
+      permChanges[numpy.in1d(maskPotential, predictedActiveInput,
+                             assume_unique=True)] = self._synPredictedInc
+
+      perm[maskPotential] += permChanges
       self._updatePermanencesForColumn(perm, i, raisePerm=False)
 
 
+  def _updatePermanencesForColumn(self, perm, columnIndex, raisePerm=True):
+    """
+    Updates the permanences of a column like the spatial pooler does, then
+    copies its connected synapses into self._connectedInputs.
+    """
+    super(TemporalPooler, self)._updatePermanencesForColumn(perm, columnIndex,
+                                                            raisePerm)
+    connectedInputs = self._connectedSynapses.getRow(columnIndex).nonzero()[0]
+    self._connectedInputs.setRowFromSparse(
+      columnIndex, connectedInputs,
+      numpy.ones(len(connectedInputs), dtype=realDType))
+
+
+  def setPotential(self, columnIndex, potential):
+    """
+    Sets the potential pool of a column like the spatial pooler does, then
+    copies it into self._potentialInputs.
+    """
+    super(TemporalPooler, self).setPotential(columnIndex, potential)
+    self._updatePotentialInputs(columnIndex)
+
+
+  def _updatePotentialInputs(self, columnIndex):
+    """
+    Copies the potential pool of a column into self._potentialInputs.
+    """
+    potentialInputs = self._potentialPools.getRow(columnIndex).nonzero()[0]
+    self._potentialInputs.setRowFromSparse(
+      columnIndex, potentialInputs,
+      numpy.ones(len(potentialInputs), dtype=realDType))
+
+
 
   def printParameters(self):
     """
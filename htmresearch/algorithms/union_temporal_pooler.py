@@ -20,12 +20,11 @@
 # ----------------------------------------------------------------------
 
 import random
-import copy
 import numpy
 from nupic.bindings.algorithms import SpatialPooler
 # Uncomment below line to use python SP
 # from nupic.algorithms.spatial_pooler import SpatialPooler
-from nupic.bindings.math import GetNTAReal
+from nupic.bindings.math import GetNTAReal, SparseMatrix
 from htmresearch.frameworks.union_temporal_pooling.activation.excite_functions.excite_functions_all import (
   LogisticExciteFunction, FixedExciteFunction)
 
@@ -139,6 +138,10 @@ class UnionTemporalPooler(SpatialPooler):
     # time since last pooling activation increment
     # initialized to be a large number
     self._poolingTimer = numpy.ones(self.getNumColumns(), dtype=REAL_DTYPE) * 1000
+    self._maxPoolingTimer = 1000
+
+    # preallocated mask of the cells with nonzero pooling activation
+    self._nonZeroCellMask = numpy.zeros(self.getNumColumns(), dtype="bool")
 
     # pooling activation level after the latest update, used for sigmoid decay function
     self._poolingActivationInitLevel = numpy.zeros(self.getNumColumns(), dtype=REAL_DTYPE)
@@ -152,9 +155,20 @@ class UnionTemporalPooler(SpatialPooler):
     # lowest possible pooling activation level
     self._poolingActivationlowerBound = 0.1
 
-    self._preActiveInput = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
-    # predicted inputs from the last n steps
-    self._prePredictedActiveInput = numpy.zeros((self.getNumInputs(), self._historyLength), dtype=REAL_DTYPE)
+    # indices of the active inputs from the last step
+    self._preActiveInput = numpy.array([], dtype=UINT_DTYPE)
+    # indices of the predicted inputs from the last n steps, stored in a ring
+    # buffer. _historyIndex is the slot that the next step overwrites.
+    self._prePredictedActiveInput = [numpy.array([], dtype=UINT_DTYPE)
+                                     for _ in xrange(self._historyLength)]
+    self._historyIndex = 0
+
+    # A copy of the connected synapses, one row per column. The overlaps with
+    # the active inputs are computed from this matrix, so they only touch the
+    # rows' active inputs rather than every input.
+    self._connectedInputs = SparseMatrix(self.getNumColumns(),
+                                         self.getNumInputs())
+    self._updateConnectedInputs(xrange(self.getNumColumns()))
 
 
   def reset(self):
@@ -166,9 +180,12 @@ class UnionTemporalPooler(SpatialPooler):
     self._poolingActivation = numpy.zeros(self.getNumColumns(), dtype=REAL_DTYPE)
     self._unionSDR = numpy.array([], dtype=UINT_DTYPE)
     self._poolingTimer = numpy.ones(self.getNumColumns(), dtype=REAL_DTYPE) * 1000
+    self._maxPoolingTimer = 1000
     self._poolingActivationInitLevel = numpy.zeros(self.getNumColumns(), dtype=REAL_DTYPE)
-    self._preActiveInput = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
-    self._prePredictedActiveInput = numpy.zeros((self.getNumInputs(), self._historyLength), dtype=REAL_DTYPE)
+    self._preActiveInput = numpy.array([], dtype=UINT_DTYPE)
+    self._prePredictedActiveInput = [numpy.array([], dtype=UINT_DTYPE)
+                                     for _ in xrange(self._historyLength)]
+    self._historyIndex = 0
 
     # Reset Spatial Pooler fields
     self.setOverlapDutyCycles(numpy.zeros(self.getNumColumns(), dtype=REAL_DTYPE))
@@ -187,11 +204,38 @@ class UnionTemporalPooler(SpatialPooler):
     """
     assert numpy.size(activeInput) == self.getNumInputs()
     assert numpy.size(predictedActiveInput) == self.getNumInputs()
+
+    return self._compute(numpy.flatnonzero(activeInput).astype(UINT_DTYPE),
+                         numpy.flatnonzero(predictedActiveInput).astype(UINT_DTYPE),
+                         learn)
+
+
+  def computeSparse(self, activeInput, predictedActiveInput, learn):
+    """
+    Computes one cycle of the Union Temporal Pooler algorithm, with the input
+    given as indices. This gives the same results as compute() with the
+    equivalent dense input.
+    @param activeInput            (numpy array) Sorted indices of the active inputs
+    @param predictedActiveInput   (numpy array) Sorted indices of the correctly predicted active inputs
+    @param learn                  (boolen)      A boolen value indicating whether learning should be performed
+    """
+    return self._compute(numpy.array(activeInput, dtype=UINT_DTYPE),
+                         numpy.array(predictedActiveInput, dtype=UINT_DTYPE),
+                         learn)
+
+
+  def _compute(self, activeInput, predictedActiveInput, learn):
+    """
+    Computes one cycle of the Union Temporal Pooler algorithm.
+    @param activeInput            (numpy array) Sorted indices of the active inputs
+    @param predictedActiveInput   (numpy array) Sorted indices of the correctly predicted active inputs
+    @param learn                  (boolen)      A boolen value indicating whether learning should be performed
+    """
     self._updateBookeepingVars(learn)
 
     # Compute proximal dendrite overlaps with active and active-predicted inputs
-    overlapsActive = self._calculateOverlap(activeInput)
-    overlapsPredictedActive = self._calculateOverlap(predictedActiveInput)
+    overlapsActive = self._calculateOverlapSparse(activeInput)
+    overlapsPredictedActive = self._calculateOverlapSparse(predictedActiveInput)
     totalOverlap = (overlapsActive * self._activeOverlapWeight +
                     overlapsPredictedActive *
                     self._predictedActiveOverlapWeight).astype(REAL_DTYPE)
@@ -227,35 +271,83 @@ class UnionTemporalPooler(SpatialPooler):
 
       # adapt permenence of connections from previously predicted inputs to newly active cells
       # This is a reinforcement learning rule that considers previous input to the current cell
-      for i in xrange(self._historyLength):
-        self._adaptSynapses(self._prePredictedActiveInput[:,i], activeCells, self._synPermPreviousPredActiveInc, 0.0)
+      self._adaptSynapsesToPreviousInput(activeCells)
 
       # Homeostasis learning inherited from the spatial pooler
       self._updateDutyCycles(totalOverlap.astype(UINT_DTYPE), activeCells)
+      weakColumns = self._getWeakColumns()
       self._bumpUpWeakColumns()
       self._updateBoostFactors()
       if self._isUpdateRound():
         self._updateInhibitionRadius()
         self._updateMinDutyCycles()
 
+      # These are the only columns whose synapses changed.
+      self._updateConnectedInputs(numpy.unique(numpy.concatenate(
+        [activeCells, self._unionSDR, weakColumns]).astype(UINT_DTYPE)))
+
     # save inputs from the previous time step
-    self._preActiveInput = copy.copy(activeInput)
-    self._prePredictedActiveInput = numpy.roll(self._prePredictedActiveInput,1,1)
+    self._preActiveInput = activeInput
     if self._historyLength > 0:
-      self._prePredictedActiveInput[:, 0] = predictedActiveInput
+      self._prePredictedActiveInput[self._historyIndex] = predictedActiveInput
+      self._historyIndex = (self._historyIndex + 1) % self._historyLength
 
     return self._unionSDR
 
 
+  def _calculateOverlapSparse(self, activeInput):
+    """
+    Counts each column's connected synapses to the active inputs.
+    @param activeInput: Indices of the active inputs
+    @return: the overlap of every column
+    """
+    if len(activeInput) == 0:
+      return numpy.zeros(self.getNumColumns(), dtype=REAL_DTYPE)
+
+    return self._connectedInputs.rightVecSumAtNZSparse(activeInput)
+
+
+  def _getWeakColumns(self):
+    """
+    Gets the columns whose synapses _bumpUpWeakColumns is about to raise.
+    @return: the indices of the columns
+    """
+    overlapDutyCycles = numpy.zeros(self.getNumColumns(), dtype=REAL_DTYPE)
+    self.getOverlapDutyCycles(overlapDutyCycles)
+    minOverlapDutyCycles = numpy.zeros(self.getNumColumns(), dtype=REAL_DTYPE)
+    self.getMinOverlapDutyCycles(minOverlapDutyCycles)
+    return numpy.flatnonzero(overlapDutyCycles < minOverlapDutyCycles)
+
+
+  def _updateConnectedInputs(self, columns):
+    """
+    Copies the connected synapses of the specified columns into
+    _connectedInputs.
+    @param columns: Indices of the columns whose synapses changed
+    """
+    connected = numpy.zeros(self.getNumInputs(), dtype=UINT_DTYPE)
+    for i in columns:
+      self.getConnectedSynapses(i, connected)
+      connectedInputs = numpy.flatnonzero(connected)
+      self._connectedInputs.setRowFromSparse(
+        i, connectedInputs, numpy.ones(len(connectedInputs), dtype=REAL_DTYPE))
+
+
+  def setPermanence(self, column, permanence):
+    super(UnionTemporalPooler, self).setPermanence(column, permanence)
+    self._updateConnectedInputs([column])
+
+
   def _decayPoolingActivation(self):
     """
-    Decrements pooling activation of all cells
+    Decrements pooling activation of all cells, in place
     """
     if self._decayFunctionType == 'NoDecay':
-      self._poolingActivation = self._decayFunction.decay(self._poolingActivation)
+      self._decayFunction.decay(self._poolingActivation)
     elif self._decayFunctionType == 'Exponential':
-      self._poolingActivation = self._decayFunction.decay(\
-                                self._poolingActivationInitLevel, self._poolingTimer)
+      self._decayFunction.decay(self._poolingActivationInitLevel,
+                                self._poolingTimer,
+                                out=self._poolingActivation)
 
     return self._poolingActivation
 
@@ -272,10 +364,17 @@ class UnionTemporalPooler(SpatialPooler):
       self._poolingActivation[activeCells], overlaps[activeCells])
 
     # increase pooling timers for all cells
-    self._poolingTimer[self._poolingTimer >= 0] += 1
-
-    # reset pooling timer for active cells
+    self._poolingTimer += 1
+    self._maxPoolingTimer += 1
+
+    # reset pooling timer for active cells. The max timer only needs to be
+    # recomputed when one of the cells that held it is reset.
+    resetsMaxTimer = (len(activeCells) > 0 and
+                      self._poolingTimer[activeCells].max() >=
+                      self._maxPoolingTimer)
     self._poolingTimer[activeCells] = 0
+    if resetsMaxTimer:
+      self._maxPoolingTimer = self._poolingTimer.max()
     self._poolingActivationInitLevel[activeCells] = self._poolingActivation[activeCells]
 
     return self._poolingActivation
@@ -287,18 +386,23 @@ class UnionTemporalPooler(SpatialPooler):
     activation in sorted order.
     @return: a list of cell indices
     """
-    poolingActivation = self._poolingActivation
-    nonZeroCells = numpy.argwhere(poolingActivation > 0)[:,0]
-
-    # include a tie-breaker before sorting
-    poolingActivationSubset = poolingActivation[nonZeroCells] + \
-                              self._poolingActivation_tieBreaker[nonZeroCells]
-    potentialUnionSDR = nonZeroCells[numpy.argsort(poolingActivationSubset)[::-1]]
-
-    topCells = potentialUnionSDR[0: self._maxUnionCells]
-
-    if max(self._poolingTimer) > self._minHistory:
-      self._unionSDR = numpy.sort(topCells).astype(UINT_DTYPE)
+    numpy.greater(self._poolingActivation, 0, out=self._nonZeroCellMask)
+    topCells = numpy.flatnonzero(self._nonZeroCellMask)
+
+    if len(topCells) > self._maxUnionCells:
+      if self._maxUnionCells > 0:
+        # include a tie-breaker before selecting
+        poolingActivationSubset = self._poolingActivation[topCells] + \
+                                  self._poolingActivation_tieBreaker[topCells]
+        numNotSelected = len(topCells) - self._maxUnionCells
+        topCells = topCells[numpy.argpartition(
+          poolingActivationSubset, numNotSelected)[numNotSelected:]]
+        topCells.sort()
+      else:
+        topCells = topCells[:0]
+
+    if self._maxPoolingTimer > self._minHistory:
+      self._unionSDR = topCells.astype(UINT_DTYPE)
     else:
       self._unionSDR = []
 
@@ -306,7 +410,7 @@ class UnionTemporalPooler(SpatialPooler):
 
 
   # overide
-  def _adaptSynapses(self, inputVector, activeColumns, synPermActiveInc, synPermInactiveDec):
+  def _adaptSynapses(self, activeInput, activeColumns, synPermActiveInc, synPermInactiveDec):
     """
     The primary method in charge of learning. Adapts the permanence values of
     the synapses based on the input vector, and the chosen columns after
@@ -316,10 +420,8 @@ class UnionTemporalPooler(SpatialPooler):
 
     Parameters:
     ----------------------------
-    @param inputVector:
-                    A numpy array of 0's and 1's that comprises the input to
-                    the spatial pooler. There exists an entry in the array
-                    for every input bit.
+    @param activeInput:
+                    Sorted indices of the active inputs.
     @param activeColumns:
                     An array containing the indices of the columns that
                     survived inhibition.
@@ -329,17 +431,61 @@ class UnionTemporalPooler(SpatialPooler):
     @param synPermInactiveDec:
                     Permanence decrement for inactive inputs
     """
-    inputIndices = numpy.where(inputVector > 0)[0]
-    permChanges = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
-    permChanges.fill(-1 * synPermInactiveDec)
-    permChanges[inputIndices] = synPermActiveInc
     perm = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
     potential = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
     for i in activeColumns:
       self.getPermanence(i, perm)
       self.getPotential(i, potential)
-      maskPotential = numpy.where(potential > 0)[0]
-      perm[maskPotential] += permChanges[maskPotential]
+      maskPotential = numpy.flatnonzero(potential)
+      permChanges = numpy.full(len(maskPotential), -1 * synPermInactiveDec,
+                               dtype=REAL_DTYPE)
+      permChanges[numpy.in1d(maskPotential, activeInput,
+                             assume_unique=True)] = synPermActiveInc
+      perm[maskPotential] += permChanges
+      self._updatePermanencesForColumn(perm, i, raisePerm=False)
+
+
+  def _adaptSynapsesToPreviousInput(self, activeColumns):
+    """
+    Increase the permanences of the synapses from the predicted inputs of the
+    last historyLength steps to the active columns by
+    synPermPreviousPredActiveInc per step that the input was predicted.
+
+    This gives the same permanences as calling _adaptSynapses once per step of
+    history, most recent step first, except that each column's permanences are
+    read and written once. The permanences are clipped and trimmed after each
+    step, like _updatePermanencesForColumn does, since trimming between steps
+    changes the result.
+
+    @param activeColumns:
+                    An array containing the indices of the columns that
+                    survived inhibition.
+    """
+    if self._synPermPreviousPredActiveInc == 0 or self._historyLength == 0:
+      return
+
+    # Most recent step first
+    history = [self._prePredictedActiveInput[(self._historyIndex - 1 - i) %
+                                             self._historyLength]
+               for i in xrange(self._historyLength)]
+    history = [inputIndices for inputIndices in history
+               if len(inputIndices) > 0]
+    if len(history) == 0:
+      return
+
+    permInc = REAL_DTYPE(self._synPermPreviousPredActiveInc)
+    trimThreshold = REAL_DTYPE(self.getSynPermTrimThreshold())
+    synPermMax = REAL_DTYPE(self.getSynPermMax())
+    perm = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
+    potential = numpy.zeros(self.getNumInputs(), dtype=REAL_DTYPE)
+    for i in activeColumns:
+      self.getPermanence(i, perm)
+      self.getPotential(i, potential)
+      for inputIndices in history:
+        inputIndices = inputIndices[potential[inputIndices] > 0]
+        perm[inputIndices] += permInc
+        perm[inputIndices] = numpy.minimum(perm[inputIndices], synPermMax)
+        perm[perm < trimThreshold] = 0
       self._updatePermanencesForColumn(perm, i, raisePerm=False)
 
 
@@ -49,14 +49,21 @@ class ExponentialDecayFunction(DecayFunctionBase):
     self._lambda_constant = 1/float(time_constant)
 
 
-  def decay(self, initActivationLevel, timeSinceActivation):
+  def decay(self, initActivationLevel, timeSinceActivation, out=None):
     """
     @param initActivationLevel: initial activation level
     @param timeSinceActivation: time since the activation
+    @param out: optional array to store the activation level in
     @return: activation level after decay
     """
-    activationLevel = numpy.exp(-self._lambda_constant * timeSinceActivation) *  initActivationLevel
-    return activationLevel
+    if out is None:
+      activationLevel = numpy.exp(-self._lambda_constant * timeSinceActivation) *  initActivationLevel
+      return activationLevel
+
+    numpy.multiply(timeSinceActivation, -self._lambda_constant, out=out)
+    numpy.exp(out, out=out)
+    numpy.multiply(out, initActivationLevel, out=out)
+    return out
 
   def plot(self):
     initValue = 10
@@ -203,11 +203,11 @@ class UnionTemporalPoolerExperiment(object):
                       sequenceLabel=sequenceLabel)
 
       if upLearn is not None:
-        activeCells, predActiveCells, burstingCols, = self.getUnionTemporalPoolerInput()
-        self.up.compute(activeCells,
-                        predActiveCells,
-                        learn=upLearn,
-                        sequenceLabel=sequenceLabel)
+        activeCells, predActiveCells = self.getUnionTemporalPoolerSparseInput()
+        self.up.computeSparse(activeCells,
+                              predActiveCells,
+                              learn=upLearn,
+                              sequenceLabel=sequenceLabel)
 
 
   def getUnionTemporalPoolerInput(self):
@@ -227,6 +227,19 @@ class UnionTemporalPoolerExperiment(object):
     return activeCells, predictedActiveCells, burstingColumns
 
 
+  def getUnionTemporalPoolerSparseInput(self):
+    """
+    Gets the Union Temporal Pooler input from the Temporal Memory, as sorted
+    indices of the active cells and of the predicted active cells
+    """
+    activeCells = numpy.array(sorted(self.tm.activeCellsIndices()),
+                              dtype="uint32")
+    predictedActiveCells = numpy.array(
+      sorted(self.tm.predictedActiveCellsIndices()), dtype="uint32")
+
+    return activeCells, predictedActiveCells
+
+
   def getBurstingColumnsStats(self):
     """
     Gets statistics on the Temporal Memory's bursting columns. Used as a metric
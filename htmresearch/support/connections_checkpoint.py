@@ -0,0 +1,678 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+A flat on-disk format for SparseMatrixConnections and for the models that own
+them.
+
+Each SparseMatrixConnections is stored as four .npy files:
+
+- segmentCells: the cell of each segment
+- inputStarts: for each presynaptic input, the offset of its first synapse
+- segments: the segment of each synapse, grouped by presynaptic input, in
+  increasing segment order within each input
+- permanences: the permanence of each synapse, in the same order
+
+A SparseMatrix with cells as rows, like the ColumnPooler's, is stored the same
+way with one segment per cell.
+
+Permanences can be stored as float32, or as uint8 / uint16 fixed-point (see
+FixedPointPermanences). Fixed-point permanences use a quarter or half of the
+memory, and comparisons against the connected permanence stay exact.
+
+Grouping the synapses by presynaptic input means the activity of a timestep is
+computed by touching only the synapses of the active inputs. Loading with
+np.memmap is nearly instant, and processes that load the same checkpoint share
+its pages through the page cache.
+
+The rest of the model (parameters, random number generator, current activity)
+is small and is pickled.
+"""
+
+import cPickle as pickle
+import json
+import os
+
+import numpy as np
+
+from nupic.bindings.math import SparseMatrix, SparseMatrixConnections
+
+
+FORMAT_VERSION = 1
+ARRAY_NAMES = ("segmentCells", "inputStarts", "segments", "permanences")
+PERMANENCE_DTYPES = ("float32", "uint16", "uint8")
+
+
+
+class FixedPointPermanences(object):
+  """
+  Converts permanences to and from unsigned fixed-point codes.
+
+  The codes are aligned on the connected permanence: a permanence p gets the
+  code
+
+    connectedCode + floor((p - connectedPermanence) * scale)
+
+  where scale is the largest code and connectedCode is
+  ceil(connectedPermanence * scale). So p >= connectedPermanence exactly when
+  its code is >= connectedCode, whatever the resolution. Other permanences are
+  rounded down to a multiple of 1/scale from the connected permanence.
+  """
+
+  def __init__(self, dtype, connectedPermanence):
+    """
+    @param dtype (str)
+    "uint8" or "uint16"
+
+    @param connectedPermanence (float)
+    """
+    self.dtype = np.dtype(dtype)
+    self.scale = np.iinfo(self.dtype).max
+    # Compare in float32, like the matrices do.
+    self.connectedPermanence = np.float32(connectedPermanence)
+    self.connectedCode = int(np.ceil(np.float64(self.connectedPermanence) *
+                                     self.scale))
+
+
+  def quantize(self, permanences):
+    """
+    @param permanences (numpy array)
+    @return (numpy array)
+    """
+    offsets = np.floor((np.asarray(permanences, dtype="float64") -
+                        np.float64(self.connectedPermanence)) * self.scale)
+    return np.clip(offsets + self.connectedCode, 0,
+                   self.scale).astype(self.dtype)
+
+
+  def dequantize(self, codes):
+    """
+    Map codes to the middle of their interval. The result is never 0, so
+    synapses aren't destroyed.
+
+    @param codes (numpy array)
+    @return (numpy array)
+    """
+    permanences = (np.float64(self.connectedPermanence) +
+                   (np.asarray(codes, dtype="float64") - self.connectedCode +
+                    0.5) / self.scale)
+    return np.clip(permanences, 0.5 / self.scale, 1.0).astype("float32")
+
+
+  def getThreshold(self, permanenceThreshold):
+    """
+    Convert a permanence threshold into a code threshold. Only the connected
+    permanence can be converted exactly.
+
+    @param permanenceThreshold (float)
+    @return (int)
+    """
+    if np.float32(permanenceThreshold) != self.connectedPermanence:
+      raise ValueError(
+        "Fixed-point permanences can only be compared to the connected "
+        "permanence they were saved with ({}), not {}".format(
+          self.connectedPermanence, permanenceThreshold))
+    return self.connectedCode
+
+
+
+def saveConnections(connections, cellCount, directory, name,
+                    permanenceDtype="float32", connectedPermanence=None):
+  """
+  Write a SparseMatrixConnections to the flat format.
+
+  @param connections (SparseMatrixConnections)
+
+  @param cellCount (int)
+  The number of cells that the connections were created with
+
+  @param directory (str)
+
+  @param name (str)
+  Prefix of the files, so that a directory can contain several connections.
+
+  @param permanenceDtype (str)
+  "float32", "uint16" or "uint8"
+
+  @param connectedPermanence (float)
+  Required for fixed-point permanences
+  """
+  segmentCount = connections.matrix.nRows()
+  segmentCells = connections.mapSegmentsToCells(
+    np.arange(segmentCount, dtype="uint32"))
+  _saveRows(connections.matrix, segmentCells, cellCount, directory, name,
+            permanenceDtype, connectedPermanence)
+
+
+
+def saveMatrix(matrix, directory, name, permanenceDtype="float32",
+               connectedPermanence=None):
+  """
+  Write a SparseMatrix of permanences, with cells as rows and inputs as
+  columns, to the flat format. Parameters are the same as saveConnections.
+
+  @param matrix (SparseMatrix)
+  """
+  _saveRows(matrix, np.arange(matrix.nRows(), dtype="uint32"), matrix.nRows(),
+            directory, name, permanenceDtype, connectedPermanence)
+
+
+
+def _saveRows(matrix, segmentCells, cellCount, directory, name,
+              permanenceDtype, connectedPermanence):
+  if permanenceDtype not in PERMANENCE_DTYPES:
+    raise ValueError("Unsupported permanence dtype: {}".format(
+      permanenceDtype))
+
+  if permanenceDtype == "float32":
+    fixedPoint = None
+  else:
+    if connectedPermanence is None:
+      raise ValueError("Fixed-point permanences need a connected permanence")
+    fixedPoint = FixedPointPermanences(permanenceDtype, connectedPermanence)
+
+  inputCount = matrix.nCols()
+  _writeMetadata(directory, name, {
+    "cellCount": cellCount,
+    "inputCount": inputCount,
+    "permanenceDtype": permanenceDtype,
+    "connectedPermanence": (float(connectedPermanence)
+                            if connectedPermanence is not None else None),
+  })
+
+  np.save(_arrayPath(directory, name, "segmentCells"),
+          np.asarray(segmentCells, dtype="uint32"))
+
+  # Every synapse, in segment order. A stable sort groups them by input and
+  # keeps each input's segments sorted.
+  rows, presynapticInputs, rowPermanences = matrix.getAllNonZeros(True)
+  order = np.argsort(presynapticInputs, kind="mergesort")
+
+  # Older numpy versions reject a minlength of 0.
+  synapsesPerInput = np.bincount(presynapticInputs,
+                                 minlength=max(inputCount, 1))[:inputCount]
+  inputStarts = np.zeros(inputCount + 1, dtype="int64")
+  np.cumsum(synapsesPerInput, out=inputStarts[1:])
+  np.save(_arrayPath(directory, name, "inputStarts"), inputStarts)
+
+  np.save(_arrayPath(directory, name, "segments"), rows[order])
+
+  permanences = rowPermanences[order]
+  if fixedPoint is not None:
+    permanences = fixedPoint.quantize(permanences)
+  np.save(_arrayPath(directory, name, "permanences"), permanences)
+
+
+
+def loadConnections(directory, name, mmap=True):
+  """
+  Read connections written by saveConnections.
+
+  @param mmap (bool)
+  If True, return a read-only CheckpointConnections backed by np.memmap.
+  Otherwise, return a SparseMatrixConnections that can learn.
+
+  @return (CheckpointConnections or SparseMatrixConnections)
+  """
+  checkpoint = CheckpointConnections(directory, name)
+  if mmap:
+    return checkpoint
+
+  return checkpoint.toSparseMatrixConnections()
+
+
+
+def loadMatrix(directory, name, mmap=True):
+  """
+  Read a matrix written by saveMatrix.
+
+  @param mmap (bool)
+  If True, return a read-only CheckpointMatrix backed by np.memmap. Otherwise,
+  return a SparseMatrix that can learn.
+
+  @return (CheckpointMatrix or SparseMatrix)
+  """
+  checkpoint = CheckpointMatrix(directory, name)
+  if mmap:
+    return checkpoint
+
+  return checkpoint.toSparseMatrix()
+
+
+
+class CheckpointConnections(object):
+  """
+  Read-only connections backed by memory-mapped checkpoint arrays.
+
+  Implements the parts of the SparseMatrixConnections interface that are used
+  for inference. Methods that modify the connections raise a ValueError.
+
+  Fixed-point permanences can only be compared to the connected permanence
+  that they were saved with.
+  """
+
+  def __init__(self, directory, name):
+    """
+    @param directory (str)
+    @param name (str)
+    Same as in saveConnections
+    """
+    metadata = _readMetadata(directory, name)
+    self.cellCount = metadata["cellCount"]
+    self.inputCount = metadata["inputCount"]
+
+    permanenceDtype = metadata.get("permanenceDtype", "float32")
+    if permanenceDtype == "float32":
+      self.fixedPoint = None
+    else:
+      self.fixedPoint = FixedPointPermanences(permanenceDtype,
+                                              metadata["connectedPermanence"])
+
+    (self.segmentCells,
+     self.inputStarts,
+     self.segments,
+     self.permanences) = [np.load(_arrayPath(directory, name, arrayName),
+                                  mmap_mode="r")
+                          for arrayName in ARRAY_NAMES]
+
+    # Computed on first use
+    self._synapseCounts = None
+
+
+  def nSegments(self):
+    return len(self.segmentCells)
+
+
+  def computeActivity(self, activeInput, permanenceThreshold=None):
+    """
+    Count the active synapses on each segment, like
+    SparseMatrixConnections.computeActivity.
+
+    @param activeInput (numpy array)
+
+    @param permanenceThreshold (float or None)
+    If specified, only count synapses with at least this permanence.
+
+    @return (numpy array)
+    The overlap of every segment
+    """
+    synapses = self._getSynapses(activeInput)
+    segments = self.segments[synapses]
+    if permanenceThreshold is not None:
+      segments = segments[self.permanences[synapses] >=
+                          self._getThreshold(permanenceThreshold)]
+
+    return self._countPerSegment(segments).astype("int32")
+
+
+  def computeOverlaps(self, activeInput, connectedPermanence):
+    """
+    Compute the connected and the potential overlaps of every segment, reading
+    the synapses of the active inputs only once.
+
+    @return (tuple)
+    - overlaps (numpy array)
+    - potentialOverlaps (numpy array)
+    """
+    synapses = self._getSynapses(activeInput)
+    segments = self.segments[synapses]
+    connected = (self.permanences[synapses] >=
+                 self._getThreshold(connectedPermanence))
+
+    return (self._countPerSegment(segments[connected]).astype("int32"),
+            self._countPerSegment(segments).astype("int32"))
+
+
+  def _countPerSegment(self, segments):
+    """
+    Count how many times each segment appears in 'segments'.
+    """
+    # Older numpy versions reject a minlength of 0.
+    return np.bincount(segments,
+                       minlength=max(self.nSegments(), 1))[:self.nSegments()]
+
+
+  def getConnectedSynapses(self, connectedPermanence):
+    """
+    Get the connected synapses grouped by presynaptic input.
+
+    @return (tuple)
+    - segments (numpy array)
+    - inputStarts (numpy array)
+    """
+    connected = self.permanences >= self._getThreshold(connectedPermanence)
+    connectedBefore = np.concatenate(([0], np.cumsum(connected)))
+    return self.segments[connected], connectedBefore[self.inputStarts]
+
+
+  def mapSegmentsToCells(self, segments):
+    return self.segmentCells[segments]
+
+
+  def mapSegmentsToSynapseCounts(self, segments):
+    if self._synapseCounts is None:
+      self._synapseCounts = self._countPerSegment(self.segments)
+    return self._synapseCounts[segments]
+
+
+  def getSegmentCounts(self, cells):
+    return np.bincount(self.segmentCells,
+                       minlength=self.cellCount)[cells].astype("int32")
+
+
+  def filterSegmentsByCell(self, segments, cells, assumeSorted=False):
+    return segments[np.in1d(self.segmentCells[segments], cells)]
+
+
+  def sortSegmentsByCell(self, segments):
+    """
+    Sort the segments in place, by cell and then by segment.
+    """
+    segments[:] = segments[np.lexsort((segments,
+                                       self.segmentCells[segments]))]
+
+
+  def createSegments(self, cells):
+    self._raiseReadOnly()
+
+
+  def growSynapses(self, *args, **kwargs):
+    self._raiseReadOnly()
+
+
+  def growSynapsesToSample(self, *args, **kwargs):
+    self._raiseReadOnly()
+
+
+  def adjustSynapses(self, *args, **kwargs):
+    self._raiseReadOnly()
+
+
+  def adjustActiveSynapses(self, *args, **kwargs):
+    self._raiseReadOnly()
+
+
+  def toSparseMatrixConnections(self):
+    """
+    Copy these connections into a new SparseMatrixConnections.
+    """
+    connections = SparseMatrixConnections(self.cellCount, self.inputCount)
+
+    if self.nSegments() > 0:
+      connections.createSegments(np.asarray(self.segmentCells))
+
+    self._copySynapses(connections.matrix)
+    return connections
+
+
+  def getPermanences(self):
+    """
+    @return (numpy array)
+    The float32 permanences, in synapse order. Fixed-point permanences are
+    dequantized.
+    """
+    if self.fixedPoint is None:
+      return np.asarray(self.permanences)
+    return self.fixedPoint.dequantize(self.permanences)
+
+
+  def _copySynapses(self, matrix):
+    if len(self.segments) > 0:
+      presynapticInputs = np.repeat(
+        np.arange(self.inputCount, dtype="uint32"),
+        np.diff(self.inputStarts)).astype("uint32")
+      matrix.setElements(np.asarray(self.segments), presynapticInputs,
+                         self.getPermanences())
+
+
+  def _getThreshold(self, permanenceThreshold):
+    if self.fixedPoint is None:
+      return np.float32(permanenceThreshold)
+    return self.fixedPoint.getThreshold(permanenceThreshold)
+
+
+  def _getSynapses(self, activeInput):
+    activeInput = np.asarray(activeInput, dtype="int64")
+
+    starts = self.inputStarts[activeInput]
+    lengths = self.inputStarts[activeInput + 1] - starts
+
+    # Gather the synapses of the active inputs into one flat index array.
+    rowOffsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return rowOffsets + np.arange(len(rowOffsets))
+
+
+  @staticmethod
+  def _raiseReadOnly():
+    raise ValueError("These connections were loaded read-only from a "
+                     "checkpoint. Load with mmap=False to learn.")
+
+
+
+class CheckpointMatrix(CheckpointConnections):
+  """
+  A read-only SparseMatrix of permanences, with cells as rows, backed by
+  memory-mapped checkpoint arrays.
+
+  Implements the parts of the SparseMatrix interface that the ColumnPooler
+  uses for inference. Methods that modify the matrix raise a ValueError.
+  """
+
+  def __init__(self, directory, name):
+    super(CheckpointMatrix, self).__init__(directory, name)
+
+    # Connected synapse counts per row, by threshold. Computed on first use.
+    self._connectedCounts = {}
+
+
+  def nRows(self):
+    return self.nSegments()
+
+
+  def nCols(self):
+    return self.inputCount
+
+
+  def rightVecSumAtNZGteThresholdSparse(self, activeInput, threshold):
+    return self.computeActivity(activeInput, threshold).astype("float32")
+
+
+  def nNonZerosOnRow(self, row):
+    return self.mapSegmentsToSynapseCounts(row)
+
+
+  def countWhereGreaterOrEqual(self, rowBegin, rowEnd, colBegin, colEnd,
+                               threshold):
+    if colBegin == 0 and colEnd == self.inputCount:
+      if threshold not in self._connectedCounts:
+        segments, _ = self.getConnectedSynapses(threshold)
+        self._connectedCounts[threshold] = self._countPerSegment(segments)
+      return self._connectedCounts[threshold][rowBegin:rowEnd].sum()
+
+    connectedSegments, inputStarts = self.getConnectedSynapses(threshold)
+    segments = connectedSegments[inputStarts[colBegin]:inputStarts[colEnd]]
+    return np.count_nonzero((segments >= rowBegin) & (segments < rowEnd))
+
+
+  def incrementNonZerosOnOuter(self, *args, **kwargs):
+    self._raiseReadOnly()
+
+
+  def incrementNonZerosOnRowsExcludingCols(self, *args, **kwargs):
+    self._raiseReadOnly()
+
+
+  def clipRowsBelowAndAbove(self, *args, **kwargs):
+    self._raiseReadOnly()
+
+
+  def setZerosOnOuter(self, *args, **kwargs):
+    self._raiseReadOnly()
+
+
+  def setRandomZerosOnOuter(self, *args, **kwargs):
+    self._raiseReadOnly()
+
+
+  def toSparseMatrix(self):
+    """
+    Copy this matrix into a new SparseMatrix.
+    """
+    matrix = SparseMatrix(self.nSegments(), self.inputCount)
+    self._copySynapses(matrix)
+    return matrix
+
+
+
+def saveModel(model, directory, connectionNames, transientNames=(),
+              permanenceDtype="float32", connectedPermanences=None):
+  """
+  Save a model that owns SparseMatrixConnections or SparseMatrix permanences.
+  These are written with saveConnections or saveMatrix, and everything else is
+  pickled.
+
+  @param model (object)
+
+  @param directory (str)
+  Created if it doesn't exist
+
+  @param connectionNames (sequence)
+  Names of the model's SparseMatrixConnections or SparseMatrix attributes, or
+  of tuples of SparseMatrix
+
+  @param transientNames (sequence)
+  Names of attributes that shouldn't be saved, because they're derived from the
+  rest of the model or only describe recent activity. They're None after
+  loading, unless the model has an _initEphemerals method, which loadModel
+  calls to rebuild them.
+
+  @param permanenceDtype (str)
+  "float32", "uint16" or "uint8"
+
+  @param connectedPermanences (dict)
+  The connected permanence of each of the connectionNames. Required for
+  fixed-point permanences.
+  """
+  if not os.path.isdir(directory):
+    os.makedirs(directory)
+
+  if connectedPermanences is None:
+    connectedPermanences = {}
+
+  cellCount = model.numberOfCells()
+  kinds = {}
+  for connectionName in connectionNames:
+    connections = getattr(model, connectionName)
+    connectedPermanence = connectedPermanences.get(connectionName)
+
+    if isinstance(connections, tuple):
+      kinds[connectionName] = len(connections)
+      for i, matrix in enumerate(connections):
+        saveMatrix(matrix, directory, "{}.{}".format(connectionName, i),
+                   permanenceDtype, connectedPermanence)
+    elif hasattr(connections, "matrix"):
+      kinds[connectionName] = "connections"
+      saveConnections(connections, cellCount, directory, connectionName,
+                      permanenceDtype, connectedPermanence)
+    else:
+      kinds[connectionName] = "matrix"
+      saveMatrix(connections, directory, connectionName, permanenceDtype,
+                 connectedPermanence)
+
+  state = dict(model.__dict__)
+  for name in tuple(connectionNames) + tuple(transientNames):
+    state[name] = None
+
+  with open(os.path.join(directory, "model.pkl"), "wb") as f:
+    pickle.dump({"version": FORMAT_VERSION,
+                 "modelClass": model.__class__,
+                 "connectionNames": tuple(connectionNames),
+                 "connectionKinds": kinds,
+                 "state": state},
+                f, pickle.HIGHEST_PROTOCOL)
+
+
+
+def loadModel(directory, mmap=True):
+  """
+  Load a model saved by saveModel.
+
+  @param mmap (bool)
+  If True, the connections are read-only CheckpointConnections or
+  CheckpointMatrix objects that are memory-mapped from the checkpoint.
+  Otherwise they are SparseMatrixConnections or SparseMatrix, and the model can
+  keep learning.
+
+  Then the model's _initEphemerals method, if it has one, is called to rebuild
+  the attributes that saveModel left out.
+
+  @return (object)
+  """
+  with open(os.path.join(directory, "model.pkl"), "rb") as f:
+    saved = pickle.load(f)
+
+  if saved["version"] != FORMAT_VERSION:
+    raise ValueError("Unsupported checkpoint version: {}".format(
+      saved["version"]))
+
+  modelClass = saved["modelClass"]
+  model = modelClass.__new__(modelClass)
+  model.__dict__.update(saved["state"])
+
+  for connectionName in saved["connectionNames"]:
+    kind = saved["connectionKinds"][connectionName]
+    if kind == "connections":
+      connections = loadConnections(directory, connectionName, mmap)
+    elif kind == "matrix":
+      connections = loadMatrix(directory, connectionName, mmap)
+    else:
+      connections = tuple(loadMatrix(directory,
+                                     "{}.{}".format(connectionName, i), mmap)
+                          for i in xrange(kind))
+    setattr(model, connectionName, connections)
+
+  if hasattr(model, "_initEphemerals"):
+    model._initEphemerals()
+
+  return model
+
+
+
+def _arrayPath(directory, name, arrayName):
+  return os.path.join(directory, "{}.{}.npy".format(name, arrayName))
+
+
+
+def _writeMetadata(directory, name, metadata):
+  with open(os.path.join(directory, "{}.json".format(name)), "w") as f:
+    json.dump(dict(metadata, version=FORMAT_VERSION), f)
+
+
+
+def _readMetadata(directory, name):
+  with open(os.path.join(directory, "{}.json".format(name)), "r") as f:
+    metadata = json.load(f)
+
+  if metadata["version"] != FORMAT_VERSION:
+    raise ValueError("Unsupported checkpoint version: {}".format(
+      metadata["version"]))
+
+  return metadata
@@ -0,0 +1,93 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+
+"""A read-only snapshot of connected synapses, for fast inference"""
+
+
+import numpy as np
+
+
+
+class FrozenConnections(object):
+  """
+  A read-only snapshot of the connected synapses of a SparseMatrixConnections.
+
+  The synapses are stored as a boolean CSR matrix indexed by presynaptic input:
+  for each input, the sorted list of segments that have a connected synapse to
+  it. Permanences aren't stored. Computing activity only touches the rows of
+  the active inputs, so its cost is proportional to the input activity rather
+  than to the total number of synapses.
+  """
+
+  def __init__(self, connections, connectedPermanence):
+    """
+    @param connections (SparseMatrixConnections or CheckpointConnections)
+    Connections that store their synapses grouped by presynaptic input, like
+    CheckpointConnections, implement getConnectedSynapses(connectedPermanence)
+    and it's used instead of reading the matrix.
+
+    @param connectedPermanence (float)
+    """
+    if hasattr(connections, "getConnectedSynapses"):
+      (self.segments,
+       self.inputStarts) = connections.getConnectedSynapses(connectedPermanence)
+      return
+
+    inputCount = connections.matrix.nCols()
+
+    # Every synapse, sorted by segment and then by presynaptic input
+    segments, inputs, permanences = connections.matrix.getAllNonZeros(True)
+    connected = permanences >= np.float32(connectedPermanence)
+    segments = segments[connected]
+    inputs = inputs[connected]
+
+    # Stable, so each input's segments stay sorted.
+    sorter = np.argsort(inputs, kind="mergesort")
+    self.segments = segments[sorter]
+    self.inputStarts = np.searchsorted(inputs[sorter],
+                                       np.arange(inputCount + 1))
+
+
+  def computeActivity(self, activeInput):
+    """
+    Count the active connected synapses on each segment.
+
+    @param activeInput (numpy array)
+
+    @return (tuple)
+    - segments (numpy array)
+      Sorted segments with at least one active connected synapse
+
+    - overlaps (numpy array)
+      The number of active connected synapses on each of these segments
+    """
+    activeInput = np.asarray(activeInput, dtype="int64")
+
+    starts = self.inputStarts[activeInput]
+    lengths = self.inputStarts[activeInput + 1] - starts
+
+    # Gather the rows of the active inputs into one flat index array.
+    rowOffsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    synapses = rowOffsets + np.arange(len(rowOffsets))
+
+    return np.unique(self.segments[synapses], return_counts=True)
@@ -163,3 +163,156 @@ def getAllCellsInColumns(columns, cellsPerColumn):
   # then flatten it.
   return ((columns * cellsPerColumn).reshape((-1, 1)) +
           np.arange(cellsPerColumn, dtype="uint32")).flatten()
+
+
+def argminRows(a, offsetPercents):
+  """
+  Get the index of a minimum in each row of a 2D array, choosing between tied
+  minimums with a random offset per row.
+
+  @param a (2D numpy array)
+  An array of values that will be compared
+
+  @param offsetPercents (numpy array)
+  One number in [0, 1) per row. Of the n minimums in a row, the one at
+  position floor(offsetPercent * n) is chosen.
+
+  @return (numpy array)
+  The column index of one minimum per row
+
+  @example
+    argminRows([[3, 1, 1, 2],
+                [0, 5, 0, 0]],
+               [0.75, 0.5])
+  returns
+    [2, 2]
+  """
+  isMin = a == np.amin(a, axis=1, keepdims=True)
+
+  # Position of each minimum among the minimums of its row, counting from 1.
+  minRanks = np.cumsum(isMin, axis=1)
+  chosenRanks = (offsetPercents * minRanks[:, -1]).astype("int64") + 1
+
+  return np.argmax(isMin & (minRanks == chosenRanks.reshape((-1, 1))), axis=1)
+
+
+# Above this domain size, BitmapSetOperations' lookup tables take up more
+# memory than they're worth.
+MAX_BITMAP_DOMAIN = 1 << 20
+
+
+class SortSetOperations(object):
+  """
+  The sort-based setCompare and argmaxMulti, bundled so that they can be
+  swapped with BitmapSetOperations.
+  """
+
+  setCompare = staticmethod(setCompare)
+  argmaxMulti = staticmethod(argmaxMulti)
+
+
+
+class BitmapSetOperations(object):
+  """
+  setCompare and argmaxMulti for keys that are bounded integers, e.g. cell or
+  column indices.
+
+  Rather than sorting keys, these mark them in lookup tables that span the
+  whole domain. The tables are allocated once and are cleared after every call
+  by only touching the entries that were set, so the cost of a call depends on
+  the size of its inputs, not the size of the domain. setCompare is O(n).
+  argmaxMulti still sorts the values once, but it skips the key sort and the
+  np.unique pass.
+
+  The results are identical to the sort-based functions.
+  """
+
+  def __init__(self, domainSize):
+    """
+    @param domainSize (int)
+    Every key must be in the range [0, domainSize).
+    """
+    self.domainSize = domainSize
+    self._marked = np.zeros(domainSize, dtype="bool")
+    self._groupWinner = np.full(domainSize, -1, dtype="int64")
+
+
+  def setCompare(self, a, b,
+                 aKey=None, bKey=None,
+                 leftMinusRight=False, rightMinusLeft=False):
+    """
+    Same as numpy_helpers.setCompare.
+    """
+    aKey = _asIndices(aKey if aKey is not None else a)
+    bKey = _asIndices(bKey if bKey is not None else b)
+
+    self._marked[bKey] = True
+    aWithinBMask = self._marked[aKey]
+    self._marked[bKey] = False
+
+    if rightMinusLeft:
+      self._marked[aKey] = True
+      bWithinAMask = self._marked[bKey]
+      self._marked[aKey] = False
+
+      if leftMinusRight:
+        return (a[aWithinBMask],
+                a[~aWithinBMask],
+                b[bWithinAMask])
+      else:
+        return (a[aWithinBMask],
+                b[~bWithinAMask])
+    elif leftMinusRight:
+      return (a[aWithinBMask],
+              a[~aWithinBMask])
+    else:
+      return a[aWithinBMask]
+
+
+  def argmaxMulti(self, a, groupKeys, assumeSorted=False):
+    """
+    Same as numpy_helpers.argmaxMulti. The indices are returned in order of
+    their group keys, and ties are broken by choosing the first occurrence.
+    """
+    groupKeys = _asIndices(groupKeys)
+    a = np.asarray(a)
+
+    # Order the positions by value, breaking ties by putting later positions
+    # first. When a fancy assignment repeats an index, the last write wins, so
+    # each group's entry ends up being the first position of its max value.
+    positions = (len(a) - 1) - np.argsort(a[::-1], kind="mergesort")
+    self._groupWinner[groupKeys[positions]] = positions
+    indices = np.flatnonzero(self._groupWinner[groupKeys] ==
+                             np.arange(len(a)))
+    self._groupWinner[groupKeys] = -1
+
+    if assumeSorted:
+      return indices
+    else:
+      # One index per group, so this sort is only over the winners.
+      return indices[np.argsort(groupKeys[indices])]
+
+
+
+def _asIndices(keys):
+  """
+  Make keys usable as indices. Empty inputs like np.asarray(()) are float
+  arrays, and numpy won't index with them.
+  """
+  keys = np.asarray(keys)
+  if keys.dtype.kind not in "iu":
+    keys = keys.astype("int64")
+  return keys
+
+
+
+def createSetOperations(domainSize):
+  """
+  Choose the fastest set operations for keys in the range [0, domainSize).
+
+  @return (BitmapSetOperations or SortSetOperations)
+  """
+  if domainSize <= MAX_BITMAP_DOMAIN:
+    return BitmapSetOperations(domainSize)
+  else:
+    return SortSetOperations()
@@ -0,0 +1,135 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""Opt-in timing of the phases of an algorithm's compute"""
+
+import json
+import time
+
+
+
+class PhaseProfiler(object):
+  """
+  Accumulates wall time and call counts for named phases, and counts of the
+  segments and synapses that were touched on each timestep.
+
+  An algorithm calls 'mark' at the start of a method and 'lap' at the end of
+  each phase, so timing a phase costs one clock read. Algorithms hold a
+  profiler in an attribute that is None when profiling is disabled, and check
+  that attribute before each call.
+  """
+
+  def __init__(self, phases, touchedCounts):
+    """
+    @param phases (sequence)
+    Names of the phases, in the order that they run
+
+    @param touchedCounts (sequence)
+    Names of the quantities that are counted on each timestep, e.g.
+    "basalSegments"
+    """
+    self.phases = tuple(phases)
+    self.touchedCounts = tuple(touchedCounts)
+    self.reset()
+
+
+  def reset(self):
+    """
+    Clear all measurements.
+    """
+    self.seconds = dict((phase, 0.0) for phase in self.phases)
+    self.calls = dict((phase, 0) for phase in self.phases)
+    self.steps = 0
+    self.totalTouched = dict((name, 0) for name in self.touchedCounts)
+    self.currentTouched = dict((name, 0) for name in self.touchedCounts)
+    self.lastTouched = dict((name, 0) for name in self.touchedCounts)
+    self.markTime = time.time()
+
+
+  def mark(self):
+    """
+    Start timing the next phase.
+    """
+    self.markTime = time.time()
+
+
+  def lap(self, phase, newCall=True):
+    """
+    Attribute the time since the previous mark or lap to a phase.
+
+    @param phase (str)
+
+    @param newCall (bool)
+    False if this continues a call of the phase that was already counted
+    during this timestep.
+    """
+    now = time.time()
+    self.seconds[phase] += now - self.markTime
+    if newCall:
+      self.calls[phase] += 1
+    self.markTime = now
+
+
+  def touch(self, name, count):
+    """
+    Add to one of the counts of the current timestep.
+    """
+    self.currentTouched[name] += int(count)
+
+
+  def endStep(self):
+    """
+    Finish the current timestep.
+    """
+    self.steps += 1
+    for name in self.touchedCounts:
+      self.totalTouched[name] += self.currentTouched[name]
+    self.lastTouched = self.currentTouched
+    self.currentTouched = dict((name, 0) for name in self.touchedCounts)
+
+
+  def toDict(self):
+    """
+    @return (dict)
+    - steps: number of timesteps
+    - phases: for each phase, its cumulative "seconds" and "calls"
+    - touched: for each count, its "total", its "lastStep" value and its mean
+      "perStep"
+    """
+    return {
+      "steps": self.steps,
+      "phases": dict((phase, {"seconds": self.seconds[phase],
+                              "calls": self.calls[phase]})
+                     for phase in self.phases),
+      "touched": dict((name, {"total": self.totalTouched[name],
+                              "lastStep": self.lastTouched[name],
+                              "perStep": (float(self.totalTouched[name]) /
+                                          self.steps if self.steps else 0.0)})
+                      for name in self.touchedCounts),
+    }
+
+
+  def toJSON(self, **kwargs):
+    """
+    @return (str)
+    The result of toDict as JSON. Keyword arguments go to json.dumps.
+    """
+    return json.dumps(self.toDict(), **kwargs)
@@ -0,0 +1,172 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+
+"""Segment activity calculations shared by the temporal memories"""
+
+
+import itertools
+
+import numpy as np
+
+
+# Above this many candidate segments, looking up the candidates' rows one at a
+# time is slower than a second full pass over the matrix. On 100k segments with
+# 20 synapses each, the two cost the same at about 600 candidates; see
+# projects/benchmarks/segment_activity_benchmark.py.
+MAX_ROW_LOOKUPS = 256
+
+
+def computeSegmentActivity(connections, activeInput, connectedPermanence,
+                           activationThreshold):
+  """
+  Compute the number of active connected synapses and the number of active
+  potential synapses on each segment, with one full pass over the matrix.
+
+  A segment's connected overlap can never exceed its potential overlap. So the
+  full pass counts potential synapses, and the connected synapses are only
+  counted on the few segments whose potential overlap reaches
+  activationThreshold. Those are the only segments whose connected overlap can
+  reach it. When there are too many of them, fall back to a second full pass.
+
+  Connections that can compute both overlaps more directly, like
+  CheckpointConnections, implement computeOverlaps(activeInput,
+  connectedPermanence), and it's used instead.
+
+  @param connections (SparseMatrixConnections or CheckpointConnections)
+  @param activeInput (numpy array)
+
+  @param connectedPermanence (float)
+  Synapses with at least this permanence are connected.
+
+  @param activationThreshold (int)
+  The lowest connected overlap that the caller cares about. Pass the smallest
+  threshold that will be applied to the connected overlaps.
+
+  @return (tuple)
+  - overlaps (numpy array)
+    The number of active connected synapses for each segment. This is exact
+    for every segment where it's >= activationThreshold. It's 0 for segments
+    that can't reach activationThreshold.
+
+  - potentialOverlaps (numpy array)
+    The number of active potential synapses for each segment.
+  """
+  if hasattr(connections, "computeOverlaps"):
+    return connections.computeOverlaps(activeInput, connectedPermanence)
+
+  potentialOverlaps = connections.computeActivity(activeInput)
+
+  candidates = np.flatnonzero(potentialOverlaps >= activationThreshold)
+
+  if len(candidates) > MAX_ROW_LOOKUPS:
+    overlaps = connections.computeActivity(activeInput, connectedPermanence)
+    return overlaps, potentialOverlaps
+
+  overlaps = np.zeros(len(potentialOverlaps), dtype=potentialOverlaps.dtype)
+
+  if len(candidates) > 0:
+    overlaps[candidates], _ = _countCandidateSynapses(
+      connections, activeInput, connectedPermanence, candidates)
+
+  return overlaps, potentialOverlaps
+
+
+
+def computeCandidateSegmentActivity(connections, activeInput,
+                                    connectedPermanence, candidates):
+  """
+  Compute the number of active connected synapses and the number of active
+  potential synapses on a few candidate segments, without a pass over the
+  whole matrix.
+
+  This is for segments that are split into multiple parts, where one part's
+  activity rules out most segments before the other part's is needed. Only
+  the candidates' rows are looked up. When there are too many candidates, fall
+  back to full passes. Connections that implement computeOverlaps compute
+  every segment's overlaps with it instead.
+
+  @param connections (SparseMatrixConnections or CheckpointConnections)
+  @param activeInput (numpy array)
+
+  @param connectedPermanence (float)
+  Synapses with at least this permanence are connected.
+
+  @param candidates (numpy array)
+  The segments whose activity the caller cares about
+
+  @return (tuple)
+  - overlaps (numpy array)
+    The number of active connected synapses for each segment. This is exact
+    for the candidates. Other segments may have 0.
+
+  - potentialOverlaps (numpy array)
+    The number of active potential synapses for each segment. This is exact
+    for the candidates. Other segments may have 0.
+  """
+  if hasattr(connections, "computeOverlaps"):
+    return connections.computeOverlaps(activeInput, connectedPermanence)
+
+  if len(candidates) > MAX_ROW_LOOKUPS:
+    return (connections.computeActivity(activeInput, connectedPermanence),
+            connections.computeActivity(activeInput))
+
+  segmentCount = connections.matrix.nRows()
+  overlaps = np.zeros(segmentCount, dtype="int32")
+  potentialOverlaps = np.zeros(segmentCount, dtype="int32")
+
+  if len(candidates) > 0 and len(activeInput) > 0:
+    (overlaps[candidates],
+     potentialOverlaps[candidates]) = _countCandidateSynapses(
+       connections, activeInput, connectedPermanence, candidates)
+
+  return overlaps, potentialOverlaps
+
+
+
+def _countCandidateSynapses(connections, activeInput, connectedPermanence,
+                            candidates):
+  """
+  Count the active connected synapses and the active potential synapses on
+  each candidate segment, looking up only the candidates' rows.
+
+  @return (tuple)
+  (overlaps, potentialOverlaps), one entry per candidate
+  """
+  rows = [connections.matrix.rowNonZeros(segment) for segment in candidates]
+
+  # The column indices of a row come back as a tuple, the values as an array.
+  presynapticInputs = np.fromiter(itertools.chain.from_iterable(
+    columns for columns, _ in rows), dtype="uint32")
+  permanences = np.concatenate([values for _, values in rows])
+  synapseCandidates = np.repeat(np.arange(len(rows)),
+                                [len(columns) for columns, _ in rows])
+
+  isActive = np.in1d(presynapticInputs, activeInput)
+  potentialOverlaps = np.bincount(synapseCandidates[isActive],
+                                  minlength=len(rows))
+
+  # Compare in float32, like the matrix does.
+  isActive &= permanences >= np.float32(connectedPermanence)
+  overlaps = np.bincount(synapseCandidates[isActive], minlength=len(rows))
+
+  return overlaps, potentialOverlaps
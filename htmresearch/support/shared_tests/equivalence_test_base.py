@@ -0,0 +1,88 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Shared fixture for tests that check that two instances of an algorithm, built
+or run differently, compute the same cells.
+"""
+
+import numpy as np
+
+
+
+class EquivalenceTestBase(object):
+  """
+  Mixin for unittest.TestCase. Provides seeded random SDRs, training on a
+  sequence of inputs, and comparisons of the cells of several instances.
+
+  Inputs are tuples of positional arguments to the instances' compute method,
+  which must also take a "learn" keyword argument.
+  """
+
+  # The getters compared by _assertSameCells and _assertSameBehavior
+  cellGetters = ("getActiveCells",)
+
+
+  def setUp(self):
+    self.rng = np.random.RandomState(42)
+
+
+  def _randomSDR(self, size, w):
+    return np.sort(self.rng.choice(size, w, replace=False)).astype("uint32")
+
+
+  def _train(self, instances, inputs, numRepetitions=5,
+             resetAfterEachRepetition=True):
+    """
+    Learn the inputs numRepetitions times on each instance, then reset it.
+
+    @param resetAfterEachRepetition (bool)
+    If False, only reset after the last repetition, so that the instance
+    learns the inputs as one object rather than as a sequence.
+    """
+    for instance in instances:
+      for _ in xrange(numRepetitions):
+        for args in inputs:
+          instance.compute(*args, learn=True)
+        if resetAfterEachRepetition:
+          instance.reset()
+      if not resetAfterEachRepetition:
+        instance.reset()
+
+
+  def _assertSameCells(self, actual, expected, cellGetters=None):
+    for getter in cellGetters or self.cellGetters:
+      np.testing.assert_equal(getattr(actual, getter)(),
+                              getattr(expected, getter)(),
+                              err_msg=getter)
+
+
+  def _assertSameBehavior(self, expected, others, inputs, learn,
+                          cellGetters=None):
+    """
+    Compute each input on all the instances, and check that the others
+    compute the same cells as the expected one after every step.
+    """
+    for args in inputs:
+      expected.compute(*args, learn=learn)
+      for other in others:
+        other.compute(*args, learn=learn)
+        self._assertSameCells(other, expected, cellGetters)
@@ -509,7 +509,22 @@ class UnionTemporalPoolerMonitorMixin(MonitorMixinBase):
 
     unionSDR = super(UnionTemporalPoolerMonitorMixin, self).compute(*args,
                                                                     **kwargs)
+    self._mmRecordCompute(unionSDR, sequenceLabel)
 
+    return unionSDR
+
+
+  def computeSparse(self, *args, **kwargs):
+    sequenceLabel = kwargs.pop("sequenceLabel", None)
+
+    unionSDR = super(UnionTemporalPoolerMonitorMixin, self).computeSparse(
+      *args, **kwargs)
+    self._mmRecordCompute(unionSDR, sequenceLabel)
+
+    return unionSDR
+
+
+  def _mmRecordCompute(self, unionSDR, sequenceLabel):
     ### From spatial pooler
     # total number of connections
     connectedCounts = numpy.zeros(self.getNumColumns(), dtype=uintType)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare stepping N separate ApicalTiebreakSequenceMemory instances against one
+ApicalTiebreakSequenceMemoryBatch, reporting streams per second.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakSequenceMemory)
+from htmresearch.algorithms.apical_tiebreak_temporal_memory_batch import (
+  ApicalTiebreakSequenceMemoryBatch)
+
+
+PARAMS = {
+  "columnCount": 256,
+  "cellsPerColumn": 8,
+  "activationThreshold": 8,
+  "reducedBasalThreshold": 8,
+  "minThreshold": 6,
+  "sampleSize": 12,
+}
+
+
+
+def generateStreams(streamCount, sequenceLength, activeColumnCount, seed):
+  rng = np.random.RandomState(seed)
+  return [[np.sort(rng.choice(PARAMS["columnCount"], activeColumnCount,
+                              replace=False)).astype("uint32")
+           for _ in xrange(sequenceLength)]
+          for _ in xrange(streamCount)]
+
+
+
+def timeSeparate(streams, numSteps):
+  tms = [ApicalTiebreakSequenceMemory(seed=42 + i, **PARAMS)
+         for i in xrange(len(streams))]
+
+  start = time.time()
+  for step in xrange(numSteps):
+    for tm, sequence in zip(tms, streams):
+      tm.compute(sequence[step % len(sequence)], learn=True)
+  return time.time() - start
+
+
+
+def timeBatch(streams, numSteps):
+  batch = ApicalTiebreakSequenceMemoryBatch(
+    streamCount=len(streams), seed=range(42, 42 + len(streams)), **PARAMS)
+
+  start = time.time()
+  for step in xrange(numSteps):
+    batch.computeByStream([sequence[step % len(sequence)]
+                           for sequence in streams], learn=True)
+  return time.time() - start
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--streamCounts", type=int, nargs="+",
+                      default=[1, 64, 1024])
+  parser.add_argument("--numSteps", type=int, default=100)
+  parser.add_argument("--sequenceLength", type=int, default=10)
+  parser.add_argument("--activeColumnCount", type=int, default=10)
+  args = parser.parse_args()
+
+  rows = []
+  for streamCount in args.streamCounts:
+    streams = generateStreams(streamCount, args.sequenceLength,
+                              args.activeColumnCount, seed=streamCount)
+    separate = timeSeparate(streams, args.numSteps)
+    batch = timeBatch(streams, args.numSteps)
+    rows.append([streamCount,
+                 streamCount * args.numSteps / separate,
+                 streamCount * args.numSteps / batch,
+                 separate / batch])
+
+  print tabulate(rows, headers=["streams", "separate (streams/s)",
+                                "batch (streams/s)", "speedup"],
+                 floatfmt=".1f")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare inference with learn=False against inference on a frozen
+ApicalTiebreakSequenceMemory.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakSequenceMemory)
+
+
+
+def timeInference(tm, sequences):
+  start = time.time()
+  for sequence in sequences:
+    for activeColumns in sequence:
+      tm.compute(activeColumns, learn=False)
+    tm.reset()
+  return time.time() - start
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--columnCount", type=int, default=2048)
+  parser.add_argument("--cellsPerColumn", type=int, default=32)
+  parser.add_argument("--numSequences", type=int, default=50)
+  parser.add_argument("--sequenceLength", type=int, default=20)
+  args = parser.parse_args()
+
+  rng = np.random.RandomState(42)
+  sequences = [[np.sort(rng.choice(args.columnCount, 40, replace=False))
+                .astype("uint32")
+                for _ in xrange(args.sequenceLength)]
+               for _ in xrange(args.numSequences)]
+
+  tm = ApicalTiebreakSequenceMemory(columnCount=args.columnCount,
+                                    cellsPerColumn=args.cellsPerColumn)
+  for _ in xrange(3):
+    for sequence in sequences:
+      for activeColumns in sequence:
+        tm.compute(activeColumns, learn=True)
+      tm.reset()
+
+  steps = args.numSequences * args.sequenceLength
+  unfrozen = timeInference(tm, sequences)
+
+  start = time.time()
+  tm.freeze()
+  freezeTime = time.time() - start
+  frozen = timeInference(tm, sequences)
+
+  print tabulate([["learn=False", steps / unfrozen, ""],
+                  ["frozen", steps / frozen, unfrozen / frozen]],
+                 headers=["mode", "steps/s", "speedup"], floatfmt=".1f")
+  print "freeze() took %.3f s" % freezeTime
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare choosing the cells with the fewest segments in bursting columns from
+the ApicalTiebreakTemporalMemory's maintained per-cell segment counts against
+counting the segments with getSegmentCounts on every call. The workload is
+random input, so nearly every active column bursts.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakSequenceMemory)
+from htmresearch.support import numpy_helpers as np2
+
+
+
+class CountingSequenceMemory(ApicalTiebreakSequenceMemory):
+  """
+  Chooses the cells with the fewest segments the original way.
+  """
+
+  def _getCellsWithFewestSegments(self, segmentCounts, rng, columns,
+                                  cellsPerColumn):
+    candidateCells = np2.getAllCellsInColumns(columns, cellsPerColumn)
+
+    segmentCounts = np.reshape(
+      self.basalConnections.getSegmentCounts(candidateCells),
+      newshape=(len(columns), cellsPerColumn))
+
+    minSegmentCounts = np.amin(segmentCounts, axis=1, keepdims=True)
+    candidateCells = candidateCells[np.flatnonzero(segmentCounts ==
+                                                   minSegmentCounts)]
+
+    (_,
+     onePerColumnFilter,
+     numCandidatesInColumns) = np.unique(candidateCells // cellsPerColumn,
+                                         return_index=True, return_counts=True)
+
+    offsetPercents = np.empty(len(columns), dtype="float32")
+    rng.initializeReal32Array(offsetPercents)
+
+    np.add(onePerColumnFilter,
+           offsetPercents*numCandidatesInColumns,
+           out=onePerColumnFilter,
+           casting="unsafe")
+
+    return candidateCells[onePerColumnFilter]
+
+
+
+def timeSelection(tm, columnBatches):
+  start = time.time()
+  for columns in columnBatches:
+    tm._getCellsWithFewestSegments(tm.basalSegmentCounts, tm.rng, columns,
+                                   tm.getCellsPerColumn())
+  return time.time() - start
+
+
+
+def timeCompute(tm, inputs):
+  start = time.time()
+  for activeColumns in inputs:
+    tm.compute(activeColumns, learn=True)
+  return time.time() - start
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--columnCount", type=int, default=2048)
+  parser.add_argument("--cellsPerColumn", type=int, default=32)
+  parser.add_argument("--activeColumns", type=int, default=400)
+  parser.add_argument("--trainingSteps", type=int, default=200)
+  parser.add_argument("--steps", type=int, default=200)
+  args = parser.parse_args()
+
+  rng = np.random.RandomState(42)
+
+  def randomColumns():
+    return np.sort(rng.choice(args.columnCount, args.activeColumns,
+                              replace=False)).astype("uint32")
+
+  trainingInputs = [randomColumns() for _ in xrange(args.trainingSteps)]
+  inputs = [randomColumns() for _ in xrange(args.steps)]
+
+  rows = []
+  for name, cls in (("counting", CountingSequenceMemory),
+                    ("maintained counts", ApicalTiebreakSequenceMemory)):
+    tm = cls(columnCount=args.columnCount,
+             cellsPerColumn=args.cellsPerColumn)
+    timeCompute(tm, trainingInputs)
+
+    selectionTime = timeSelection(tm, inputs)
+    computeTime = timeCompute(tm, inputs)
+
+    rows.append([name,
+                 tm.basalConnections.nSegments(),
+                 selectionTime / args.steps * 1000,
+                 args.steps / computeTime])
+
+  print tabulate(rows,
+                 headers=["segment counts", "segments",
+                          "selection ms/step", "compute steps/s"],
+                 floatfmt=".3f")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare SingleLayerLocationMemory computing the delta activity of only the
+segments whose internal part is active or matching against computing it for
+every segment. The workload is the single_layer_2d_experiment's transition
+learning on a grid of location SDRs, followed by long path-integration
+sequences of random moves.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from htmresearch.algorithms.single_layer_location_memory import (
+  SingleLayerLocationMemory)
+from htmresearch.support.segment_activity import computeSegmentActivity
+
+
+
+class FullPassLocationMemory(SingleLayerLocationMemory):
+  """
+  Computes the delta activity of every segment.
+  """
+
+  def _computeDeltaActivity(self, deltaLocation, candidates):
+    return computeSegmentActivity(
+      self.deltaConnections, deltaLocation, self.connectedPermanence,
+      self.activationThreshold)
+
+
+
+def createSDRs(rng, keys, size, activeBits):
+  return dict((key, np.sort(rng.choice(size, activeBits, replace=False))
+               .astype("uint32"))
+              for key in keys)
+
+
+
+def learnTransitions(memory, locations, transitions):
+  start = time.time()
+
+  for (i, j), locationSDR in sorted(locations.iteritems()):
+    for (di, dj), transitionSDR in sorted(transitions.iteritems()):
+      if (i + di, j + dj) in locations:
+        for _ in xrange(5):
+          memory.reset()
+          memory.compute(newLocation=locationSDR)
+          memory.compute(deltaLocation=transitionSDR,
+                         newLocation=locations[(i + di, j + dj)])
+
+  memory.reset()
+
+  return time.time() - start
+
+
+
+def integratePaths(memory, locations, transitions, paths):
+  start = time.time()
+
+  for startLocation, moves in paths:
+    memory.reset()
+    memory.compute(newLocation=locations[startLocation], learn=False)
+    for move in moves:
+      memory.compute(deltaLocation=transitions[move], learn=False)
+
+  return time.time() - start
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--diameter", type=int, default=10)
+  parser.add_argument("--paths", type=int, default=20)
+  parser.add_argument("--pathLength", type=int, default=100)
+  args = parser.parse_args()
+
+  rng = np.random.RandomState(42)
+
+  locations = createSDRs(rng, [(i, j)
+                               for i in xrange(args.diameter)
+                               for j in xrange(args.diameter)], 1000, 30)
+  transitions = createSDRs(rng, [(di, dj)
+                                 for di in xrange(-1, 2)
+                                 for dj in xrange(-1, 2)
+                                 if di != 0 or dj != 0], 1000, 30)
+
+  # Random walks that stay on the grid.
+  paths = []
+  for _ in xrange(args.paths):
+    location = (rng.randint(args.diameter), rng.randint(args.diameter))
+    startLocation = location
+    moves = []
+    for _ in xrange(args.pathLength):
+      options = [(di, dj) for di, dj in sorted(transitions.iterkeys())
+                 if (location[0] + di, location[1] + dj) in locations]
+      move = options[rng.randint(len(options))]
+      location = (location[0] + move[0], location[1] + move[1])
+      moves.append(move)
+    paths.append((startLocation, moves))
+
+  numSteps = args.paths * args.pathLength
+
+  rows = []
+  for name, cls in (("every segment", FullPassLocationMemory),
+                    ("candidate segments", SingleLayerLocationMemory)):
+    memory = cls(cellCount=1000,
+                 deltaLocationInputSize=1000,
+                 featureLocationInputSize=150*32,
+                 sampleSize=15,
+                 activationThreshold=10,
+                 learningThreshold=8)
+
+    learningTime = learnTransitions(memory, locations, transitions)
+    inferenceTime = integratePaths(memory, locations, transitions, paths)
+
+    rows.append([name,
+                 memory.internalConnections.nSegments(),
+                 learningTime,
+                 numSteps / inferenceTime])
+
+  print tabulate(rows,
+                 headers=["delta activity", "segments", "learning s",
+                          "path integration steps/s"],
+                 floatfmt=".3f")
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare SuperficialLocationModule2D's preallocated point buffer against
+reallocating the active points on every shift and anchor. The workload is the
+location modules' part of the grid_2d_location_experiment: 18 modules learn
+the discrete objects, then infer them with random movements. The anchor input
+of each feature-location pair is a random SDR, and the first touch of every
+inference sequence is anchored with the union of the SDRs for that feature.
+"""
+
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from htmresearch.algorithms.location_modules import SuperficialLocationModule2D
+
+
+DISCRETE_OBJECTS = {
+  "Object 1": {(0,0): "A", (0,1): "B", (0,2): "A", (1,0): "A", (1,2): "A"},
+  "Object 2": {(0,1): "A", (1,0): "B", (1,1): "B", (1,2): "B", (2,1): "A"},
+  "Object 3": {(0,1): "A", (1,0): "A", (1,1): "B", (1,2): "A", (2,0): "B",
+               (2,1): "A", (2,2): "B"},
+  "Object 4": {(0,0): "A", (0,1): "A", (0,2): "A", (1,0): "A", (1,2): "B",
+               (2,0): "B", (2,1): "B", (2,2): "B"},
+}
+
+CM_PER_UNIT = 100.0 / 12.0
+
+ANCHOR_INPUT_SIZE = 150*32
+
+
+
+class ReallocatingLocationModule2D(SuperficialLocationModule2D):
+  """
+  Stores the active points the original way, reallocating them on every shift
+  and anchor.
+  """
+
+  def reset(self):
+    super(ReallocatingLocationModule2D, self).reset()
+    self.points = np.empty((0,2), dtype="float")
+    self.pointCells = np.empty(0, dtype="int")
+
+
+  def _computeReferenceCells(self):
+    flooredActivePoints = np.floor(self.points).astype("int")
+    self.pointCells = np.ravel_multi_index(flooredActivePoints.T,
+                                           self.cellDimensions)
+    self.activeCells = np.unique(self.pointCells)
+
+
+  def activateRandomLocation(self):
+    self.points = np.array([np.random.random(2) * self.cellDimensions])
+    self._computeReferenceCells()
+
+
+  def shift(self, deltaLocation):
+    deltaLocationInCellFields = (np.matmul(self.rotationMatrix, deltaLocation) *
+                                 self.cellFieldsPerUnitDistance)
+    np.add(self.points, deltaLocationInCellFields, out=self.points)
+    np.mod(self.points, self.cellDimensions, out=self.points)
+    self._computeReferenceCells()
+
+
+  def anchor(self, anchorInput):
+    if len(anchorInput) == 0:
+      return
+
+    overlaps = self.connections.computeActivity(anchorInput,
+                                                self.connectedPermanence)
+    activeSegments = np.where(overlaps >= self.activationThreshold)[0]
+    sensorySupportedCells = np.unique(
+      self.connections.mapSegmentsToCells(activeSegments))
+
+    inactivated = np.setdiff1d(self.activeCells, sensorySupportedCells)
+    inactivatedIndices = np.in1d(self.pointCells, inactivated).nonzero()[0]
+    if inactivatedIndices.size > 0:
+      self.points = np.delete(self.points, inactivatedIndices, axis=0)
+
+    activated = np.setdiff1d(sensorySupportedCells, self.activeCells)
+    activatedCoordsBase = np.transpose(
+      np.unravel_index(activated, self.cellDimensions)).astype("float")
+    activatedCoords = np.concatenate(
+      [activatedCoordsBase + [iOffset, jOffset]
+       for iOffset in self.pointOffsets
+       for jOffset in self.pointOffsets])
+    if activatedCoords.size > 0:
+      self.points = np.append(self.points, activatedCoords, axis=0)
+
+    self._computeReferenceCells()
+    self.activeSegments = activeSegments
+
+
+
+def createModules(cls, cellDimensions, pointOffsets, seed):
+  rng = random.Random(seed)
+
+  modules = []
+  for i in xrange(9):
+    scale = 10.0 * (math.sqrt(2) ** i)
+
+    for _ in xrange(2):
+      orientation = rng.gauss(7.5, 7.5) * math.pi / 180.0
+      orientation = rng.choice([orientation, -orientation])
+
+      modules.append(cls(cellDimensions=cellDimensions,
+                         moduleMapDimensions=(scale, scale),
+                         orientation=orientation,
+                         pointOffsets=pointOffsets,
+                         anchorInputSize=ANCHOR_INPUT_SIZE))
+
+  return modules
+
+
+
+def move(modules, prevLocation, location):
+  if prevLocation is not None:
+    deltaLocation = (location[0] - prevLocation[0],
+                     location[1] - prevLocation[1])
+    for module in modules:
+      module.shift(deltaLocation)
+
+
+
+def getObjects():
+  """
+  @return (dict)
+  The features of each object, keyed by their location in cm.
+  """
+  return dict(
+    (objectName, dict(((location[0] * CM_PER_UNIT,
+                        location[1] * CM_PER_UNIT), featureName)
+                      for location, featureName in objectDict.iteritems()))
+    for objectName, objectDict in DISCRETE_OBJECTS.iteritems())
+
+
+
+def learnObjects(modules, objects, anchorInputs, seed):
+  np.random.seed(seed)
+
+  for objectName, objectDict in sorted(objects.iteritems()):
+    for module in modules:
+      module.reset()
+      module.activateRandomLocation()
+
+    prevLocation = None
+    for location in sorted(objectDict.iterkeys()):
+      move(modules, prevLocation, location)
+      prevLocation = location
+
+      for _ in xrange(10):
+        for module in modules:
+          module.learn(anchorInputs[(objectName, location)])
+
+
+
+def inferObjects(modules, objects, anchorInputs, anchorInputsByFeature, seed):
+  """
+  @return (tuple)
+  The time spent in shift(), the time spent in anchor(), and the number of
+  calls to each.
+  """
+  rng = random.Random(seed)
+
+  shiftTime = 0.0
+  anchorTime = 0.0
+  numShifts = 0
+  numAnchors = 0
+
+  for objectName, objectDict in sorted(objects.iteritems()):
+    for module in modules:
+      module.reset()
+
+    prevLocation = None
+    for _ in xrange(4):
+      touchSequence = sorted(objectDict.iterkeys())
+      rng.shuffle(touchSequence)
+
+      for i, location in enumerate(touchSequence):
+        if prevLocation is not None:
+          start = time.time()
+          move(modules, prevLocation, location)
+          shiftTime += time.time() - start
+          numShifts += 1
+        prevLocation = location
+
+        if i == 0:
+          anchorInput = anchorInputsByFeature[objectDict[location]]
+        else:
+          anchorInput = anchorInputs[(objectName, location)]
+
+        start = time.time()
+        for module in modules:
+          module.anchor(anchorInput)
+        anchorTime += time.time() - start
+        numAnchors += 1
+
+  return shiftTime, anchorTime, numShifts, numAnchors
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--cellDimensions", type=int, nargs=2, default=[10, 10])
+  parser.add_argument("--pointOffsets", type=float, nargs="+",
+                      default=[0.05, 0.5, 0.95])
+  parser.add_argument("--anchorInputBits", type=int, default=15)
+  parser.add_argument("--repeats", type=int, default=10)
+  args = parser.parse_args()
+
+  rng = np.random.RandomState(42)
+  objects = getObjects()
+
+  anchorInputs = {}
+  anchorInputsByFeature = {}
+  for objectName, objectDict in sorted(objects.iteritems()):
+    for location, featureName in sorted(objectDict.iteritems()):
+      sdr = np.sort(rng.choice(ANCHOR_INPUT_SIZE, args.anchorInputBits,
+                               replace=False)).astype("uint32")
+      anchorInputs[(objectName, location)] = sdr
+      anchorInputsByFeature[featureName] = np.union1d(
+        anchorInputsByFeature.get(featureName, np.empty(0, dtype="uint32")),
+        sdr)
+
+  rows = []
+  for name, cls in (("reallocated", ReallocatingLocationModule2D),
+                    ("preallocated buffer", SuperficialLocationModule2D)):
+    modules = createModules(cls, args.cellDimensions, args.pointOffsets,
+                            seed=42)
+    learnObjects(modules, objects, anchorInputs, seed=42)
+
+    totals = np.zeros(4)
+    for iRepeat in xrange(args.repeats):
+      totals += inferObjects(modules, objects, anchorInputs,
+                             anchorInputsByFeature, seed=iRepeat)
+    shiftTime, anchorTime, numShifts, numAnchors = totals
+
+    rows.append([name,
+                 shiftTime / numShifts * 1000,
+                 anchorTime / numAnchors * 1000])
+
+  print tabulate(rows,
+                 headers=["active points", "shift ms (18 modules)",
+                          "anchor ms (18 modules)"],
+                 floatfmt=".3f")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare checkpoints with float32 permanences against fixed-point uint16 and
+uint8 permanences, for an ApicalTiebreakSequenceMemory and a ColumnPooler:
+size of the permanence arrays, total checkpoint size, load time and inference
+throughput on the memory-mapped checkpoint.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakSequenceMemory)
+from htmresearch.algorithms.column_pooler import ColumnPooler
+
+DTYPES = ("float32", "uint16", "uint8")
+
+
+
+def directorySize(directory, suffix=""):
+  return sum(os.path.getsize(os.path.join(directory, filename))
+             for filename in os.listdir(directory)
+             if filename.endswith(suffix))
+
+
+
+def benchmark(model, loadCheckpoint, infer, directory):
+  rows = []
+  for permanenceDtype in DTYPES:
+    path = os.path.join(directory, permanenceDtype)
+    model.saveCheckpoint(path, permanenceDtype)
+
+    start = time.time()
+    loaded = loadCheckpoint(path)
+    loadTime = time.time() - start
+
+    steps, elapsed = infer(loaded)
+
+    rows.append([permanenceDtype,
+                 directorySize(path, ".permanences.npy") / 1024.0**2,
+                 directorySize(path) / 1024.0**2,
+                 loadTime * 1000,
+                 steps / elapsed])
+  return rows
+
+
+
+def inferSequences(tm, sequences):
+  start = time.time()
+  for sequence in sequences:
+    for activeColumns in sequence:
+      tm.compute(activeColumns, learn=False)
+    tm.reset()
+  return sum(len(sequence) for sequence in sequences), time.time() - start
+
+
+
+def inferObjects(pooler, objects):
+  start = time.time()
+  for obj in objects:
+    for feedforwardInput, lateralInput in obj:
+      pooler.compute(feedforwardInput, (lateralInput,), learn=False)
+    pooler.reset()
+  return sum(len(obj) for obj in objects), time.time() - start
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--columnCount", type=int, default=2048)
+  parser.add_argument("--cellsPerColumn", type=int, default=32)
+  parser.add_argument("--numSequences", type=int, default=50)
+  parser.add_argument("--sequenceLength", type=int, default=20)
+  parser.add_argument("--numObjects", type=int, default=100)
+  parser.add_argument("--numFeatures", type=int, default=10)
+  args = parser.parse_args()
+
+  rng = np.random.RandomState(42)
+  directory = tempfile.mkdtemp()
+  headers = ["permanences", "permanence MB", "checkpoint MB", "load ms",
+             "steps/s"]
+
+  try:
+    sequences = [[np.sort(rng.choice(args.columnCount, 40, replace=False))
+                  .astype("uint32")
+                  for _ in xrange(args.sequenceLength)]
+                 for _ in xrange(args.numSequences)]
+    tm = ApicalTiebreakSequenceMemory(columnCount=args.columnCount,
+                                      cellsPerColumn=args.cellsPerColumn)
+    for _ in xrange(3):
+      for sequence in sequences:
+        for activeColumns in sequence:
+          tm.compute(activeColumns, learn=True)
+        tm.reset()
+
+    print "ApicalTiebreakSequenceMemory"
+    print tabulate(benchmark(tm, tm.loadCheckpoint,
+                             lambda loaded: inferSequences(loaded, sequences),
+                             os.path.join(directory, "tm")),
+                   headers=headers, floatfmt=".2f")
+    print
+
+    objects = [[(np.sort(rng.choice(2048*8, 40, replace=False))
+                 .astype("uint32"),
+                 np.sort(rng.choice(4096, 40, replace=False)).astype("uint32"))
+                for _ in xrange(args.numFeatures)]
+               for _ in xrange(args.numObjects)]
+    pooler = ColumnPooler(inputWidth=2048*8, lateralInputWidths=(4096,))
+    for obj in objects:
+      for feedforwardInput, lateralInput in obj:
+        pooler.compute(feedforwardInput, (lateralInput,), learn=True)
+      pooler.reset()
+
+    print "ColumnPooler"
+    print tabulate(benchmark(pooler, pooler.loadCheckpoint,
+                             lambda loaded: inferObjects(loaded, objects),
+                             os.path.join(directory, "pooler")),
+                   headers=headers, floatfmt=".2f")
+  finally:
+    shutil.rmtree(directory)
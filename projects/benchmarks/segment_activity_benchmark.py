@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare computeSegmentActivity against two computeActivity passes, one for
+connected and one for potential synapses. Then compare looking up a number of
+candidate rows against a second full pass, to check MAX_ROW_LOOKUPS. The
+workload is a basal SparseMatrixConnections with random segments, fed random
+sparse inputs.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from nupic.bindings.math import Random, SparseMatrixConnections
+
+from htmresearch.support import segment_activity
+
+
+
+CONNECTED_PERMANENCE = 0.5
+
+
+
+def createConnections(rng, cellCount, segmentCount, synapsesPerSegment,
+                      sampleSize, numPools):
+  connections = SparseMatrixConnections(cellCount, cellCount)
+  segments = connections.createSegments(
+    rng.randint(0, cellCount, segmentCount).astype("uint32"))
+
+  # Each segment samples its synapses from one of numPools small pools, so
+  # that about segmentCount / numPools segments match any given input. The
+  # bindings ignore the strides of a sliced array, so pass a contiguous copy.
+  pools = [np.sort(rng.choice(cellCount, sampleSize, replace=False))
+           .astype("uint32") for _ in xrange(numPools)]
+  for i, pool in enumerate(pools):
+    connections.growSynapsesToSample(segments[i::len(pools)].copy(), pool,
+                                     synapsesPerSegment, 0.45, Random(i))
+  connections.adjustSynapses(segments, np.arange(0, cellCount, 2,
+                                                 dtype="uint32"),
+                             0.1, 0.0)
+
+  return connections, pools
+
+
+
+def timeCalls(fn, inputs):
+  start = time.time()
+  for activeInput in inputs:
+    fn(activeInput)
+  return (time.time() - start) / len(inputs)
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--cellCount", type=int, default=2048*32)
+  parser.add_argument("--segmentCount", type=int, default=100000)
+  parser.add_argument("--synapsesPerSegment", type=int, default=20)
+  parser.add_argument("--activationThreshold", type=int, default=13)
+  parser.add_argument("--numPools", type=int, default=1000)
+  parser.add_argument("--numInputs", type=int, default=50)
+  args = parser.parse_args()
+
+  rng = np.random.RandomState(42)
+  connections, pools = createConnections(rng, args.cellCount,
+                                         args.segmentCount,
+                                         args.synapsesPerSegment, 40,
+                                         args.numPools)
+  inputs = [np.union1d(pools[rng.randint(len(pools))],
+                       rng.choice(args.cellCount, 40, replace=False))
+            .astype("uint32")
+            for _ in xrange(args.numInputs)]
+
+  def twoPasses(activeInput):
+    return (connections.computeActivity(activeInput, CONNECTED_PERMANENCE),
+            connections.computeActivity(activeInput))
+
+  def onePass(activeInput):
+    return segment_activity.computeSegmentActivity(
+      connections, activeInput, CONNECTED_PERMANENCE,
+      args.activationThreshold)
+
+  twoPassTime = timeCalls(twoPasses, inputs)
+  onePassTime = timeCalls(onePass, inputs)
+  print tabulate([["two computeActivity passes", twoPassTime * 1000, 1.0],
+                  ["computeSegmentActivity", onePassTime * 1000,
+                   twoPassTime / onePassTime]],
+                 headers=["method", "ms/call", "speedup"], floatfmt=".2f")
+  print
+
+  # A second full pass costs the same however many segments match. Looking up
+  # rows costs more the more candidates there are.
+  fullPassTime = timeCalls(
+    lambda activeInput: connections.computeActivity(activeInput,
+                                                    CONNECTED_PERMANENCE),
+    inputs)
+  rows = []
+  for candidateCount in (16, 64, 128, 256, 512, 1024, 2048):
+    candidates = np.sort(rng.choice(args.segmentCount, candidateCount,
+                                    replace=False)).astype("uint32")
+    lookupTime = timeCalls(
+      lambda activeInput: segment_activity._countCandidateSynapses(
+        connections, activeInput, CONNECTED_PERMANENCE, candidates),
+      inputs)
+    rows.append([candidateCount, lookupTime * 1000, fullPassTime * 1000,
+                 "row lookups" if lookupTime < fullPassTime else "full pass"])
+
+  print tabulate(rows,
+                 headers=["candidates", "row lookups ms", "full pass ms",
+                          "faster"],
+                 floatfmt=".2f")
+  print "MAX_ROW_LOOKUPS = %d" % segment_activity.MAX_ROW_LOOKUPS
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare the sort-based setCompare / argmaxMulti with BitmapSetOperations on
+inputs shaped like the ones the temporal memory sees each timestep.
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+from tabulate import tabulate
+
+from htmresearch.support import numpy_helpers as np2
+
+
+
+def timeCall(fn, repeat):
+  return min(timeit.repeat(fn, number=repeat, repeat=3)) / repeat * 1e6
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--columnCount", type=int, default=2048)
+  parser.add_argument("--cellsPerColumn", type=int, default=32)
+  parser.add_argument("--repeat", type=int, default=2000)
+  args = parser.parse_args()
+
+  cellCount = args.columnCount * args.cellsPerColumn
+  rng = np.random.RandomState(42)
+  sortOps = np2.SortSetOperations()
+  bitmapOps = np2.BitmapSetOperations(cellCount)
+
+  rows = []
+  for activeColumnCount in (40, 200, 1000):
+    activeColumns = np.sort(rng.choice(args.columnCount, activeColumnCount,
+                                       replace=False)).astype("uint32")
+    predictedCells = np.sort(
+      rng.choice(cellCount, activeColumnCount, replace=False)).astype("uint32")
+    predictedColumns = predictedCells / args.cellsPerColumn
+
+    segmentCells = rng.randint(0, cellCount,
+                               activeColumnCount * 4).astype("uint32")
+    overlaps = rng.randint(0, 20, len(segmentCells)).astype("int32")
+
+    for name, ops in (("sort", sortOps), ("bitmap", bitmapOps)):
+      setCompareTime = timeCall(
+        lambda: ops.setCompare(predictedCells, activeColumns, predictedColumns,
+                               rightMinusLeft=True),
+        args.repeat)
+      argmaxTime = timeCall(lambda: ops.argmaxMulti(overlaps, segmentCells),
+                            args.repeat)
+      rows.append([activeColumnCount, name, setCompareTime, argmaxTime])
+
+  print tabulate(rows, headers=["active columns", "implementation",
+                                "setCompare (us)", "argmaxMulti (us)"],
+                 floatfmt=".1f")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+"""
+Compare ImageSparseNet.encode with its cached Gram matrix and in-place LCA
+loop, in float64 and float32, against recomputing the Gram matrix and
+allocating new arrays on every LCA iteration. The workload is encoding
+batches of random patches from a set of synthetic images.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+from htmresearch.algorithms.image_sparse_net import ImageSparseNet
+
+
+
+class OriginalEncodeImageSparseNet(ImageSparseNet):
+  """
+  Recomputes the Gram matrix on every call and allocates new arrays on every
+  LCA iteration.
+  """
+
+  def encode(self, data, flatten=False):
+    projection = self.basis.T.dot(data)
+    representation = self.basis.T.dot(self.basis) - np.eye(self.outputDim)
+    states = np.zeros((self.outputDim, data.shape[1]))
+
+    threshold = 0.5 * np.max(np.abs(projection), axis=0)
+    activations = self._thresholdNonLinearity(states, threshold)
+
+    for _ in xrange(self.numLcaIterations):
+      states *= (1 - self.lcaLearningRate)
+      states += self.lcaLearningRate * (projection -
+                                        representation.dot(activations))
+      activations = self._thresholdNonLinearity(states, threshold)
+
+      threshold *= self.thresholdDecay
+      threshold[threshold < self.minThreshold] = self.minThreshold
+
+    return activations
+
+
+
+def timeEncoding(net, batches):
+  start = time.time()
+  activations = [net.encode(batch) for batch in batches]
+  return time.time() - start, activations
+
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--filterDim", type=int, default=64)
+  parser.add_argument("--outputDim", type=int, default=128)
+  parser.add_argument("--batchSize", type=int, default=100)
+  parser.add_argument("--numBatches", type=int, default=200)
+  args = parser.parse_args()
+
+  rng = np.random.RandomState(42)
+  images = rng.randn(128, 128, 10)
+
+  params = dict(filterDim=args.filterDim,
+                outputDim=args.outputDim,
+                batchSize=args.batchSize)
+  nets = [
+    ("original", OriginalEncodeImageSparseNet(**params)),
+    ("float64", ImageSparseNet(**params)),
+    ("float32", ImageSparseNet(dtype="float32", **params)),
+  ]
+
+  # Use one basis and one sequence of batches for every network
+  basis = nets[0][1].basis
+  np.random.seed(42)
+  nets[0][1]._initializeDimensions(images)
+  batches = [nets[0][1]._getDataBatch(images)
+             for _ in xrange(args.numBatches)]
+
+  rows = []
+  for name, net in nets:
+    net.basis = basis.copy()
+    elapsed, activations = timeEncoding(net, batches)
+    if name == "original":
+      originalElapsed, originalActivations = elapsed, activations
+
+    maxDifference = max(np.max(np.abs(a - b))
+                        for a, b in zip(activations, originalActivations))
+    rows.append([name, args.numBatches / elapsed, originalElapsed / elapsed,
+                 maxDifference])
+
+  print tabulate(rows,
+                 headers=["mode", "batches/s", "speedup", "max difference"],
+                 floatfmt=".3g")
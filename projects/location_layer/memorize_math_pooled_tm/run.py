@@ -230,6 +230,7 @@ class PoolOfPairsLocation1DExperiment(object):
             [iCellAbsolute])
           self.pairLayer.basalConnections.growSynapses(
             segments, self.contextOperandSDRs[context], 1.0)
+          self.pairLayer.basalSegmentCounts[iCellAbsolute] += 1
 
     # Associate the pair layer's minicolumn SDRs with offset cell SDRs,
     # and associate the pooling layer's location SDRs with a pool of pair SDRs.
@@ -32,8 +32,8 @@ import numpy as np
 from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
   ApicalTiebreakPairMemory)
 from htmresearch.algorithms.location_modules import (
-  BodyToSpecificObjectModule2D, SensorToBodyModule2D,
-  SensorToSpecificObjectModule)
+  BodyToSpecificObjectModule2D, ImplicitBodyToSpecificObjectModule2D,
+  SensorToBodyModule2D, SensorToSpecificObjectModule)
 from htmresearch.algorithms.column_pooler import ColumnPooler
 from htmresearch.frameworks.layers.sensor_placement import greedySensorPositions
 
@@ -88,10 +88,15 @@ class CorticalColumn(object):
 class MultiColumn2DExperiment(object):
   """
   The experiment code organized into a class.
+
+  With implicitMetricConnections, the body and sensor location modules compute
+  their fixed metric connections rather than storing them as synapses, so
+  large modules fit in memory. Synapse tracing needs the stored synapses.
   """
 
   def __init__(self, objects, objectPlacements, featureNames, locationConfigs,
-               numCorticalColumns, worldDimensions):
+               numCorticalColumns, worldDimensions,
+               implicitMetricConnections=False):
 
     self.objects = objects
     self.objectPlacements = objectPlacements
@@ -140,7 +145,10 @@ class MultiColumn2DExperiment(object):
 
     self.bodyToSpecificObjectModules = []
     for iModule, config in enumerate(locationConfigs):
-      module = BodyToSpecificObjectModule2D(config["cellDimensions"])
+      if implicitMetricConnections:
+        module = ImplicitBodyToSpecificObjectModule2D(config["cellDimensions"])
+      else:
+        module = BodyToSpecificObjectModule2D(config["cellDimensions"])
       pairedSensorModules = [c.sensorToSpecificObjectModules[iModule]
                              for c in self.corticalColumns]
       module.formReciprocalSynapses(pairedSensorModules)
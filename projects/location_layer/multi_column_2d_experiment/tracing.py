@@ -143,23 +143,23 @@ class MultiColumn2DExperimentVisualizer(MultiColumn2DExperimentMonitor):
              {
                "{} sensorToBody".format(iCol):
                _getActiveSynapsesOnActiveSegments(
-                 module.metricConnections.connectionsBySource[
-                   "sensorToBody"],
+                 module.metricConnections,
                  activeCells,
                  module.activeMetricSegments,
                  params["sensorToBody"],
                  module.connectedPermanence,
-                 offset=iModule * module.cellCount),
+                 offset=iModule * module.cellCount,
+                 source="sensorToBody"),
 
                "bodyToSpecificObject":
                _getActiveSynapsesOnActiveSegments(
-                 module.metricConnections.connectionsBySource[
-                   "bodyToSpecificObject"],
+                 module.metricConnections,
                  activeCells,
                  module.activeMetricSegments,
                  params["bodyToSpecificObject"],
                  module.connectedPermanence,
-                 offset=iModule * module.cellCount),
+                 offset=iModule * module.cellCount,
+                 source="bodyToSpecificObject"),
              }])
         else:
           cellsByModule.append([activeCells.tolist()])
@@ -244,22 +244,24 @@ class MultiColumn2DExperimentVisualizer(MultiColumn2DExperimentMonitor):
           synapsesForActiveCellsBySourceLayer[
             "{} sensorToBody".format(iPresynapticCol)] = (
               _getActiveSynapsesOnActiveSegments(
-                metricConnections.connectionsBySource["sensorToBody"],
+                metricConnections,
                 activeCells,
                 module.activeSegmentsByColumn[iPresynapticCol],
                 params["sensorToBodyByColumn"][iPresynapticCol],
                 module.connectedPermanence,
-                offset=iModule * module.cellCount))
+                offset=iModule * module.cellCount,
+                source="sensorToBody"))
 
           synapsesForActiveCellsBySourceLayer[
             "{} sensorToSpecificObject".format(iPresynapticCol)] = (
               _getActiveSynapsesOnActiveSegments(
-                metricConnections.connectionsBySource["sensorToSpecificObject"],
+                metricConnections,
                 activeCells,
                 module.activeSegmentsByColumn[iPresynapticCol],
                 params["sensorToSpecificObjectByColumn"][iPresynapticCol],
                 module.connectedPermanence,
-                offset=iModule * module.cellCount))
+                offset=iModule * module.cellCount,
+                source="sensorToSpecificObject"))
 
         cellsByModule.append(
           [activeCells.tolist(), synapsesForActiveCellsBySourceLayer])
@@ -344,20 +346,20 @@ class MultiColumn2DExperimentVisualizer(MultiColumn2DExperimentMonitor):
 
           for iPresynapticCol in xrange(self.exp.numCorticalColumns):
             if iPresynapticCol == iCol:
-              synapsesOnSegment = _getActiveSynapses(
-                c.objectLayer.internalDistalPermanences,
-                cell, prevActiveCells,
-                c.objectLayer.connectedPermanenceDistal)
+              source = 0
+              activeInput = prevActiveCells
             else:
               if iPresynapticCol < iCol:
                 matrixIndex = iPresynapticCol
               else:
                 matrixIndex = iPresynapticCol - 1
 
-              synapsesOnSegment = _getActiveSynapses(
-                c.objectLayer.distalPermanences[matrixIndex],
-                cell, params["lateralInputs"][matrixIndex],
-                c.objectLayer.connectedPermanenceDistal)
+              source = matrixIndex + 1
+              activeInput = params["lateralInputs"][matrixIndex]
+
+            synapsesOnSegment = _getActiveSynapsesOnRow(
+              c.objectLayer.getDistalSegmentPermanences(cell, source),
+              activeInput, c.objectLayer.connectedPermanenceDistal)
 
             objectSynapsesForActiveCellsBySourceColumn[iPresynapticCol].append(
               synapsesOnSegment)
@@ -395,15 +397,23 @@ class MultiColumn2DExperimentVisualizer(MultiColumn2DExperimentMonitor):
 
 
 def _getActiveSynapsesOnActiveSegments(connections, cells, activeSegments,
-                                       activeInput, connectedPermanence, offset=0):
+                                       activeInput, connectedPermanence, offset=0,
+                                       source=None):
+  """
+  If source is specified, connections is a Multiconnections, and only the
+  synapses to that source are included.
+  """
   synapsesForCellDict = defaultdict(list)
 
   segments = connections.filterSegmentsByCell(activeSegments, cells)
   cellForSegment = connections.mapSegmentsToCells(segments)
 
   for i, segment in enumerate(segments):
-    connectedSynapses = np.where(
-      connections.matrix.getRow(segment) >= connectedPermanence)[0]
+    if source is None:
+      permanences = connections.matrix.getRow(segment)
+    else:
+      permanences = connections.getSegmentPermanences(segment, source)
+    connectedSynapses = np.where(permanences >= connectedPermanence)[0]
 
     activeSynapses = np.intersect1d(connectedSynapses, activeInput,
                                     assume_unique=True)
@@ -417,7 +427,12 @@ def _getActiveSynapsesOnActiveSegments(connections, cells, activeSegments,
 
 
 def _getActiveSynapses(matrix, cell, activeInput, connectedPermanence):
-  connectedSynapses = np.where(matrix.getRow(cell) >= connectedPermanence)[0]
+  return _getActiveSynapsesOnRow(matrix.getRow(cell), activeInput,
+                                 connectedPermanence)
+
+
+def _getActiveSynapsesOnRow(permanences, activeInput, connectedPermanence):
+  connectedSynapses = np.where(permanences >= connectedPermanence)[0]
 
   activeSynapses = np.intersect1d(connectedSynapses, activeInput,
                                   assume_unique=True)
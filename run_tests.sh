@@ -1,3 +1,3 @@
 #!/usr/bin/env bash
-py.test -n 6 tests/frameworks/layers/ tests/regions/ tests/algorithms/
+py.test -n 6 tests/frameworks/layers/ tests/regions/ tests/algorithms/ tests/support/
 
@@ -0,0 +1,80 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that an ApicalDependentTemporalMemory behaves the same after a round trip
+through a checkpoint.
+"""
+
+import shutil
+import tempfile
+import unittest
+
+from htmresearch.algorithms.apical_dependent_temporal_memory import (
+  ApicalDependentSequenceMemory, ApicalDependentTemporalMemory)
+from htmresearch.support.shared_tests.equivalence_test_base import (
+  EquivalenceTestBase)
+
+
+
+class ApicalDependentCheckpointTest(EquivalenceTestBase, unittest.TestCase):
+
+  cellGetters = ("getActiveCells", "getPredictedCells")
+
+
+  def setUp(self):
+    super(ApicalDependentCheckpointTest, self).setUp()
+    self.directory = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+
+  def testRoundTrip(self):
+    sequence = [self._randomSDR(256, 12) for _ in xrange(10)]
+    apical = [self._randomSDR(200, 12) for _ in xrange(10)]
+
+    tm = ApicalDependentSequenceMemory(columnCount=256,
+                                       cellsPerColumn=8,
+                                       apicalInputSize=200,
+                                       activationThreshold=8,
+                                       reducedBasalThreshold=8,
+                                       minThreshold=6,
+                                       sampleSize=12)
+    self._train([tm], zip(sequence, apical))
+
+    tm.saveCheckpoint(self.directory)
+    mapped = ApicalDependentTemporalMemory.loadCheckpoint(self.directory)
+    copied = ApicalDependentTemporalMemory.loadCheckpoint(self.directory,
+                                                          mmap=False)
+
+    self._assertSameBehavior(tm, [mapped, copied], zip(sequence, apical),
+                             learn=False)
+
+    with self.assertRaises(ValueError):
+      mapped.compute(sequence[0], apical[0], learn=True)
+      mapped.compute(sequence[1], apical[1], learn=True)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
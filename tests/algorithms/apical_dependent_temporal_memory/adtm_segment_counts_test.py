@@ -0,0 +1,64 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that the ApicalDependentTemporalMemory's per-cell segment counts stay in
+sync with its basal and apical connections.
+"""
+
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.apical_dependent_temporal_memory import (
+  ApicalDependentSequenceMemory)
+
+
+
+class ApicalDependentSegmentCountsTest(unittest.TestCase):
+
+  def testCountsInSync(self):
+    rng = np.random.RandomState(42)
+    tm = ApicalDependentSequenceMemory(columnCount=256,
+                                       cellsPerColumn=4,
+                                       apicalInputSize=200,
+                                       activationThreshold=8,
+                                       reducedBasalThreshold=8,
+                                       minThreshold=6,
+                                       sampleSize=12)
+
+    sequence = [np.sort(rng.choice(256, 40, replace=False)).astype("uint32")
+                for _ in xrange(5)]
+    for step in xrange(100):
+      tm.compute(sequence[step % len(sequence)],
+                 np.sort(rng.choice(200, 12, replace=False)).astype("uint32"),
+                 learn=True)
+
+    cells = np.arange(tm.numberOfCells(), dtype="uint32")
+    self.assertGreater(tm.basalConnections.nSegments(), 0)
+    np.testing.assert_equal(tm.segmentCounts,
+                            tm.basalConnections.getSegmentCounts(cells) +
+                            tm.apicalConnections.getSegmentCounts(cells))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
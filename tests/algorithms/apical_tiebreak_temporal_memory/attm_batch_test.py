@@ -0,0 +1,127 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that ApicalTiebreakSequenceMemoryBatch matches separate
+ApicalTiebreakSequenceMemory instances.
+"""
+
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakSequenceMemory)
+from htmresearch.algorithms.apical_tiebreak_temporal_memory_batch import (
+  ApicalTiebreakSequenceMemoryBatch)
+
+
+PARAMS = {
+  "columnCount": 128,
+  "cellsPerColumn": 4,
+  "activationThreshold": 5,
+  "reducedBasalThreshold": 4,
+  "minThreshold": 4,
+  "sampleSize": 8,
+  "initialPermanence": 0.5,
+  "connectedPermanence": 0.5,
+  "basalPredictedSegmentDecrement": 0.02,
+  "apicalPredictedSegmentDecrement": 0.02,
+}
+
+
+class ApicalTiebreakSequenceMemoryBatchTest(unittest.TestCase):
+
+  def _runStreams(self, streamCount, apicalInputSize, numSteps,
+                  **extraParams):
+    params = dict(PARAMS, **extraParams)
+    seeds = range(42, 42 + streamCount)
+
+    batch = ApicalTiebreakSequenceMemoryBatch(
+      streamCount=streamCount, apicalInputSize=apicalInputSize, seed=seeds,
+      **params)
+    singles = [ApicalTiebreakSequenceMemory(apicalInputSize=apicalInputSize,
+                                            seed=seed, **params)
+               for seed in seeds]
+
+    rng = np.random.RandomState(1)
+
+    # Every stream loops over its own short sequence, so predictions form.
+    sequences = [[np.sort(rng.choice(PARAMS["columnCount"], 8, replace=False))
+                  for _ in xrange(4)]
+                 for _ in xrange(streamCount)]
+
+    for step in xrange(numSteps):
+      activeColumnsByStream = [sequence[step % len(sequence)]
+                               for sequence in sequences]
+      if apicalInputSize > 0:
+        apicalInputByStream = [
+          np.sort(rng.choice(apicalInputSize, 6, replace=False))
+          for _ in xrange(streamCount)]
+      else:
+        apicalInputByStream = [np.empty(0, dtype="uint32")] * streamCount
+
+      # Some streams see an empty timestep now and then.
+      if step % 7 == 3:
+        activeColumnsByStream[step % streamCount] = np.empty(0, dtype="uint32")
+
+      batch.computeByStream(activeColumnsByStream, apicalInputByStream,
+                            learn=(step < numSteps - 10))
+      for tm, activeColumns, apicalInput in zip(singles, activeColumnsByStream,
+                                                apicalInputByStream):
+        tm.compute(activeColumns, apicalInput, learn=(step < numSteps - 10))
+
+      for results, getter in (
+          (batch.getActiveCellsByStream(), "getActiveCells"),
+          (batch.getWinnerCellsByStream(), "getWinnerCells"),
+          (batch.getPredictedCellsByStream(), "getPredictedCells"),
+          (batch.getNextPredictedCellsByStream(), "getNextPredictedCells"),
+          (batch.getPredictedActiveCellsByStream(),
+           "getPredictedActiveCells")):
+        for streamResult, tm in zip(results, singles):
+          np.testing.assert_equal(streamResult, getattr(tm, getter)())
+
+      if step % 20 == 19:
+        batch.reset()
+        for tm in singles:
+          tm.reset()
+
+
+  def testMatchesSeparateInstances(self):
+    self._runStreams(streamCount=5, apicalInputSize=0, numSteps=60)
+
+
+  def testMatchesSeparateInstancesWithApicalInput(self):
+    self._runStreams(streamCount=5, apicalInputSize=64, numSteps=60)
+
+
+  def testMatchesSeparateInstancesWithMaxSynapses(self):
+    self._runStreams(streamCount=3, apicalInputSize=32, numSteps=40,
+                     maxSynapsesPerSegment=10)
+
+
+  def testSingleStream(self):
+    self._runStreams(streamCount=1, apicalInputSize=16, numSteps=30)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,189 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that an ApicalTiebreakTemporalMemory behaves the same after a round trip
+through a checkpoint.
+"""
+
+import cPickle as pickle
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakSequenceMemory, ApicalTiebreakTemporalMemory)
+from htmresearch.support.connections_checkpoint import CheckpointConnections
+from htmresearch.support.shared_tests.equivalence_test_base import (
+  EquivalenceTestBase)
+
+
+
+class ApicalTiebreakCheckpointTest(EquivalenceTestBase, unittest.TestCase):
+
+  cellGetters = ("getActiveCells", "getWinnerCells", "getPredictedCells",
+                 "getNextPredictedCells")
+
+  # Frozen TMs don't select winner cells.
+  frozenCellGetters = ("getActiveCells", "getPredictedCells",
+                       "getNextPredictedCells")
+
+
+  def setUp(self):
+    super(ApicalTiebreakCheckpointTest, self).setUp()
+    self.directory = tempfile.mkdtemp()
+
+    self.sequence = [self._randomSDR(256, 12) for _ in xrange(10)]
+    self.apical = [self._randomSDR(200, 12) for _ in xrange(10)]
+
+    self.tm = ApicalTiebreakSequenceMemory(columnCount=256,
+                                           cellsPerColumn=8,
+                                           apicalInputSize=200,
+                                           activationThreshold=8,
+                                           reducedBasalThreshold=6,
+                                           minThreshold=6,
+                                           sampleSize=12)
+    self._train([self.tm], zip(self.sequence, self.apical))
+
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+
+  def _noisyInputs(self):
+    """
+    The learned sequence, followed by some noise
+    """
+    return zip(self.sequence, self.apical) + [(self._randomSDR(256, 12),
+                                               self._randomSDR(200, 12))
+                                              for _ in xrange(5)]
+
+
+  def testMemoryMappedInference(self):
+    self.tm.saveCheckpoint(self.directory)
+    loaded = ApicalTiebreakTemporalMemory.loadCheckpoint(self.directory)
+
+    self.assertIsInstance(loaded, ApicalTiebreakSequenceMemory)
+    self.assertIsInstance(loaded.basalConnections, CheckpointConnections)
+    self.assertIsInstance(loaded.basalConnections.segments, np.memmap)
+    self.assertEqual(loaded.basalConnections.nSegments(),
+                     self.tm.basalConnections.nSegments())
+
+    self._assertSameBehavior(self.tm, [loaded], self._noisyInputs(),
+                             learn=False)
+
+    with self.assertRaises(ValueError):
+      loaded.compute(self.sequence[0], self.apical[0], learn=True)
+      loaded.compute(self.sequence[1], self.apical[1], learn=True)
+
+
+  def testFrozenMemoryMappedInference(self):
+    self.tm.saveCheckpoint(self.directory)
+    loaded = ApicalTiebreakTemporalMemory.loadCheckpoint(self.directory)
+    loaded.freeze()
+
+    self._assertSameBehavior(self.tm, [loaded], self._noisyInputs(),
+                             learn=False, cellGetters=self.frozenCellGetters)
+
+
+  def testFixedPointPermanences(self):
+    for permanenceDtype in ("uint16", "uint8"):
+      directory = "{}/{}".format(self.directory, permanenceDtype)
+      self.tm.saveCheckpoint(directory, permanenceDtype)
+
+      mapped = ApicalTiebreakTemporalMemory.loadCheckpoint(directory)
+      self.assertEqual(mapped.basalConnections.permanences.dtype,
+                       permanenceDtype)
+      copied = ApicalTiebreakTemporalMemory.loadCheckpoint(directory,
+                                                           mmap=False)
+
+      self._assertSameBehavior(self.tm, [mapped, copied], self._noisyInputs(),
+                               learn=False)
+
+
+  def testLoadedCopyKeepsLearning(self):
+    self.tm.saveCheckpoint(self.directory)
+    loaded = ApicalTiebreakTemporalMemory.loadCheckpoint(self.directory,
+                                                         mmap=False)
+
+    self.assertNotIsInstance(loaded.basalConnections, CheckpointConnections)
+    self._assertSameBehavior(self.tm, [loaded], self._noisyInputs(),
+                             learn=True)
+    self._assertSameBehavior(self.tm, [loaded], self._noisyInputs(),
+                             learn=False)
+
+
+  def testEphemeralsAreNotSaved(self):
+    self.tm.enableInstrumentation()
+    self.tm.enableMatchCounting()
+    self.tm.freeze()
+    for activeColumns, apicalInput in zip(self.sequence, self.apical):
+      self.tm.compute(activeColumns, apicalInput, learn=False)
+    self.tm.saveCheckpoint(self.directory)
+
+    with open(os.path.join(self.directory, "model.pkl"), "rb") as f:
+      state = pickle.load(f)["state"]
+    for name in self.tm._getEphemeralMembers():
+      self.assertIsNone(state[name], name)
+
+    loaded = ApicalTiebreakTemporalMemory.loadCheckpoint(self.directory)
+    self.assertIsNotNone(loaded.setOps)
+    self.assertFalse(loaded.isFrozen())
+    self.assertIsNone(loaded.getInstrumentation())
+    self.assertTrue(loaded.matchCountingEnabled)
+    self.assertEqual(len(loaded.basalSegmentMatchCounts), 0)
+    self.assertEqual(len(loaded.lastBasalInput), 0)
+
+    self.tm.unfreeze()
+    self._assertSameBehavior(self.tm, [loaded], self._noisyInputs(),
+                             learn=False)
+
+
+  def testConnectionsWithoutSegments(self):
+    # Without apical input, no apical segments are grown.
+    tm = ApicalTiebreakSequenceMemory(columnCount=256,
+                                      cellsPerColumn=8,
+                                      apicalInputSize=200,
+                                      activationThreshold=8,
+                                      minThreshold=6,
+                                      sampleSize=12)
+    for activeColumns in self.sequence:
+      tm.compute(activeColumns, learn=True)
+    self.assertEqual(tm.apicalConnections.nSegments(), 0)
+
+    tm.saveCheckpoint(self.directory)
+    loaded = ApicalTiebreakTemporalMemory.loadCheckpoint(self.directory)
+    self.assertEqual(loaded.apicalConnections.nSegments(), 0)
+
+    tm.reset()
+    loaded.reset()
+    self._assertSameBehavior(tm, [loaded], zip(self.sequence, self.apical),
+                             learn=False,
+                             cellGetters=("getActiveCells",
+                                          "getPredictedCells"))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
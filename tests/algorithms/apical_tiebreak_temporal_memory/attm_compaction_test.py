@@ -0,0 +1,221 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that compacting an ApicalTiebreakTemporalMemory's connections destroys
+only dead synapses and segments.
+"""
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakSequenceMemory, ApicalTiebreakTemporalMemory)
+from htmresearch.support.shared_tests.equivalence_test_base import (
+  EquivalenceTestBase)
+
+
+
+class ApicalTiebreakCompactionTest(EquivalenceTestBase, unittest.TestCase):
+
+  cellGetters = ("getActiveCells", "getWinnerCells", "getPredictedCells")
+
+
+  def setUp(self):
+    super(ApicalTiebreakCompactionTest, self).setUp()
+    self.sequence = [self._randomSDR(256, 12) for _ in xrange(10)]
+    self.apical = [self._randomSDR(200, 12) for _ in xrange(10)]
+    self.noise = [self._randomSDR(256, 12) for _ in xrange(5)]
+    self.noiseApical = [self._randomSDR(200, 12) for _ in xrange(5)]
+
+
+  def _trainedTM(self):
+    tm = ApicalTiebreakSequenceMemory(columnCount=256,
+                                      cellsPerColumn=8,
+                                      apicalInputSize=200,
+                                      activationThreshold=8,
+                                      reducedBasalThreshold=6,
+                                      minThreshold=6,
+                                      sampleSize=12,
+                                      basalPredictedSegmentDecrement=0.02)
+    self._train([tm], zip(self.sequence, self.apical))
+
+    # Seen only once, so these synapses are still at the initial permanence.
+    self._train([tm], zip(self.noise, self.noiseApical), numRepetitions=1)
+
+    return tm
+
+
+  def testLosslessCompactionPreservesBehavior(self):
+    tm = self._trainedTM()
+    compacted = self._trainedTM()
+
+    report = compacted.compactConnections(minSynapses=0)
+    self.assertEqual(report["segmentsRemoved"], 0)
+    self.assertEqual(compacted.basalConnections.nSegments(),
+                     tm.basalConnections.nSegments())
+
+    inputs = zip(self.sequence, self.apical)
+    self._assertSameBehavior(tm, [compacted], inputs, learn=False)
+    self._assertSameBehavior(tm, [compacted], inputs, learn=True)
+
+
+  def testWeakSynapsesAndSegmentsAreRemoved(self):
+    tm = self._trainedTM()
+
+    segmentsBefore = (tm.basalConnections.nSegments() +
+                      tm.apicalConnections.nSegments())
+    synapsesBefore = (tm.basalConnections.matrix.nNonZeros() +
+                      tm.apicalConnections.matrix.nNonZeros())
+
+    report = tm.compactConnections(minSynapses=10, minPermanence=0.25)
+
+    segmentsAfter = (tm.basalConnections.nSegments() +
+                     tm.apicalConnections.nSegments())
+    synapsesAfter = (tm.basalConnections.matrix.nNonZeros() +
+                     tm.apicalConnections.matrix.nNonZeros())
+
+    self.assertGreater(report["synapsesRemoved"], 0)
+    self.assertEqual(report["segmentsRemoved"], segmentsBefore - segmentsAfter)
+    self.assertEqual(report["synapsesRemoved"], synapsesBefore - synapsesAfter)
+    self.assertGreater(report["bytesReclaimed"], 0)
+
+    for connections in (tm.basalConnections, tm.apicalConnections):
+      segments = np.arange(connections.nSegments(), dtype="uint32")
+      self.assertTrue(np.all(
+        connections.mapSegmentsToSynapseCounts(segments) >= 10))
+      for segment in segments:
+        _, permanences = connections.matrix.rowNonZeros(segment)
+        self.assertTrue(np.all(permanences > 0.25))
+
+    # Learning continues on the compacted connections.
+    for activeColumns, apicalInput in zip(self.sequence, self.apical):
+      tm.compute(activeColumns, apicalInput, learn=True)
+
+
+  def testInactiveSegmentsAreRemoved(self):
+    tm = self._trainedTM()
+    tm.enableMatchCounting()
+    tm.compactConnections()
+
+    # Only show the first half of the sequence.
+    for activeColumns, apicalInput in zip(self.sequence[:5], self.apical[:5]):
+      tm.compute(activeColumns, apicalInput, learn=False)
+
+    matched = np.count_nonzero(tm.basalSegmentMatchCounts)
+    tm.compactConnections(minRecentActivity=1)
+    self.assertEqual(tm.basalConnections.nSegments(), matched)
+
+
+  def testMatchesAreOnlyCountedWhenNeeded(self):
+    tm = self._trainedTM()
+    self.assertEqual(len(tm.basalSegmentMatchCounts), 0)
+    self.assertRaises(ValueError, tm.compactConnections, minRecentActivity=1)
+
+    tm.enableMatchCounting()
+    for activeColumns, apicalInput in zip(self.sequence, self.apical):
+      tm.compute(activeColumns, apicalInput, learn=False)
+    self.assertGreater(np.count_nonzero(tm.basalSegmentMatchCounts), 0)
+    tm.compactConnections(minRecentActivity=1)
+
+    tm.disableMatchCounting()
+    self.assertRaises(ValueError, tm.compactConnections, minRecentActivity=1)
+
+    # Automatic compaction with a minRecentActivity needs the counts.
+    tm.setCompactionInterval(0, minRecentActivity=1)
+    self.assertTrue(tm.matchCountingEnabled)
+
+
+  def testSegmentsGrownInCompactionStepSurvive(self):
+    tm = self._trainedTM()
+    tm.setCompactionInterval(2, minRecentActivity=1)
+
+    # A new sequence. After a reset nothing is grown on the first step, and
+    # the second step grows a segment on each winner cell then compacts.
+    first = self._randomSDR(256, 12)
+    second = self._randomSDR(256, 12)
+    tm.compute(first, learn=True)
+    previousWinners = tm.getWinnerCells()
+    self.assertIsNone(tm.lastCompactionReport)
+    tm.compute(second, learn=True)
+    self.assertIsNotNone(tm.lastCompactionReport)
+
+    overlaps = tm.basalConnections.computeActivity(previousWinners)
+    self.assertEqual(np.count_nonzero(overlaps >= tm.getSampleSize()),
+                     len(second))
+
+
+  def testPeriodicCompaction(self):
+    tm = self._trainedTM()
+    tm.setCompactionInterval(3, minPermanence=0.25)
+
+    # Inference steps don't count.
+    for activeColumns, apicalInput in zip(self.sequence, self.apical):
+      tm.compute(activeColumns, apicalInput, learn=False)
+    self.assertIsNone(tm.lastCompactionReport)
+    tm.reset()
+
+    for activeColumns, apicalInput in zip(self.sequence[:2], self.apical[:2]):
+      tm.compute(activeColumns, apicalInput, learn=True)
+    self.assertIsNone(tm.lastCompactionReport)
+
+    tm.compute(self.sequence[2], self.apical[2], learn=True)
+    self.assertIsNotNone(tm.lastCompactionReport)
+    self.assertGreater(tm.lastCompactionReport["synapsesRemoved"], 0)
+
+
+  def testFrozenInferenceDoesNotCompact(self):
+    tm = self._trainedTM()
+    tm.setCompactionInterval(3, minPermanence=0.25)
+    tm.freeze()
+    frozenBasalConnections = tm.frozenBasalConnections
+
+    for activeColumns, apicalInput in zip(self.sequence, self.apical):
+      tm.compute(activeColumns, apicalInput, learn=False)
+    self.assertIsNone(tm.lastCompactionReport)
+    self.assertIs(tm.frozenBasalConnections, frozenBasalConnections)
+
+
+  def testReadOnlyCheckpointWithCompaction(self):
+    tm = self._trainedTM()
+    tm.setCompactionInterval(3, minPermanence=0.25)
+
+    directory = tempfile.mkdtemp()
+    try:
+      tm.saveCheckpoint(directory)
+      loaded = ApicalTiebreakTemporalMemory.loadCheckpoint(directory,
+                                                           mmap=True)
+
+      self._assertSameBehavior(tm, [loaded], zip(self.sequence, self.apical),
+                               learn=False, cellGetters=("getActiveCells",))
+      self.assertIsNone(loaded.lastCompactionReport)
+
+      self.assertRaises(ValueError, loaded.compactConnections)
+    finally:
+      shutil.rmtree(directory)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,107 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that a frozen ApicalTiebreakTemporalMemory infers the same cells as an
+unfrozen one with learning disabled.
+"""
+
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakPairMemory, ApicalTiebreakSequenceMemory)
+from htmresearch.support.shared_tests.equivalence_test_base import (
+  EquivalenceTestBase)
+
+
+
+class ApicalTiebreakFrozenTest(EquivalenceTestBase, unittest.TestCase):
+
+  # Frozen TMs don't select winner cells.
+  cellGetters = ("getActiveCells", "getPredictedCells",
+                 "getNextPredictedCells", "getPredictedActiveCells")
+
+
+  def testSequenceMemoryMatchesInference(self):
+    sequence = [self._randomSDR(256, 12) for _ in xrange(10)]
+    apical = [self._randomSDR(200, 12) for _ in xrange(10)]
+
+    # Train two identical instances, then freeze one of them.
+    tm, frozen = [ApicalTiebreakSequenceMemory(columnCount=256,
+                                               cellsPerColumn=8,
+                                               apicalInputSize=200,
+                                               activationThreshold=8,
+                                               reducedBasalThreshold=6,
+                                               minThreshold=6,
+                                               sampleSize=12)
+                  for _ in xrange(2)]
+    self._train([tm, frozen], zip(sequence, apical))
+
+    frozen.freeze()
+    self.assertTrue(frozen.isFrozen())
+
+    # Include some noisy inputs, not just the learned sequence.
+    inputs = zip(sequence, apical) + [(self._randomSDR(256, 12),
+                                       self._randomSDR(200, 12))
+                                      for _ in xrange(5)]
+    self._assertSameBehavior(tm, [frozen], inputs, learn=False)
+
+
+  def testPairMemoryMatchesInference(self):
+    pairs = [(self._randomSDR(128, 10), self._randomSDR(300, 12),
+              self._randomSDR(300, 12))
+             for _ in xrange(8)]
+
+    tm, frozen = [ApicalTiebreakPairMemory(columnCount=128, cellsPerColumn=4,
+                                           basalInputSize=300,
+                                           apicalInputSize=300,
+                                           activationThreshold=8,
+                                           minThreshold=6, sampleSize=12)
+                  for _ in xrange(2)]
+    for instance in (tm, frozen):
+      for _ in xrange(4):
+        for activeColumns, basalInput, apicalInput in pairs:
+          instance.compute(activeColumns, basalInput, apicalInput, learn=True)
+
+    frozen.freeze()
+
+    self._assertSameBehavior(tm, [frozen], pairs, learn=False,
+                             cellGetters=("getActiveCells",
+                                          "getPredictedCells"))
+
+
+  def testLearningWhileFrozenRaises(self):
+    tm = ApicalTiebreakSequenceMemory(columnCount=32, cellsPerColumn=4)
+    tm.freeze()
+
+    with self.assertRaises(ValueError):
+      tm.compute(np.array([1, 2, 3], dtype="uint32"), learn=True)
+
+    tm.unfreeze()
+    self.assertFalse(tm.isFrozen())
+    tm.compute(np.array([1, 2, 3], dtype="uint32"), learn=True)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,106 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check the per-phase instrumentation of ApicalTiebreakTemporalMemory.
+"""
+
+import json
+import unittest
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakSequenceMemory, PHASES)
+from htmresearch.support.shared_tests.equivalence_test_base import (
+  EquivalenceTestBase)
+
+
+
+class ApicalTiebreakInstrumentationTest(EquivalenceTestBase,
+                                        unittest.TestCase):
+
+  cellGetters = ("getActiveCells", "getWinnerCells", "getPredictedCells")
+
+
+  def _createTM(self):
+    return ApicalTiebreakSequenceMemory(columnCount=256,
+                                        cellsPerColumn=8,
+                                        apicalInputSize=200,
+                                        activationThreshold=8,
+                                        minThreshold=6,
+                                        sampleSize=12,
+                                        basalPredictedSegmentDecrement=0.01)
+
+
+  def testMeasurements(self):
+    sequence = [self._randomSDR(256, 12) for _ in xrange(10)]
+    apical = [self._randomSDR(200, 12) for _ in xrange(10)]
+
+    tm = self._createTM()
+    self.assertIsNone(tm.getInstrumentation())
+    tm.enableInstrumentation()
+
+    self._train([tm], zip(sequence, apical), numRepetitions=3)
+
+    measurements = tm.getInstrumentation()
+    self.assertEqual(measurements["steps"], 30)
+    self.assertEqual(set(measurements["phases"].keys()), set(PHASES))
+    for phase in PHASES:
+      self.assertEqual(measurements["phases"][phase]["calls"], 30)
+      self.assertGreaterEqual(measurements["phases"][phase]["seconds"], 0.0)
+
+    touched = measurements["touched"]
+    self.assertGreater(touched["basalSegments"]["total"], 0)
+    self.assertGreater(touched["basalSynapses"]["total"],
+                       touched["basalSegments"]["total"])
+    self.assertGreater(touched["apicalSegments"]["total"], 0)
+    self.assertAlmostEqual(touched["basalSegments"]["perStep"],
+                           touched["basalSegments"]["total"] / 30.0)
+
+    self.assertEqual(json.loads(tm.profiler.toJSON()), measurements)
+
+    # Inference doesn't touch any segments.
+    tm.enableInstrumentation()
+    tm.compute(sequence[0], apical[0], learn=False)
+    measurements = tm.getInstrumentation()
+    self.assertEqual(measurements["steps"], 1)
+    self.assertEqual(measurements["phases"]["segmentGrowth"]["calls"], 0)
+    self.assertEqual(measurements["touched"]["basalSegments"]["lastStep"], 0)
+
+    tm.disableInstrumentation()
+    self.assertIsNone(tm.getInstrumentation())
+
+
+  def testInstrumentationDoesNotChangeResults(self):
+    sequence = [self._randomSDR(256, 12) for _ in xrange(10)]
+
+    tm = self._createTM()
+    instrumented = self._createTM()
+    instrumented.enableInstrumentation()
+
+    for _ in xrange(3):
+      self._assertSameBehavior(tm, [instrumented],
+                               [(activeColumns,) for activeColumns in sequence],
+                               learn=True)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,143 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that the ApicalTiebreakTemporalMemory's per-cell basal segment counts
+stay in sync with its connections, and that choosing the cells with the
+fewest segments from them gives the same cells as counting the segments.
+"""
+
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakSequenceMemory)
+from htmresearch.support import numpy_helpers as np2
+from htmresearch.support.shared_tests.equivalence_test_base import (
+  EquivalenceTestBase)
+
+
+
+class CountingSequenceMemory(ApicalTiebreakSequenceMemory):
+  """
+  Chooses the cells with the fewest segments the original way, by counting
+  the segments of every candidate cell.
+  """
+
+  def _getCellsWithFewestSegments(self, segmentCounts, rng, columns,
+                                  cellsPerColumn):
+    candidateCells = np2.getAllCellsInColumns(columns, cellsPerColumn)
+
+    segmentCounts = np.reshape(
+      self.basalConnections.getSegmentCounts(candidateCells),
+      newshape=(len(columns), cellsPerColumn))
+
+    minSegmentCounts = np.amin(segmentCounts, axis=1, keepdims=True)
+    candidateCells = candidateCells[np.flatnonzero(segmentCounts ==
+                                                   minSegmentCounts)]
+
+    (_,
+     onePerColumnFilter,
+     numCandidatesInColumns) = np.unique(candidateCells // cellsPerColumn,
+                                         return_index=True, return_counts=True)
+
+    offsetPercents = np.empty(len(columns), dtype="float32")
+    rng.initializeReal32Array(offsetPercents)
+
+    np.add(onePerColumnFilter,
+           offsetPercents*numCandidatesInColumns,
+           out=onePerColumnFilter,
+           casting="unsafe")
+
+    return candidateCells[onePerColumnFilter]
+
+
+
+class ApicalTiebreakSegmentCountsTest(EquivalenceTestBase, unittest.TestCase):
+
+  cellGetters = ("getWinnerCells", "getActiveCells")
+
+
+  def _createTM(self, cls):
+    return cls(columnCount=256,
+               cellsPerColumn=4,
+               apicalInputSize=200,
+               activationThreshold=8,
+               reducedBasalThreshold=6,
+               minThreshold=6,
+               sampleSize=12,
+               basalPredictedSegmentDecrement=0.02)
+
+
+  def _assertCountsInSync(self, tm):
+    np.testing.assert_equal(
+      tm.basalSegmentCounts,
+      tm.basalConnections.getSegmentCounts(
+        np.arange(tm.numberOfCells(), dtype="uint32")))
+
+
+  def testSameCellsAsCounting(self):
+    tm = self._createTM(ApicalTiebreakSequenceMemory)
+    counting = self._createTM(CountingSequenceMemory)
+
+    # Mostly unpredictable input, so most columns burst. Repeat a sequence
+    # now and then, so that segments start to match.
+    sequence = [self._randomSDR(256, 40) for _ in xrange(5)]
+    for step in xrange(300):
+      if step % 50 < 25:
+        activeColumns = sequence[step % len(sequence)]
+      else:
+        activeColumns = self._randomSDR(256, 40)
+      apicalInput = self._randomSDR(200, 12)
+
+      self._assertSameBehavior(tm, [counting], [(activeColumns, apicalInput)],
+                               learn=True)
+
+      if step % 20 == 19:
+        tm.reset()
+        counting.reset()
+
+    self._assertCountsInSync(tm)
+    self.assertGreater(tm.basalConnections.nSegments(), 256)
+
+
+  def testCountsAfterCompaction(self):
+    tm = self._createTM(ApicalTiebreakSequenceMemory)
+    for _ in xrange(100):
+      tm.compute(self._randomSDR(256, 40), self._randomSDR(200, 12),
+                 learn=True)
+
+    # Random inputs rarely reinforce a segment, so most synapses are still at
+    # the initial permanence.
+    report = tm.compactConnections(minPermanence=0.25)
+    self.assertGreater(report["segmentsRemoved"], 0)
+    self._assertCountsInSync(tm)
+
+    for _ in xrange(20):
+      tm.compute(self._randomSDR(256, 40), self._randomSDR(200, 12),
+                 learn=True)
+    self._assertCountsInSync(tm)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,108 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that the sharded ApicalTiebreakTemporalMemory gives the same results in
+worker processes as in a single process.
+"""
+
+import unittest
+
+from htmresearch.algorithms.apical_tiebreak_temporal_memory import (
+  ApicalTiebreakPairMemory, ApicalTiebreakSequenceMemory)
+from htmresearch.algorithms.apical_tiebreak_temporal_memory_sharded import (
+  ShardedApicalTiebreakPairMemory, ShardedApicalTiebreakSequenceMemory)
+from htmresearch.support.shared_tests.equivalence_test_base import (
+  EquivalenceTestBase)
+
+
+PARAMS = {
+  "cellsPerColumn": 8,
+  "activationThreshold": 8,
+  "reducedBasalThreshold": 6,
+  "minThreshold": 6,
+  "sampleSize": 12,
+  "basalPredictedSegmentDecrement": 0.01,
+}
+
+
+
+class ShardedApicalTiebreakTest(EquivalenceTestBase, unittest.TestCase):
+
+  cellGetters = ("getActiveCells", "getWinnerCells", "getPredictedCells",
+                 "getNextPredictedCells")
+
+
+  def _assertSameSequenceOutput(self, tms, sequence, apical):
+    for _ in xrange(3):
+      self._assertSameBehavior(tms[0], tms[1:], zip(sequence, apical),
+                               learn=True)
+
+      for tm in tms:
+        tm.reset()
+
+
+  def testSequenceMemoryProcessesMatchSingleProcess(self):
+    sequence = [self._randomSDR(300, 12) for _ in xrange(10)]
+    apical = [self._randomSDR(200, 12) for _ in xrange(10)]
+
+    local = ShardedApicalTiebreakSequenceMemory(
+      columnCount=300, apicalInputSize=200, shardCount=3, useProcesses=False,
+      **PARAMS)
+    with ShardedApicalTiebreakSequenceMemory(
+        columnCount=300, apicalInputSize=200, shardCount=3, useProcesses=True,
+        **PARAMS) as sharded:
+      self._assertSameSequenceOutput([local, sharded], sequence, apical)
+
+
+  def testOneShardMatchesUnshardedSequenceMemory(self):
+    sequence = [self._randomSDR(128, 10) for _ in xrange(10)]
+    apical = [self._randomSDR(100, 10) for _ in xrange(10)]
+
+    tm = ApicalTiebreakSequenceMemory(columnCount=128, apicalInputSize=100,
+                                      seed=7, **PARAMS)
+    local = ShardedApicalTiebreakSequenceMemory(
+      columnCount=128, apicalInputSize=100, shardCount=1, useProcesses=False,
+      seed=7, **PARAMS)
+    self._assertSameSequenceOutput([tm, local], sequence, apical)
+
+
+  def testPairMemoryProcessesMatchSingleProcess(self):
+    pairs = [(self._randomSDR(128, 10), self._randomSDR(300, 12),
+              self._randomSDR(300, 12))
+             for _ in xrange(8)]
+
+    local = ShardedApicalTiebreakPairMemory(
+      columnCount=128, basalInputSize=300, apicalInputSize=300, shardCount=4,
+      useProcesses=False, seed=[1, 2, 3, 4], **PARAMS)
+    with ShardedApicalTiebreakPairMemory(
+        columnCount=128, basalInputSize=300, apicalInputSize=300, shardCount=4,
+        useProcesses=True, seed=[1, 2, 3, 4], **PARAMS) as sharded:
+      for _ in xrange(4):
+        self._assertSameBehavior(local, [sharded], pairs, learn=True,
+                                 cellGetters=("getActiveCells",
+                                              "getWinnerCells",
+                                              "getPredictedCells"))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
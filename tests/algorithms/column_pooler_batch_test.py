@@ -0,0 +1,150 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that ColumnPooler.inferBatch gives the same active cells as running the
+trials one at a time.
+"""
+
+import unittest
+
+import numpy
+
+from htmresearch.algorithms.column_pooler import ColumnPooler
+from htmresearch.support.shared_tests.equivalence_test_base import (
+  EquivalenceTestBase)
+
+
+
+class ColumnPoolerBatchTest(EquivalenceTestBase, unittest.TestCase):
+
+  def setUp(self):
+    super(ColumnPoolerBatchTest, self).setUp()
+
+    self.objects = [[(self._randomSDR(1024, 20),
+                      (self._randomSDR(512, 20), self._randomSDR(256, 20)))
+                     for _ in xrange(4)]
+                    for _ in xrange(10)]
+
+    # Two identical poolers, so that both start inference with the same random
+    # state.
+    self.poolers = [ColumnPooler(inputWidth=1024,
+                                 lateralInputWidths=(512, 256),
+                                 cellCount=1024, sdrSize=20,
+                                 minThresholdProximal=8,
+                                 activationThresholdDistal=8)
+                    for _ in xrange(2)]
+    for pooler in self.poolers:
+      for obj in self.objects:
+        self._train([pooler], obj, numRepetitions=3,
+                    resetAfterEachRepetition=False)
+
+
+  def _addNoise(self, sdr, size, numFlipped):
+    kept = self.rng.choice(sdr, len(sdr) - numFlipped, replace=False)
+    added = self.rng.choice(numpy.setdiff1d(numpy.arange(size), sdr),
+                            numFlipped, replace=False)
+    return numpy.sort(numpy.concatenate((kept, added))).astype("uint32")
+
+
+  def _inferSequentially(self, pooler, feedforwardInputs, lateralInputs):
+    activeCellsByTrial = []
+    for trialFeedforward, trialLateral in zip(feedforwardInputs,
+                                              lateralInputs):
+      pooler.reset()
+      for feedforwardInput, lateral in zip(trialFeedforward, trialLateral):
+        pooler.compute(feedforwardInput, lateral, learn=False)
+      activeCellsByTrial.append(pooler.getActiveCells())
+    pooler.reset()
+    return activeCellsByTrial
+
+
+  def _assertSameActiveCells(self, feedforwardInputs, lateralInputs):
+    expected = self._inferSequentially(self.poolers[0], feedforwardInputs,
+                                       lateralInputs)
+    actual = self.poolers[1].inferBatch(feedforwardInputs, lateralInputs)
+
+    self.assertEqual(len(actual), len(expected))
+    for expectedCells, actualCells in zip(expected, actual):
+      numpy.testing.assert_equal(actualCells, expectedCells)
+
+
+  def testSingleSensations(self):
+    trials = [[obj[self.rng.randint(len(obj))]] for obj in self.objects]
+    self._assertSameActiveCells(
+      [[feedforwardInput for feedforwardInput, _ in trial]
+       for trial in trials],
+      [[lateralInputs for _, lateralInputs in trial]
+       for trial in trials])
+
+
+  def testNoisySequences(self):
+    feedforwardInputs = []
+    lateralInputs = []
+    for _ in xrange(20):
+      obj = self.objects[self.rng.randint(len(self.objects))]
+      steps = [obj[i] for i in self.rng.choice(len(obj), 3)]
+      feedforwardInputs.append([self._addNoise(feedforwardInput, 1024, 5)
+                                for feedforwardInput, _ in steps])
+      # Vary which lateral inputs are present.
+      lateralInputs.append([lateral[:self.rng.randint(3)]
+                            for _, lateral in steps])
+
+    self._assertSameActiveCells(feedforwardInputs, lateralInputs)
+
+
+  def testWithoutLateralInput(self):
+    feedforwardInputs = [[feedforwardInput for feedforwardInput, _ in obj]
+                         for obj in self.objects]
+    expected = self._inferSequentially(
+      self.poolers[0], feedforwardInputs,
+      [[()] * len(trial) for trial in feedforwardInputs])
+    actual = self.poolers[1].inferBatch(feedforwardInputs)
+
+    for expectedCells, actualCells in zip(expected, actual):
+      numpy.testing.assert_equal(actualCells, expectedCells)
+
+
+  def testLearningUpdatesConnectedSynapses(self):
+    trials = [[feedforwardInput for feedforwardInput, _ in obj]
+              for obj in self.objects]
+    for pooler in self.poolers:
+      pooler.inferBatch(trials)
+      connectedMatrices = pooler._getConnectedMatrices()
+      pooler.inferBatch(trials)
+      self.assertIs(pooler._getConnectedMatrices(), connectedMatrices)
+
+    newObject = [(self._randomSDR(1024, 20),
+                  (self._randomSDR(512, 20), self._randomSDR(256, 20)))
+                 for _ in xrange(4)]
+    self._train(self.poolers, newObject, numRepetitions=3,
+                resetAfterEachRepetition=False)
+    for pooler in self.poolers:
+      self.assertIsNone(pooler._connectedMatrices)
+
+    self._assertSameActiveCells(
+      [[feedforwardInput for feedforwardInput, _ in newObject]],
+      [[lateralInputs for _, lateralInputs in newObject]])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
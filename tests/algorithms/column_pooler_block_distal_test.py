@@ -0,0 +1,168 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that the ColumnPooler's block distal matrix learns exactly the same
+segments as the original implementation, which used one matrix per distal
+source.
+"""
+
+import unittest
+
+import numpy
+
+from nupic.bindings.math import SparseMatrix
+
+from htmresearch.algorithms.column_pooler import ColumnPooler, _sampleRange
+from htmresearch.support.shared_tests.equivalence_test_base import (
+  EquivalenceTestBase)
+
+
+
+class ReferenceColumnPooler(ColumnPooler):
+  """
+  A ColumnPooler that learns its distal segments the original way, with one
+  matrix for the internal segments and one per lateral input.
+  """
+
+  def __init__(self, lateralInputWidths, cellCount, **kwargs):
+    super(ReferenceColumnPooler, self).__init__(
+      lateralInputWidths=lateralInputWidths, cellCount=cellCount, **kwargs)
+    self.internalDistalPermanences = SparseMatrix(cellCount, cellCount)
+    self.lateralDistalPermanences = tuple(SparseMatrix(cellCount, n)
+                                          for n in lateralInputWidths)
+
+
+  def _computeLearningMode(self, feedforwardInput, lateralInputs,
+                           feedforwardGrowthCandidates):
+    prevActiveCells = self.activeCells
+
+    if len(self.activeCells) < self.minSdrSize:
+      self.activeCells = _sampleRange(self._random,
+                                      0, self.numberOfCells(),
+                                      step=1, k=self.sdrSize)
+      self.activeCells.sort()
+
+    if len(self.activeCells) > self.maxSdrSize:
+      return
+
+    if len(feedforwardInput) > 0:
+      self._learn(self.proximalPermanences, self._random,
+                  self.activeCells, feedforwardInput,
+                  feedforwardGrowthCandidates, self.sampleSizeProximal,
+                  self.initialProximalPermanence, self.synPermProximalInc,
+                  self.synPermProximalDec, self.connectedPermanenceProximal)
+
+      for i, lateralInput in enumerate(lateralInputs):
+        self._learn(self.lateralDistalPermanences[i], self._random,
+                    self.activeCells, lateralInput, lateralInput,
+                    self.sampleSizeDistal, self.initialDistalPermanence,
+                    self.synPermDistalInc, self.synPermDistalDec,
+                    self.connectedPermanenceDistal)
+
+      self._learn(self.internalDistalPermanences, self._random,
+                  self.activeCells, prevActiveCells, prevActiveCells,
+                  self.sampleSizeDistal, self.initialDistalPermanence,
+                  self.synPermDistalInc, self.synPermDistalDec,
+                  self.connectedPermanenceDistal)
+
+
+
+class ColumnPoolerBlockDistalTest(EquivalenceTestBase, unittest.TestCase):
+
+  def setUp(self):
+    super(ColumnPoolerBlockDistalTest, self).setUp()
+    self.lateralInputWidths = (512, 256)
+
+    self.objects = [[(self._randomSDR(1024, 20),
+                      tuple(self._randomSDR(n, 20)
+                            for n in self.lateralInputWidths))
+                     for _ in xrange(4)]
+                    for _ in xrange(5)]
+
+    params = dict(inputWidth=1024, lateralInputWidths=self.lateralInputWidths,
+                  cellCount=1024, sampleSizeDistal=10, seed=42)
+    self.pooler = ColumnPooler(**params)
+    self.reference = ReferenceColumnPooler(**params)
+
+    for obj in self.objects:
+      for _ in xrange(3):
+        self._assertSameBehavior(self.pooler, [self.reference], obj,
+                                 learn=True)
+      for pooler in (self.pooler, self.reference):
+        pooler.reset()
+
+
+  def testSameSegmentsAsSeparateMatrices(self):
+    matrices = ((self.reference.internalDistalPermanences,) +
+                self.reference.lateralDistalPermanences)
+
+    for source, matrix in enumerate(matrices):
+      for cell in xrange(1024):
+        numpy.testing.assert_equal(
+          self.pooler.getDistalSegmentPermanences(cell, source),
+          matrix.getRow(cell))
+
+
+  def testSegmentsStayInTheirBlock(self):
+    offsets = self.pooler.distalInputOffsets
+    self.assertGreater(self.pooler.numberOfDistalSynapses(), 0)
+
+    for source in xrange(len(offsets) - 1):
+      for cell in xrange(1024):
+        row = self.pooler.distalPermanences.getRow(source*1024 + cell)
+        self.assertEqual(numpy.count_nonzero(row[:offsets[source]]), 0)
+        self.assertEqual(numpy.count_nonzero(row[offsets[source + 1]:]), 0)
+
+
+  def testCountsAcceptAnyIterableOfCells(self):
+    cells = numpy.arange(0, 1024, 3, dtype="uint32")
+    self.assertGreater(self.pooler.numberOfDistalSegments(cells), 0)
+
+    for count in (self.pooler.numberOfDistalSegments,
+                  self.pooler.numberOfDistalSynapses,
+                  self.pooler.numberOfConnectedDistalSynapses):
+      self.assertEqual(count(set(cells)), count(cells))
+      self.assertEqual(count(list(cells)), count(cells))
+
+
+  def testSameOverlapsAsSeparateMatrices(self):
+    matrices = ((self.reference.internalDistalPermanences,) +
+                self.reference.lateralDistalPermanences)
+    connected = self.pooler.connectedPermanenceDistal
+
+    for obj in self.objects:
+      for _, lateralInputs in obj:
+        distalInputs = (self._randomSDR(1024, 40),) + lateralInputs
+        overlaps = self.pooler.distalPermanences \
+          .rightVecSumAtNZGteThresholdSparse(
+            self.pooler._getDistalInput(distalInputs), connected)
+
+        for source, matrix in enumerate(matrices):
+          numpy.testing.assert_equal(
+            overlaps[source*1024:(source + 1)*1024],
+            matrix.rightVecSumAtNZGteThresholdSparse(distalInputs[source],
+                                                     connected))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
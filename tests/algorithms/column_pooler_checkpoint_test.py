@@ -0,0 +1,100 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that a ColumnPooler behaves the same after a round trip through a
+checkpoint, with float32 and with fixed-point permanences.
+"""
+
+import shutil
+import tempfile
+import unittest
+
+from htmresearch.algorithms.column_pooler import ColumnPooler
+from htmresearch.support.connections_checkpoint import CheckpointMatrix
+from htmresearch.support.shared_tests.equivalence_test_base import (
+  EquivalenceTestBase)
+
+
+
+class ColumnPoolerCheckpointTest(EquivalenceTestBase, unittest.TestCase):
+
+  def setUp(self):
+    super(ColumnPoolerCheckpointTest, self).setUp()
+    self.directory = tempfile.mkdtemp()
+
+    self.objects = [[(self._randomSDR(1024, 20), (self._randomSDR(512, 20),))
+                     for _ in xrange(4)]
+                    for _ in xrange(5)]
+
+    self.pooler = ColumnPooler(inputWidth=1024, lateralInputWidths=(512,),
+                               cellCount=1024, synPermProximalDec=0.02,
+                               initialProximalPermanence=0.51)
+    for obj in self.objects:
+      self._train([self.pooler], obj, numRepetitions=3,
+                  resetAfterEachRepetition=False)
+
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+
+  def _assertSameInference(self, loadedPoolers):
+    for loaded in loadedPoolers:
+      self.assertEqual(loaded.numberOfProximalSynapses(),
+                       self.pooler.numberOfProximalSynapses())
+      self.assertEqual(loaded.numberOfConnectedProximalSynapses(),
+                       self.pooler.numberOfConnectedProximalSynapses())
+      self.assertEqual(loaded.numberOfConnectedDistalSynapses(),
+                       self.pooler.numberOfConnectedDistalSynapses())
+
+    for obj in self.objects:
+      self._assertSameBehavior(self.pooler, loadedPoolers, obj, learn=False)
+
+      for pooler in [self.pooler] + loadedPoolers:
+        pooler.reset()
+
+
+  def testRoundTrip(self):
+    for permanenceDtype in ("float32", "uint16", "uint8"):
+      directory = "{}/{}".format(self.directory, permanenceDtype)
+      self.pooler.saveCheckpoint(directory, permanenceDtype)
+
+      mapped = ColumnPooler.loadCheckpoint(directory)
+      self.assertIsInstance(mapped.proximalPermanences, CheckpointMatrix)
+      self.assertIsInstance(mapped.distalPermanences, CheckpointMatrix)
+
+      copied = ColumnPooler.loadCheckpoint(directory, mmap=False)
+      self._assertSameInference([mapped, copied])
+
+
+  def testLearningOnMemoryMappedPoolerRaises(self):
+    self.pooler.saveCheckpoint(self.directory, "uint8")
+    mapped = ColumnPooler.loadCheckpoint(self.directory)
+
+    feedforwardInput, lateralInputs = self.objects[0][0]
+    with self.assertRaises(ValueError):
+      mapped.compute(feedforwardInput, lateralInputs, learn=True)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
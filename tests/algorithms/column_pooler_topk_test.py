@@ -0,0 +1,192 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2016, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that the ColumnPooler's inference selects exactly the same cells as the
+original implementation, which added cells one lateral support level at a time
+with numpy.union1d.
+"""
+
+import unittest
+
+import numpy
+
+from htmresearch.algorithms.column_pooler import (ColumnPooler, _sample,
+                                                  _selectByDescendingCount)
+from htmresearch.support.shared_tests.equivalence_test_base import (
+  EquivalenceTestBase)
+
+
+
+def _referenceSelect(cells, counts, k, minCount):
+  selected = []
+  ttop = numpy.max(counts)
+  while ttop >= minCount and len(selected) < k:
+    selected = numpy.union1d(selected, cells[counts >= ttop])
+    ttop -= 1
+  return numpy.asarray(selected, dtype="uint32")
+
+
+
+def _referenceInferenceMode(self, feedforwardInput, lateralInputs):
+  """
+  The original ColumnPooler._computeInferenceMode.
+  """
+  prevActiveCells = self.activeCells
+
+  overlaps = self.proximalPermanences.rightVecSumAtNZGteThresholdSparse(
+    feedforwardInput, self.connectedPermanenceProximal)
+  feedforwardSupportedCells = numpy.where(
+    overlaps >= self.minThresholdProximal)[0]
+
+  numActiveSegmentsByCell = numpy.zeros(self.cellCount, dtype="int")
+  for source, activeInput in enumerate([prevActiveCells] + list(lateralInputs)):
+    overlaps = self.distalPermanences.rightVecSumAtNZGteThresholdSparse(
+      numpy.asarray(activeInput, dtype="uint32") +
+      self.distalInputOffsets[source],
+      self.connectedPermanenceDistal)
+    overlaps = overlaps[source*self.cellCount:(source + 1)*self.cellCount]
+    numActiveSegmentsByCell[overlaps >= self.activationThresholdDistal] += 1
+
+  chosenCells = []
+
+  if len(feedforwardSupportedCells) == 0:
+    pass
+  else:
+    numActiveSegsForFFSuppCells = numActiveSegmentsByCell[
+      feedforwardSupportedCells]
+    ttop = numpy.max(numActiveSegsForFFSuppCells)
+    while ttop > 0 and len(chosenCells) < self.sdrSize:
+      chosenCells = numpy.union1d(chosenCells,
+                  feedforwardSupportedCells[numActiveSegsForFFSuppCells >= ttop])
+      ttop -= 1
+
+  if len(chosenCells) < self.sdrSize:
+    if self.useInertia:
+      prevCells = numpy.setdiff1d(prevActiveCells, chosenCells)
+      inertialCap = int(len(prevCells) * self.inertiaFactor)
+      if inertialCap > 0:
+        numActiveSegsForPrevCells = numActiveSegmentsByCell[prevCells]
+        sortIndices = numpy.argsort(numActiveSegsForPrevCells)[::-1]
+        prevCells = prevCells[sortIndices]
+        numActiveSegsForPrevCells = numActiveSegsForPrevCells[sortIndices]
+        prevCells = prevCells[:inertialCap]
+        numActiveSegsForPrevCells = numActiveSegsForPrevCells[:inertialCap]
+        ttop = numpy.max(numActiveSegsForPrevCells)
+        while ttop >= 0 and len(chosenCells) < self.sdrSize:
+          chosenCells = numpy.union1d(chosenCells,
+                      prevCells[numActiveSegsForPrevCells >= ttop])
+          ttop -= 1
+
+  discrepancy = self.sdrSize - len(chosenCells)
+  if discrepancy > 0:
+    remFFcells = numpy.setdiff1d(feedforwardSupportedCells, chosenCells)
+    n = (len(remFFcells) * discrepancy) // self.sdrSize
+    n = max(n, discrepancy)
+    n = min(n, len(remFFcells))
+
+    if len(remFFcells) > n:
+      selected = _sample(self._random, remFFcells, n)
+      chosenCells = numpy.append(chosenCells, selected)
+    else:
+      chosenCells = numpy.append(chosenCells, remFFcells)
+
+  chosenCells.sort()
+  self.activeCells = numpy.asarray(chosenCells, dtype="uint32")
+
+
+
+class ColumnPoolerTopKTest(EquivalenceTestBase, unittest.TestCase):
+
+  def testSelectMatchesUnionLoop(self):
+    for _ in xrange(2000):
+      numCells = self.rng.randint(1, 60)
+      cells = numpy.sort(self.rng.choice(1000, numCells,
+                                         replace=False)).astype("uint32")
+      # Few distinct counts, so that there are many ties.
+      counts = self.rng.randint(0, self.rng.randint(1, 6), size=numCells)
+      k = self.rng.randint(1, 50)
+      minCount = self.rng.randint(0, 2)
+
+      numpy.testing.assert_equal(
+        _selectByDescendingCount(cells, counts, k, minCount),
+        _referenceSelect(cells, counts, k, minCount))
+
+
+  def _trainedPoolers(self, objects, **kwargs):
+    poolers = []
+    for _ in xrange(2):
+      pooler = ColumnPooler(inputWidth=1024, lateralInputWidths=(512, 512),
+                            cellCount=1024, sdrSize=20, **kwargs)
+      for obj in objects:
+        self._train([pooler], obj, numRepetitions=2,
+                    resetAfterEachRepetition=False)
+      poolers.append(pooler)
+    return poolers
+
+
+  def _checkInference(self, **kwargs):
+    objects = [[(self._randomSDR(1024, 20),
+                 (self._randomSDR(512, 20), self._randomSDR(512, 20)))
+                for _ in xrange(5)]
+               for _ in xrange(10)]
+    pooler, reference = self._trainedPoolers(objects, **kwargs)
+
+    # Learned objects, unions of objects, noisy inputs, and missing lateral
+    # input
+    inputs = []
+    for i, obj in enumerate(objects):
+      other = objects[(i + 1) % len(objects)]
+      for (feedforwardInput, lateralInputs), (otherInput, _) in zip(obj,
+                                                                     other):
+        inputs.append((feedforwardInput, lateralInputs))
+        inputs.append((numpy.union1d(feedforwardInput, otherInput),
+                       lateralInputs))
+        inputs.append((feedforwardInput, ()))
+        inputs.append((self._randomSDR(1024, 20),
+                       (self._randomSDR(512, 20), lateralInputs[1])))
+
+    for j, (feedforwardInput, lateralInputs) in enumerate(inputs):
+      pooler.compute(feedforwardInput, lateralInputs, learn=False)
+      _referenceInferenceMode(reference, feedforwardInput, lateralInputs)
+      self._assertSameCells(pooler, reference)
+      if j % 7 == 6:
+        pooler.reset()
+        reference.reset()
+
+
+  def testInferenceMatchesUnionLoops(self):
+    self._checkInference()
+
+
+  def testInferenceWithPartialInertiaMatchesUnionLoops(self):
+    self._checkInference(inertiaFactor=0.6)
+
+
+  def testInferenceWithLowThresholdsMatchesUnionLoops(self):
+    # More feedforward supported cells and more ties
+    self._checkInference(minThresholdProximal=3,
+                         activationThresholdDistal=3)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,139 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that ImageSparseNet trains the same way from images in memory, from a
+memory-mapped file and from chunked files with prefetching.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.image_sparse_net import ImageSparseNet
+
+
+
+NUM_ITERATIONS = 30
+
+
+
+def createNet():
+  # The constructor draws the initial basis before seeding numpy's random
+  # number generator, so seed it here too.
+  np.random.seed(42)
+  return ImageSparseNet(filterDim=16,
+                        outputDim=16,
+                        batchSize=20,
+                        numLcaIterations=10,
+                        decayCycle=10,
+                        learningRateDecay=0.9,
+                        seed=42)
+
+
+
+class FailingSparseNet(ImageSparseNet):
+  """
+  Fails to build its third batch.
+  """
+
+  def _getDataBatch(self, inputData):
+    self.numBatches = getattr(self, "numBatches", 0) + 1
+    if self.numBatches == 3:
+      raise IOError("Can't read the images.")
+    return super(FailingSparseNet, self)._getDataBatch(inputData)
+
+
+
+class ImageSparseNetTest(unittest.TestCase):
+
+  def setUp(self):
+    self.images = np.random.RandomState(0).rand(16, 16, 12)
+    self.directory = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+
+  def _train(self, images, prefetch=False):
+    net = createNet()
+    net.train(images, NUM_ITERATIONS, prefetch=prefetch)
+    return net
+
+
+  def assertSameTraining(self, net, expectedNet):
+    np.testing.assert_equal(net.basis, expectedNet.basis)
+    self.assertEqual(net.losses, expectedNet.losses)
+
+
+  def testMemmapAndChunkedPrefetchMatchInMemory(self):
+    expected = self._train(self.images)
+    self.assertEqual(len(expected.losses), NUM_ITERATIONS)
+
+    mapped = np.memmap(os.path.join(self.directory, "images.dat"),
+                       dtype=self.images.dtype, mode="w+",
+                       shape=self.images.shape)
+    mapped[:] = self.images
+    mapped.flush()
+    self.assertSameTraining(self._train(mapped), expected)
+
+    paths = []
+    for i, chunk in enumerate(np.array_split(self.images, 3, axis=-1)):
+      paths.append(os.path.join(self.directory, "images_%d.npy" % i))
+      np.save(paths[-1], chunk)
+    net = createNet()
+    chunked = net.loadChunkedNumpyImages(paths)
+    net.train(chunked, NUM_ITERATIONS, prefetch=True)
+    self.assertSameTraining(net, expected)
+
+
+  def testPrefetchRaisesBatchErrors(self):
+    net = FailingSparseNet(filterDim=16, outputDim=16, batchSize=20,
+                           numLcaIterations=10)
+    with self.assertRaises(IOError):
+      net.train(self.images, NUM_ITERATIONS, prefetch=True)
+
+    self.assertEqual(net.numBatches, 3)
+    self.assertEqual(len(net.losses), 2)
+
+
+  def testEncodeUsesAssignedBasis(self):
+    net = self._train(self.images)
+    data = np.random.RandomState(1).rand(16, 10)
+    net.encode(data)
+
+    expected = createNet()
+    expected.basis = np.random.RandomState(2).randn(16, 16)
+    net.basis = expected.basis.copy()
+    np.testing.assert_equal(net.encode(data), expected.encode(data))
+
+    net.basis *= 2
+    expected.basis = expected.basis * 2
+    np.testing.assert_equal(net.encode(data), expected.encode(data))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,327 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that ImplicitBodyToSpecificObjectModule2D computes the same cells as
+BodyToSpecificObjectModule2D, whose connections are stored as synapses, that
+SuperficialLocationModule2D's point buffer matches the original point lists,
+and that SuperficialLocationModuleBank2D matches a list of separate modules.
+"""
+
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.location_modules import (
+  BodyToSpecificObjectModule2D, ImplicitBodyToSpecificObjectModule2D,
+  SensorToSpecificObjectModule, SuperficialLocationModule2D,
+  SuperficialLocationModuleBank2D)
+
+
+
+class ReferenceLocationModule2D(SuperficialLocationModule2D):
+  """
+  Stores the active points the original way, reallocating them on every shift
+  and anchor.
+  """
+
+  def reset(self):
+    super(ReferenceLocationModule2D, self).reset()
+    self.points = np.empty((0,2), dtype="float")
+    self.pointCells = np.empty(0, dtype="int")
+
+
+  def _computeReferenceCells(self):
+    flooredActivePoints = np.floor(self.points).astype("int")
+    self.pointCells = np.ravel_multi_index(flooredActivePoints.T,
+                                           self.cellDimensions)
+    self.activeCells = np.unique(self.pointCells)
+
+
+  def activateRandomLocation(self):
+    self.points = np.array([np.random.random(2) * self.cellDimensions])
+    self._computeReferenceCells()
+
+
+  def shift(self, deltaLocation):
+    deltaLocationInCellFields = (np.matmul(self.rotationMatrix, deltaLocation) *
+                                 self.cellFieldsPerUnitDistance)
+    np.add(self.points, deltaLocationInCellFields, out=self.points)
+    np.mod(self.points, self.cellDimensions, out=self.points)
+    self._computeReferenceCells()
+
+
+  def anchor(self, anchorInput):
+    if len(anchorInput) == 0:
+      return
+
+    overlaps = self.connections.computeActivity(anchorInput,
+                                                self.connectedPermanence)
+    activeSegments = np.where(overlaps >= self.activationThreshold)[0]
+    sensorySupportedCells = np.unique(
+      self.connections.mapSegmentsToCells(activeSegments))
+
+    inactivated = np.setdiff1d(self.activeCells, sensorySupportedCells)
+    inactivatedIndices = np.in1d(self.pointCells, inactivated).nonzero()[0]
+    if inactivatedIndices.size > 0:
+      self.points = np.delete(self.points, inactivatedIndices, axis=0)
+
+    activated = np.setdiff1d(sensorySupportedCells, self.activeCells)
+    activatedCoordsBase = np.transpose(
+      np.unravel_index(activated, self.cellDimensions)).astype("float")
+    activatedCoords = np.concatenate(
+      [activatedCoordsBase + [iOffset, jOffset]
+       for iOffset in self.pointOffsets
+       for jOffset in self.pointOffsets])
+    if activatedCoords.size > 0:
+      self.points = np.append(self.points, activatedCoords, axis=0)
+
+    self._computeReferenceCells()
+    self.activeSegments = activeSegments
+
+
+
+class ImplicitBodyToSpecificObjectModuleTest(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = np.random.RandomState(42)
+
+
+  def _createModules(self, cls, cellDimensions, numColumns):
+    sensorModules = [SensorToSpecificObjectModule(cellDimensions,
+                                                  anchorInputSize=10)
+                     for _ in xrange(numColumns)]
+    bodyModule = cls(cellDimensions)
+    bodyModule.formReciprocalSynapses(sensorModules)
+    bodyModule.reset()
+    for sensorModule in sensorModules:
+      sensorModule.reset()
+
+    return bodyModule, sensorModules
+
+
+  def _randomCells(self, cellCount, maxCount):
+    return np.unique(self.rng.randint(0, cellCount,
+                                      self.rng.randint(0, maxCount + 1)))
+
+
+  def testMatchesExplicitModule(self):
+    cellDimensions = (6, 8)
+    cellCount = 6*8
+    numColumns = 3
+
+    explicit = self._createModules(BodyToSpecificObjectModule2D,
+                                   cellDimensions, numColumns)
+    implicit = self._createModules(ImplicitBodyToSpecificObjectModule2D,
+                                   cellDimensions, numColumns)
+
+    for _ in xrange(200):
+      sensorToBodyByColumn = [self._randomCells(cellCount, 3)
+                              for _ in xrange(numColumns)]
+      bodyToSpecificObject = self._randomCells(cellCount, 5)
+
+      for bodyModule, sensorModules in (explicit, implicit):
+        for sensorModule, sensorToBody in zip(sensorModules,
+                                              sensorToBodyByColumn):
+          sensorModule.metricCompute(sensorToBody, bodyToSpecificObject)
+
+      for explicitSensor, implicitSensor in zip(explicit[1], implicit[1]):
+        np.testing.assert_equal(implicitSensor.getActiveCells(),
+                                explicitSensor.getActiveCells())
+
+      # Vote with some ambiguous sensor locations too.
+      sensorToSpecificObjectByColumn = [
+        np.union1d(sensorModule.getActiveCells(),
+                   self._randomCells(cellCount, 10))
+        for sensorModule in explicit[1]]
+
+      for bodyModule, _ in (explicit, implicit):
+        bodyModule.compute(sensorToBodyByColumn,
+                           sensorToSpecificObjectByColumn)
+
+      np.testing.assert_equal(implicit[0].getActiveCells(),
+                              explicit[0].getActiveCells())
+
+
+  def testLargeModule(self):
+    cellDimensions = (100, 100)
+    bodyModule, sensorModules = self._createModules(
+      ImplicitBodyToSpecificObjectModule2D, cellDimensions, 2)
+
+    bodyModule.activateRandomLocation()
+    bodyLocation = bodyModule.getActiveCells()
+    sensorToBodyByColumn = [np.array([5050]), np.array([1234])]
+    for sensorModule, sensorToBody in zip(sensorModules, sensorToBodyByColumn):
+      sensorModule.metricCompute(sensorToBody, bodyLocation)
+      self.assertEqual(len(sensorModule.getActiveCells()), 4)
+
+    bodyModule.reset()
+    bodyModule.compute(sensorToBodyByColumn,
+                       [sensorModule.getActiveCells()
+                        for sensorModule in sensorModules])
+    self.assertIn(bodyLocation[0], bodyModule.getActiveCells())
+
+
+
+
+class SuperficialLocationModule2DTest(unittest.TestCase):
+
+  def _check(self, module, reference):
+    np.testing.assert_equal(module.getActiveCells(),
+                            reference.getActiveCells())
+    np.testing.assert_equal(module.activePoints, reference.points)
+    np.testing.assert_equal(module.cellsForActivePoints, reference.pointCells)
+
+
+  def testMatchesReferenceModule(self):
+    rng = np.random.RandomState(42)
+    anchorInputSize = 200
+    params = {
+      "cellDimensions": (5, 7),
+      "moduleMapDimensions": (20.0, 20.0),
+      "orientation": 0.3,
+      "anchorInputSize": anchorInputSize,
+      "pointOffsets": (0.05, 0.5, 0.95),
+      "activationThreshold": 4,
+      "learningThreshold": 4,
+      "initialPermanence": 0.6,
+    }
+    module = SuperficialLocationModule2D(**params)
+    reference = ReferenceLocationModule2D(**params)
+    modules = (module, reference)
+    for m in modules:
+      m.reset()
+
+    anchorInputs = [np.sort(rng.choice(anchorInputSize, 8, replace=False))
+                    for _ in xrange(30)]
+
+    # Learn each anchor input at a random location, then at a nearby one.
+    for anchorInput in anchorInputs:
+      seed = rng.randint(1000)
+      delta = rng.uniform(-3, 3, size=2)
+      for m in modules:
+        np.random.seed(seed)
+        m.activateRandomLocation()
+        m.learn(anchorInput)
+        m.shift(delta)
+        m.learn(anchorInput)
+      self._check(module, reference)
+
+    # Infer with random movements.
+    for m in modules:
+      m.reset()
+    for i in xrange(200):
+      if i == 100:
+        # Make sure the points survive the buffers being reallocated.
+        module._reservePoints(len(module._points) + 1)
+      numInputs = rng.randint(0, 4)
+      anchorInput = np.unique(np.concatenate(
+        [np.empty(0, dtype="int")] +
+        [anchorInputs[iInput] for iInput in rng.randint(len(anchorInputs),
+                                                        size=numInputs)]))
+      delta = rng.uniform(-10, 10, size=2)
+      for m in modules:
+        m.shift(delta)
+      self._check(module, reference)
+      for m in modules:
+        m.anchor(anchorInput)
+      self._check(module, reference)
+
+
+
+
+class SuperficialLocationModuleBank2DTest(unittest.TestCase):
+
+  def testMatchesSeparateModules(self):
+    rng = np.random.RandomState(42)
+    cellDimensions = (5, 7)
+    cellsPerModule = 5*7
+    anchorInputSize = 200
+    moduleMapDimensions = [(10.0 * (1.5 ** i),) * 2 for i in xrange(6)]
+    orientations = rng.uniform(-0.3, 0.3, size=6)
+    params = {
+      "anchorInputSize": anchorInputSize,
+      "pointOffsets": (0.05, 0.5, 0.95),
+      "activationThreshold": 4,
+      "learningThreshold": 4,
+      "initialPermanence": 0.6,
+    }
+
+    modules = [SuperficialLocationModule2D(cellDimensions=cellDimensions,
+                                           moduleMapDimensions=dimensions,
+                                           orientation=orientation,
+                                           **params)
+               for dimensions, orientation in zip(moduleMapDimensions,
+                                                  orientations)]
+    bank = SuperficialLocationModuleBank2D(
+      cellDimensions=cellDimensions,
+      moduleMapDimensions=moduleMapDimensions,
+      orientations=orientations,
+      **params)
+
+    self.assertEqual(bank.numberOfCells(), 6*cellsPerModule)
+
+    def check():
+      np.testing.assert_equal(
+        bank.getActiveCells(),
+        np.concatenate([module.getActiveCells() + i*cellsPerModule
+                        for i, module in enumerate(modules)]))
+
+    anchorInputs = [np.sort(rng.choice(anchorInputSize, 8, replace=False))
+                    for _ in xrange(30)]
+
+    for anchorInput in anchorInputs:
+      seed = rng.randint(1000)
+      delta = rng.uniform(-3, 3, size=2)
+
+      np.random.seed(seed)
+      for module in modules:
+        module.activateRandomLocation()
+      np.random.seed(seed)
+      bank.activateRandomLocation()
+      check()
+
+      for m in modules + [bank]:
+        m.learn(anchorInput)
+        m.shift(delta)
+        m.learn(anchorInput)
+      check()
+
+    for m in modules + [bank]:
+      m.reset()
+    for _ in xrange(200):
+      numInputs = rng.randint(0, 4)
+      anchorInput = np.unique(np.concatenate(
+        [np.empty(0, dtype="int")] +
+        [anchorInputs[iInput] for iInput in rng.randint(len(anchorInputs),
+                                                        size=numInputs)]))
+      delta = rng.uniform(-10, 10, size=2)
+      for m in modules + [bank]:
+        m.shift(delta)
+      check()
+      for m in modules + [bank]:
+        m.anchor(anchorInput)
+      check()
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,111 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that Multiconnections behaves like one SparseMatrixConnections per
+source.
+"""
+
+import unittest
+
+import numpy as np
+
+from nupic.bindings.math import SparseMatrixConnections
+
+from htmresearch.algorithms.multiconnections import Multiconnections
+
+
+
+class MulticonnectionsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = np.random.RandomState(42)
+    self.cellCount = 50
+    self.cellCountBySource = {"a": 30,
+                              "b": 7,
+                              "c": 64}
+
+
+  def _randomInputs(self, maxCount):
+    return dict(
+      (source, np.unique(self.rng.randint(0, cellCount, maxCount))
+       .astype("uint32"))
+      for source, cellCount in self.cellCountBySource.iteritems())
+
+
+  def testMatchesConnectionsPerSource(self):
+    multiconnections = Multiconnections(self.cellCount, self.cellCountBySource)
+    connectionsBySource = dict(
+      (source, SparseMatrixConnections(self.cellCount, cellCount))
+      for source, cellCount in self.cellCountBySource.iteritems())
+
+    for _ in xrange(20):
+      cells = np.unique(self.rng.randint(0, self.cellCount, 5)).astype("uint32")
+      segments = multiconnections.createSegments(cells)
+      for connections in connectionsBySource.itervalues():
+        np.testing.assert_equal(connections.createSegments(cells), segments)
+
+      activeInputsBySource = self._randomInputs(10)
+      multiconnections.growSynapses(segments, activeInputsBySource, 0.6)
+      for source, connections in connectionsBySource.iteritems():
+        connections.growSynapses(segments, activeInputsBySource[source], 0.6)
+
+      presynapticCellsBySource = dict(
+        (source, self.rng.randint(0, cellCount, len(segments))
+         .astype("uint32"))
+        for source, cellCount in self.cellCountBySource.iteritems())
+      multiconnections.setPermanences(segments, presynapticCellsBySource, 0.3)
+      for source, connections in connectionsBySource.iteritems():
+        connections.matrix.setElements(
+          segments, presynapticCellsBySource[source],
+          np.full(len(segments), 0.3, dtype="float32"))
+
+      activeInputsBySource = self._randomInputs(20)
+      for permanenceThreshold in (None, 0.5):
+        expected = sum(
+          connections.computeActivity(activeInputsBySource[source],
+                                      permanenceThreshold)
+          for source, connections in connectionsBySource.iteritems())
+        np.testing.assert_equal(
+          multiconnections.computeActivity(activeInputsBySource,
+                                           permanenceThreshold),
+          expected)
+
+    allSegments = np.arange(multiconnections.connections.matrix.nRows(),
+                            dtype="uint32")
+    for segment in allSegments:
+      for source, connections in connectionsBySource.iteritems():
+        np.testing.assert_equal(
+          multiconnections.getSegmentPermanences(segment, source),
+          connections.matrix.getRow(segment))
+
+    cells = np.arange(0, self.cellCount, 3, dtype="uint32")
+    np.testing.assert_equal(
+      multiconnections.filterSegmentsByCell(allSegments, cells),
+      connectionsBySource["a"].filterSegmentsByCell(allSegments, cells))
+    np.testing.assert_equal(
+      multiconnections.mapSegmentsToCells(allSegments),
+      connectionsBySource["a"].mapSegmentsToCells(allSegments))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
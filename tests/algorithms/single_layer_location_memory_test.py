@@ -0,0 +1,128 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that SingleLayerLocationMemory, which only computes the delta activity of
+segments whose internal part is active or matching, behaves like computing the
+delta activity of every segment.
+"""
+
+import unittest
+
+import numpy as np
+
+from htmresearch.algorithms.single_layer_location_memory import (
+  SingleLayerLocationMemory)
+from htmresearch.support.segment_activity import computeSegmentActivity
+
+
+
+class FullPassLocationMemory(SingleLayerLocationMemory):
+  """
+  Computes the delta activity of every segment.
+  """
+
+  def _computeDeltaActivity(self, deltaLocation, candidates):
+    return computeSegmentActivity(
+      self.deltaConnections, deltaLocation, self.connectedPermanence,
+      self.activationThreshold)
+
+
+
+class SingleLayerLocationMemoryTest(unittest.TestCase):
+
+  def _createSDRs(self, rng, keys):
+    return dict((key, np.sort(rng.choice(200, 12, replace=False))
+                 .astype("uint32"))
+                for key in keys)
+
+
+  def testMatchesFullPass(self):
+    rng = np.random.RandomState(42)
+    diameter = 4
+    locations = self._createSDRs(rng, [(i, j)
+                                       for i in xrange(diameter)
+                                       for j in xrange(diameter)])
+    transitions = self._createSDRs(rng, [(di, dj)
+                                         for di in xrange(-1, 2)
+                                         for dj in xrange(-1, 2)
+                                         if di != 0 or dj != 0])
+
+    params = {
+      "cellCount": 200,
+      "deltaLocationInputSize": 200,
+      "featureLocationInputSize": 100,
+      "sampleSize": 10,
+      "activationThreshold": 8,
+      "learningThreshold": 6,
+    }
+    memories = (SingleLayerLocationMemory(**params),
+                FullPassLocationMemory(**params))
+
+    def step(**kwargs):
+      for memory in memories:
+        memory.compute(**kwargs)
+      np.testing.assert_equal(memories[0].getActiveCells(),
+                              memories[1].getActiveCells())
+      np.testing.assert_equal(memories[0].activeDeltaSegments,
+                              memories[1].activeDeltaSegments)
+
+    # Learn the transitions, sometimes from a noisy location.
+    for _ in xrange(5):
+      for (i, j), locationSDR in sorted(locations.iteritems()):
+        for (di, dj), transitionSDR in sorted(transitions.iteritems()):
+          if (i + di, j + dj) in locations:
+            for memory in memories:
+              memory.reset()
+            noise = np.sort(rng.choice(200, 3, replace=False))
+            step(newLocation=np.union1d(locationSDR, noise).astype("uint32"))
+            step(deltaLocation=transitionSDR,
+                 newLocation=locations[(i + di, j + dj)])
+
+    for memory in memories:
+      self.assertEqual(memory.internalConnections.nSegments(),
+                       memories[0].internalConnections.nSegments())
+      np.testing.assert_equal(
+        memory.deltaConnections.computeActivity(np.arange(200)),
+        memories[0].deltaConnections.computeActivity(np.arange(200)))
+
+    # Path integration.
+    numActiveSteps = 0
+    for _ in xrange(5):
+      for memory in memories:
+        memory.reset()
+      location = (rng.randint(diameter), rng.randint(diameter))
+      step(newLocation=locations[location], learn=False)
+      for _ in xrange(20):
+        moves = [(di, dj) for di, dj in sorted(transitions.iterkeys())
+                 if (location[0] + di, location[1] + dj) in locations]
+        di, dj = moves[rng.randint(len(moves))]
+        location = (location[0] + di, location[1] + dj)
+        step(deltaLocation=transitions[(di, dj)], learn=False)
+        if len(memories[0].getActiveCells()) > 0:
+          numActiveSteps += 1
+
+    self.assertGreater(numActiveSteps, 0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,153 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check TemporalPooler's sparse overlaps against the spatial pooler's dense
+calculation.
+"""
+
+import inspect
+import unittest
+
+import numpy
+
+from nupic.algorithms.spatial_pooler import SpatialPooler
+
+from htmresearch.algorithms.temporal_pooler import TemporalPooler
+
+
+
+REAL_DTYPE = numpy.float32
+
+# TemporalPooler calls _mapPotential with a wrapAround argument, which newer
+# spatial poolers don't take.
+SP_MAPS_WITH_WRAP_AROUND = (
+  "wrapAround" in inspect.getargspec(SpatialPooler._mapPotential).args)
+
+
+
+@unittest.skipUnless(SP_MAPS_WITH_WRAP_AROUND,
+                     "TemporalPooler needs _mapPotential(wrapAround)")
+class TemporalPoolerTest(unittest.TestCase):
+
+  def setUp(self):
+    # A high minPctOverlapDutyCycle and a short duty cycle period make many
+    # columns weak once the minimum duty cycles are first updated, after 50
+    # steps. Then _bumpUpWeakColumns changes their synapses.
+    self.params = dict(inputDimensions=(100, ),
+                       columnDimensions=(40, ),
+                       potentialRadius=100,
+                       potentialPct=0.5,
+                       numActiveColumnsPerInhArea=4,
+                       stimulusThreshold=1,
+                       synPermConnected=0.3,
+                       minPctOverlapDutyCycle=0.9,
+                       dutyCyclePeriod=10,
+                       seed=42)
+    self.rng = numpy.random.RandomState(42)
+
+
+  def _randomInput(self):
+    activeInput = numpy.unique(self.rng.randint(0, 100, 20)).astype("uint32")
+    predictedActiveInput = numpy.sort(self.rng.choice(
+      activeInput, self.rng.randint(len(activeInput)), replace=False))
+    return activeInput, predictedActiveInput
+
+
+  def _dense(self, indices):
+    vector = numpy.zeros(100, dtype=REAL_DTYPE)
+    vector[indices] = 1
+    return vector
+
+
+  def testComputeSparseMatchesCompute(self):
+    densePooler = TemporalPooler(**self.params)
+    sparsePooler = TemporalPooler(**self.params)
+
+    for i in xrange(80):
+      activeInput, predictedActiveInput = self._randomInput()
+      burstingColumns = numpy.zeros(40, dtype=REAL_DTYPE)
+      learn = i < 70
+
+      denseActive = numpy.zeros(40, dtype=REAL_DTYPE)
+      densePooler.compute(self._dense(activeInput), learn, denseActive,
+                          burstingColumns, self._dense(predictedActiveInput))
+      sparseActive = numpy.zeros(40, dtype=REAL_DTYPE)
+      sparsePooler.computeSparse(activeInput, learn, sparseActive,
+                                 burstingColumns, predictedActiveInput)
+
+      numpy.testing.assert_equal(sparseActive, denseActive)
+
+    densePerm = numpy.zeros(100, dtype=REAL_DTYPE)
+    sparsePerm = numpy.zeros(100, dtype=REAL_DTYPE)
+    for column in xrange(40):
+      densePooler.getPermanence(column, densePerm)
+      sparsePooler.getPermanence(column, sparsePerm)
+      numpy.testing.assert_equal(sparsePerm, densePerm)
+
+
+  def testSparseOverlapsMatchSpatialPoolerWhileBumping(self):
+    pooler = TemporalPooler(**self.params)
+
+    connected = numpy.zeros(100, dtype=REAL_DTYPE)
+    potential = numpy.zeros(100, dtype=REAL_DTYPE)
+    bumpedSteps = 0
+    for _ in xrange(80):
+      activeInput, predictedActiveInput = self._randomInput()
+      if numpy.any(pooler._overlapDutyCycles < pooler._minOverlapDutyCycles):
+        bumpedSteps += 1
+      pooler.computeSparse(activeInput, True, numpy.zeros(40, dtype=REAL_DTYPE),
+                           numpy.zeros(40, dtype=REAL_DTYPE),
+                           predictedActiveInput)
+
+      # _updatePermanencesForColumn keeps the copies in sync.
+      for column in xrange(40):
+        pooler.getConnectedSynapses(column, connected)
+        numpy.testing.assert_equal(
+          numpy.flatnonzero(pooler._connectedInputs.getRow(column)),
+          numpy.flatnonzero(connected))
+        pooler.getPotential(column, potential)
+        numpy.testing.assert_equal(
+          numpy.flatnonzero(pooler._potentialInputs.getRow(column)),
+          numpy.flatnonzero(potential))
+
+      testInput, _ = self._randomInput()
+      numpy.testing.assert_equal(
+        pooler._calculateOverlapSparse(testInput),
+        pooler._calculateOverlap(self._dense(testInput)))
+
+    self.assertGreater(bumpedSteps, 0)
+
+
+  def testSetPotentialUpdatesPotentialInputs(self):
+    pooler = TemporalPooler(**self.params)
+
+    potential = numpy.zeros(100, dtype=REAL_DTYPE)
+    potential[:10] = 1
+    pooler.setPotential(3, potential)
+
+    numpy.testing.assert_equal(
+      numpy.flatnonzero(pooler._potentialInputs.getRow(3)), numpy.arange(10))
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,350 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+"""
+Check that the legacy TM in htmresearch/algorithms/TM.py still produces the
+outputs it produced before its segment activity and state handling were
+optimized.
+
+Every step's states, confidences and segments are folded into one SHA-1 digest
+per field. EXPECTED_DIGESTS were recorded by running this workload on the
+original TM.py, and so was EXPECTED_PREDICTIONS_DIGEST, from the output of
+predict after every step. The original global decay indexed segments as lists,
+so EXPECTED_DECAY_DIGESTS were recorded on the original TM.py with only that
+line fixed.
+"""
+
+import copy
+import cPickle as pickle
+import hashlib
+import random
+import sys
+import types
+import unittest
+
+import numpy
+
+try:
+  import nupic.support.consoleprinter
+except ImportError:
+  # TM.py needs nupic.support.consoleprinter, which newer NuPIC releases
+  # don't have. TM.py only uses it to store the verbosity, so stand in for it.
+  class ConsolePrinterMixin(object):
+
+    def __init__(self, verbosity=0):
+      self.consolePrinterVerbosity = verbosity
+
+  consoleprinter = types.ModuleType("nupic.support.consoleprinter")
+  consoleprinter.ConsolePrinterMixin = ConsolePrinterMixin
+  sys.modules["nupic.support.consoleprinter"] = consoleprinter
+
+from htmresearch.algorithms.TM import SegmentArrays, TM
+
+
+
+NUM_COLUMNS = 50
+ACTIVE_COLUMNS = 5
+
+EXPECTED_DIGESTS = {
+  "activeState": "9198458a083742f6ea790821b01502aff4b75c3d",
+  "predictedState": "90abb1a1db86f3c9839c56a19dd7bed8802ae671",
+  "learnState": "8ac7d5b3e9d68768db240afad75c1b40c9c49925",
+  "confidence": "898428e442a5af90a266b60894396faadcd9bb97",
+  "colConfidence": "3c7bdc30754599f1f6920757c91a7df2f1cbeeb7",
+  "segments": "0b98bd478964129476dd598ea593accbb37470bf",
+}
+
+# Segment updates that are still pending aren't pickled, so after a pickle
+# round trip in the middle of a sequence the segments, and the confidences
+# computed from their duty cycles, differ from an uninterrupted run.
+EXPECTED_PICKLED_DIGESTS = dict(
+  EXPECTED_DIGESTS,
+  confidence="545eb2db2e95167b46ffe182a02dbea5788004cf",
+  segments="6caaf15eff338b285dac55bdea57fbb40c6d2b72")
+
+PREDICTION_STEPS = 3
+EXPECTED_PREDICTIONS_DIGEST = "0524f30977dd58fb12fb4986b359c8006e154dad"
+
+# With globalDecay=0.05 and maxAge=3, which removes synapses and segments
+EXPECTED_DECAY_DIGESTS = {
+  "activeState": "9908ff77170012dd96f7317362626ad19a78445a",
+  "predictedState": "e2fee5b5d35bcfc68f1eacc6c863891a36d59481",
+  "learnState": "db98a7db666b0a6c168992090608e60081f7737a",
+  "confidence": "9d680aedc966c7ed35787282c0db756e0396bb7e",
+  "colConfidence": "3c7bdc30754599f1f6920757c91a7df2f1cbeeb7",
+  "segments": "4a3129f663c252018788b936051b05ba5f3cede5",
+}
+EXPECTED_DECAY_PREDICTIONS_DIGEST = "50f010772ab8c58fb0dc47117798fb101533a225"
+
+
+
+class SampleRandom(object):
+  """
+  Draws from Python's random module, so that the expected digests don't
+  depend on the NuPIC release. Implements the methods of nupic's Random that
+  TM.py uses.
+  """
+
+  def __init__(self, seed):
+    self._random = random.Random(seed)
+
+
+  def getUInt32(self, n):
+    return self._random.randrange(n)
+
+
+  def getUInt32Sample(self, population, out, sort):
+    out[:] = sorted(self._random.sample(list(population), len(out)))
+
+
+
+def createTM(globalDecay=0.0, maxAge=1):
+  tm = TM(numberOfCols=NUM_COLUMNS,
+          cellsPerColumn=4,
+          initialPerm=0.5,
+          connectedPerm=0.5,
+          newSynapseCount=5,
+          permanenceInc=0.1,
+          permanenceDec=0.05,
+          activationThreshold=3,
+          minThreshold=2,
+          globalDecay=globalDecay,
+          maxAge=maxAge,
+          seed=42,
+          verbosity=0)
+  tm._random = SampleRandom(42)
+  return tm
+
+
+
+def createSchedule():
+  """
+  @return (list)
+  (input, learn) pairs, where a None input means reset. Three sequences are
+  learned five times each, then inferred together with a random sequence.
+  """
+  rng = numpy.random.RandomState(42)
+
+  def randomSequence():
+    return [numpy.sort(rng.choice(NUM_COLUMNS, ACTIVE_COLUMNS, replace=False))
+            for _ in xrange(6)]
+
+  sequences = [randomSequence() for _ in xrange(3)]
+
+  schedule = []
+  for _ in xrange(5):
+    for sequence in sequences:
+      schedule.extend((activeColumns, True) for activeColumns in sequence)
+      schedule.append((None, True))
+
+  for sequence in sequences + [randomSequence()]:
+    schedule.extend((activeColumns, False) for activeColumns in sequence)
+    schedule.append((None, False))
+
+  return schedule
+
+
+
+def runSchedule(tm, schedule, digests, predictions=None):
+  """
+  @param predictions (hashlib hash or None)
+  If given, predict is called after every step and its output is folded into
+  this digest.
+  """
+  for activeColumns, learn in schedule:
+    if activeColumns is None:
+      tm.reset()
+      continue
+
+    bottomUpInput = numpy.zeros(NUM_COLUMNS, dtype="float32")
+    bottomUpInput[activeColumns] = 1
+    tm.compute(bottomUpInput, enableLearn=learn, computeInfOutput=True)
+    updateDigests(tm, digests)
+
+    if predictions is not None:
+      predictions.update(tm.predict(PREDICTION_STEPS).tostring())
+
+
+
+def updateDigests(tm, digests):
+  for name in ("activeState", "predictedState", "learnState", "confidence",
+               "colConfidence"):
+    digests[name].update(getattr(tm, name)["t"].tostring())
+
+  updateSegmentsDigest(tm, digests["segments"])
+
+
+
+def updateSegmentsDigest(tm, digest):
+  for c in xrange(tm.numberOfCols):
+    for i in xrange(tm.cellsPerColumn):
+      for segment in tm.cells[c][i]:
+        digest.update(repr(
+          (c, i, segment.segID, segment.isSequenceSeg,
+           segment.positiveActivations, segment.totalActivations,
+           segment.lastActiveIteration,
+           [tuple(synapse) for synapse in segment.syns])))
+
+
+
+def assertCellsMatchState(tm):
+  for cells, state in ((tm.activeCells, tm.activeState),
+                       (tm.predictedCells, tm.predictedState),
+                       (tm.learnCells, tm.learnState)):
+    for timeStep in ("t", "t-1"):
+      numpy.testing.assert_equal(cells[timeStep],
+                                 numpy.flatnonzero(state[timeStep]))
+
+
+
+def newDigests():
+  return dict((name, hashlib.sha1()) for name in EXPECTED_DIGESTS)
+
+
+
+class TMRegressionTest(unittest.TestCase):
+
+  def assertDigestsMatch(self, digests, expectedDigests):
+    for name, expected in sorted(expectedDigests.iteritems()):
+      self.assertEqual(digests[name].hexdigest(), expected,
+                       "%s differs from the original TM" % name)
+
+
+  def testMatchesOriginalOutputs(self):
+    digests = newDigests()
+    runSchedule(createTM(), createSchedule(), digests)
+    self.assertDigestsMatch(digests, EXPECTED_DIGESTS)
+
+
+  def testGlobalDecayMatchesOriginalOutputs(self):
+    digests = newDigests()
+    predictions = hashlib.sha1()
+    runSchedule(createTM(globalDecay=0.05, maxAge=3), createSchedule(),
+                digests, predictions)
+
+    self.assertDigestsMatch(digests, EXPECTED_DECAY_DIGESTS)
+    self.assertEqual(predictions.hexdigest(),
+                     EXPECTED_DECAY_PREDICTIONS_DIGEST)
+
+
+  def testSegmentArraysMatchSegments(self):
+    tm = createTM(globalDecay=0.05, maxAge=3)
+    for step in createSchedule():
+      runSchedule(tm, [step], newDigests())
+
+      # The arrays patched after every step must match arrays built from
+      # scratch.
+      expected = SegmentArrays(tm).getAll()
+      actual = tm._segmentArrays.getAll()
+      self.assertEqual(actual[0], expected[0])
+      for actualArray, expectedArray in zip(actual[1:], expected[1:]):
+        numpy.testing.assert_equal(actualArray, expectedArray)
+        self.assertEqual(actualArray.dtype, expectedArray.dtype)
+
+
+  def testPickleMidSequence(self):
+    schedule = createSchedule()
+
+    # Stop in the middle of the third learning pass over the first sequence.
+    split = 2*3*7 + 3
+    self.assertIsNotNone(schedule[split - 1][0])
+    self.assertIsNotNone(schedule[split][0])
+
+    digests = newDigests()
+    tm = createTM()
+    runSchedule(tm, schedule[:split], digests)
+    self.assertGreater(len(tm.segmentUpdates), 0)
+    tm = pickle.loads(pickle.dumps(tm, pickle.HIGHEST_PROTOCOL))
+    runSchedule(tm, schedule[split:], digests)
+
+    self.assertDigestsMatch(digests, EXPECTED_PICKLED_DIGESTS)
+
+
+  def testCellListsMatchStates(self):
+    tm = createTM()
+    for step in createSchedule():
+      runSchedule(tm, [step], newDigests())
+      assertCellsMatchState(tm)
+
+
+  def testPredictMatchesOriginalOutputs(self):
+    digests = newDigests()
+    predictions = hashlib.sha1()
+    runSchedule(createTM(), createSchedule(), digests, predictions)
+
+    # Predicting must not change the TM's outputs either.
+    self.assertDigestsMatch(digests, EXPECTED_DIGESTS)
+    self.assertEqual(predictions.hexdigest(), EXPECTED_PREDICTIONS_DIGEST)
+
+
+  def testPredictLeavesStateUnchanged(self):
+    tm = createTM()
+    for step in createSchedule():
+      runSchedule(tm, [step], newDigests())
+
+      before = tm._getTPDynamicState()
+      colConfidence = copy.deepcopy(tm.colConfidence)
+      segmentsBefore = hashlib.sha1()
+      updateSegmentsDigest(tm, segmentsBefore)
+
+      tm.predict(PREDICTION_STEPS)
+
+      for name, value in before.iteritems():
+        for timeStep in ("t", "t-1"):
+          numpy.testing.assert_equal(getattr(tm, name)[timeStep],
+                                     value[timeStep])
+      for timeStep in ("t", "t-1"):
+        numpy.testing.assert_equal(tm.colConfidence[timeStep],
+                                   colConfidence[timeStep])
+      segmentsAfter = hashlib.sha1()
+      updateSegmentsDigest(tm, segmentsAfter)
+      self.assertEqual(segmentsAfter.hexdigest(), segmentsBefore.hexdigest())
+
+
+  def testUnpickleRebuildsCellLists(self):
+    schedule = createSchedule()
+    split = 2*3*7 + 3
+
+    digests = newDigests()
+    tm = createTM()
+    runSchedule(tm, schedule[:split], digests)
+
+    # Pickles made before the TM kept cell lists don't have them. Load the TM,
+    # then set its state again without them. (Its segments refer to the TM, so
+    # the state can't be pickled on its own.)
+    tm = pickle.loads(pickle.dumps(tm, pickle.HIGHEST_PROTOCOL))
+    state = tm.__getstate__()
+    for name in ("activeCells", "predictedCells", "learnCells"):
+      del state[name]
+      delattr(tm, name)
+    tm.__setstate__(state)
+
+    self.assertGreater(len(tm.activeCells["t"]), 0)
+    self.assertGreater(len(tm.learnCells["t-1"]), 0)
+    assertCellsMatchState(tm)
+
+    runSchedule(tm, schedule[split:], digests)
+    self.assertDigestsMatch(digests, EXPECTED_PICKLED_DIGESTS)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
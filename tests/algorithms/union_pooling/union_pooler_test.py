@@ -20,6 +20,7 @@
 # ----------------------------------------------------------------------
 
 
+import hashlib
 import unittest
 
 import numpy
@@ -30,6 +31,72 @@ from htmresearch.algorithms.union_temporal_pooler import UnionTemporalPooler
 
 REAL_DTYPE = numpy.float32
 
+# Digests of the union SDR and of every column's permanences after each step
+# of runDigestWorkload, recorded by running it on the original
+# UnionTemporalPooler, whose compute took dense vectors, adapted synapses over
+# every input and rolled a dense history of predicted inputs.
+EXPECTED_UNION_SDRS_DIGEST = "e8ba17d2d742fe79858708240c21cb03f6e294ac"
+EXPECTED_PERMANENCES_DIGEST = "622867dfa92dffec2a87c62c13d1f230281c5378"
+
+
+
+def runDigestWorkload(sparse):
+  """
+  Learn on random inputs, then infer. A high minPctOverlapDutyCycle and a
+  short duty cycle period make many columns weak once the minimum duty cycles
+  are first updated, after 50 steps, so _bumpUpWeakColumns changes their
+  synapses.
+
+  @param sparse (bool)
+  Whether to call computeSparse rather than compute
+
+  @return (tuple)
+  SHA-1 digests of the union SDRs and of the permanences
+  """
+  pooler = UnionTemporalPooler(inputDimensions=(100, ),
+                               columnDimensions=(40, ),
+                               potentialPct=0.5,
+                               globalInhibition=True,
+                               numActiveColumnsPerInhArea=4.0,
+                               stimulusThreshold=1,
+                               synPermConnected=0.3,
+                               minPctOverlapDutyCycle=0.9,
+                               dutyCyclePeriod=10,
+                               seed=42,
+                               activeOverlapWeight=1.0,
+                               predictedActiveOverlapWeight=10.0,
+                               synPermPredActiveInc=0.02,
+                               synPermPreviousPredActiveInc=0.01,
+                               historyLength=3)
+
+  unionSDRs = hashlib.sha1()
+  permanences = hashlib.sha1()
+  perm = numpy.zeros(100, dtype=REAL_DTYPE)
+  rng = numpy.random.RandomState(42)
+  for i in xrange(100):
+    activeInput = numpy.unique(rng.randint(0, 100, 20)).astype("uint32")
+    predictedActiveInput = numpy.sort(rng.choice(
+      activeInput, rng.randint(len(activeInput)), replace=False))
+    learn = i < 70
+
+    if sparse:
+      unionSDR = pooler.computeSparse(activeInput, predictedActiveInput, learn)
+    else:
+      # The original compute passed the dense input to the C++ spatial
+      # pooler's _calculateOverlap, which reads it as uint32.
+      activeVector = numpy.zeros(100, dtype="uint32")
+      activeVector[activeInput] = 1
+      predictedActiveVector = numpy.zeros(100, dtype="uint32")
+      predictedActiveVector[predictedActiveInput] = 1
+      unionSDR = pooler.compute(activeVector, predictedActiveVector, learn)
+
+    unionSDRs.update(numpy.sort(unionSDR).astype("uint32").tostring())
+    for column in xrange(40):
+      pooler.getPermanence(column, perm)
+      permanences.update(perm.tostring())
+
+  return unionSDRs, permanences
+
 
 
 class UnionTemporalPoolerTest(unittest.TestCase):
@@ -124,5 +191,135 @@ class UnionTemporalPoolerTest(unittest.TestCase):
     self.assertEquals(result[1], 4)
 
 
+  def testGetMostActiveCellsMatchesFullSort(self):
+    rng = numpy.random.RandomState(42)
+    self.unionTemporalPooler._maxUnionCells = 2
+
+    for _ in xrange(20):
+      poolingActivation = (rng.randint(0, 4, 5) *
+                           rng.randint(0, 2, 5)).astype(REAL_DTYPE)
+      self.unionTemporalPooler._poolingActivation = poolingActivation
+
+      nonZeroCells = numpy.flatnonzero(poolingActivation)
+      order = numpy.argsort(
+        poolingActivation[nonZeroCells] +
+        self.unionTemporalPooler._poolingActivation_tieBreaker[nonZeroCells])
+      expected = sorted(nonZeroCells[order[::-1]][:2])
+
+      result = self.unionTemporalPooler._getMostActiveCells()
+      self.assertEqual(list(result), expected)
+
+
+  def testMaxPoolingTimer(self):
+    self.unionTemporalPooler._poolingTimer = numpy.array([3, 0, 7, 7, 1],
+                                                         dtype=REAL_DTYPE)
+    self.unionTemporalPooler._maxPoolingTimer = 7
+    overlaps = numpy.zeros(5)
+
+    self.unionTemporalPooler._addToPoolingActivation(numpy.array([1]),
+                                                     overlaps)
+    self.assertEqual(self.unionTemporalPooler._maxPoolingTimer, 8)
+
+    self.unionTemporalPooler._addToPoolingActivation(numpy.array([2]),
+                                                     overlaps)
+    self.assertEqual(self.unionTemporalPooler._maxPoolingTimer, 9)
+
+    self.unionTemporalPooler._addToPoolingActivation(numpy.array([3, 4]),
+                                                     overlaps)
+    self.assertEqual(self.unionTemporalPooler._maxPoolingTimer, 6)
+
+
+  def testPredictedInputHistory(self):
+    # Resize the history by hand. reset() also resets the spatial pooler's
+    # duty cycles, which isn't possible with the current spatial pooler.
+    self.unionTemporalPooler._historyLength = 2
+    self.unionTemporalPooler._prePredictedActiveInput = [
+      numpy.array([], dtype="uint32") for _ in xrange(2)]
+    self.unionTemporalPooler._historyIndex = 0
+
+    predictedInputs = [numpy.array([1, 0, 0, 1, 0]),
+                       numpy.array([0, 1, 0, 0, 0]),
+                       numpy.array([0, 0, 1, 1, 1])]
+    for predictedInput in predictedInputs:
+      self.unionTemporalPooler.compute(numpy.ones(5), predictedInput,
+                                       learn=False)
+
+    history = sorted(indices.tolist() for indices in
+                     self.unionTemporalPooler._prePredictedActiveInput)
+    self.assertEquals(history, [[1], [2, 3, 4]])
+
+
+  def testAdaptSynapsesToPreviousInput(self):
+    self.unionTemporalPooler._historyLength = 3
+    self.unionTemporalPooler._synPermPreviousPredActiveInc = 0.05
+    self.unionTemporalPooler._prePredictedActiveInput = [
+      numpy.array([0, 1], dtype="uint32"),
+      numpy.array([1, 2], dtype="uint32"),
+      numpy.array([], dtype="uint32")]
+
+    potential = numpy.zeros(5, dtype=REAL_DTYPE)
+    self.unionTemporalPooler.getPotential(3, potential)
+    perm = numpy.zeros(5, dtype=REAL_DTYPE)
+    self.unionTemporalPooler.getPermanence(3, perm)
+
+    expected = perm + numpy.array([0.05, 0.1, 0.05, 0.0, 0.0]) * (potential > 0)
+    expected = numpy.clip(expected, 0.0, 1.0)
+
+    self.unionTemporalPooler._adaptSynapsesToPreviousInput(numpy.array([3]))
+    self.unionTemporalPooler.getPermanence(3, perm)
+    self.assertTrue(numpy.allclose(expected, perm))
+
+
+  def testComputeMatchesOriginalOutputs(self):
+    for sparse in (False, True):
+      unionSDRs, permanences = runDigestWorkload(sparse)
+      self.assertEqual(unionSDRs.hexdigest(), EXPECTED_UNION_SDRS_DIGEST)
+      self.assertEqual(permanences.hexdigest(), EXPECTED_PERMANENCES_DIGEST)
+
+
+  def testSparseOverlapsMatchSpatialPoolerWhileBumping(self):
+    # A high minPctOverlapDutyCycle and a short duty cycle period make many
+    # columns weak once the minimum duty cycles are first updated, after 50
+    # steps. Then _bumpUpWeakColumns changes their synapses.
+    pooler = UnionTemporalPooler(inputDimensions=(100, ),
+                                 columnDimensions=(40, ),
+                                 potentialPct=0.5,
+                                 globalInhibition=True,
+                                 numActiveColumnsPerInhArea=4.0,
+                                 stimulusThreshold=1,
+                                 synPermConnected=0.3,
+                                 minPctOverlapDutyCycle=0.9,
+                                 dutyCyclePeriod=10,
+                                 seed=42,
+                                 synPermPredActiveInc=0.02,
+                                 synPermPreviousPredActiveInc=0.01,
+                                 historyLength=3)
+
+    rng = numpy.random.RandomState(42)
+    connected = numpy.zeros(100, dtype="uint32")
+    bumpedSteps = 0
+    for _ in xrange(80):
+      activeInput = numpy.unique(rng.randint(0, 100, 20)).astype("uint32")
+      predictedActiveInput = numpy.sort(rng.choice(
+        activeInput, rng.randint(len(activeInput)), replace=False))
+      if len(pooler._getWeakColumns()) > 0:
+        bumpedSteps += 1
+      pooler.computeSparse(activeInput, predictedActiveInput, learn=True)
+
+      for column in xrange(40):
+        pooler.getConnectedSynapses(column, connected)
+        numpy.testing.assert_equal(
+          numpy.flatnonzero(pooler._connectedInputs.getRow(column)),
+          numpy.flatnonzero(connected))
+
+      testInput = numpy.unique(rng.randint(0, 100, 20)).astype("uint32")
+      testVector = numpy.zeros(100, dtype="uint32")
+      testVector[testInput] = 1
+      numpy.testing.assert_equal(pooler._calculateOverlapSparse(testInput),
+                                 pooler._calculateOverlap(testVector))
+
+    self.assertGreater(bumpedSteps, 0)
+
+
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,127 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+
+"""
+Check FrozenConnections against SparseMatrixConnections.computeActivity, built
+from the connections and from a checkpoint of them.
+"""
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from nupic.bindings.math import SparseMatrixConnections
+
+from htmresearch.support import connections_checkpoint
+from htmresearch.support.frozen_connections import FrozenConnections
+
+
+
+CELL_COUNT = 200
+INPUT_COUNT = 400
+CONNECTED_PERMANENCE = 0.5
+
+
+
+class FrozenConnectionsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = np.random.RandomState(42)
+
+    self.connections = SparseMatrixConnections(CELL_COUNT, INPUT_COUNT)
+    segments = self.connections.createSegments(
+      self.rng.randint(0, CELL_COUNT, 500).astype("uint32"))
+
+    for segment in segments:
+      presynapticInputs = np.sort(self.rng.choice(
+        INPUT_COUNT, 20, replace=False)).astype("uint32")
+      self.connections.growSynapses(np.array([segment], dtype="uint32"),
+                                    presynapticInputs, 0.3)
+
+      # Some synapses are exactly at the connected permanence.
+      permanences = self.rng.choice([0.3, 0.49, CONNECTED_PERMANENCE, 0.8],
+                                    len(presynapticInputs))
+      for presynapticInput, permanence in zip(presynapticInputs, permanences):
+        self.connections.matrix.set(int(segment), int(presynapticInput),
+                                    permanence)
+
+    # Leave some segments without synapses.
+    self.connections.createSegments(
+      self.rng.randint(0, CELL_COUNT, 10).astype("uint32"))
+
+    self.directory = tempfile.mkdtemp()
+
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+
+  def assertMatchesConnections(self, frozenConnections):
+    for _ in xrange(20):
+      activeInput = np.sort(self.rng.choice(INPUT_COUNT, 40,
+                                            replace=False)).astype("uint32")
+      expectedOverlaps = self.connections.computeActivity(
+        activeInput, CONNECTED_PERMANENCE)
+
+      segments, overlaps = frozenConnections.computeActivity(activeInput)
+      np.testing.assert_equal(segments, np.flatnonzero(expectedOverlaps))
+      np.testing.assert_equal(overlaps, expectedOverlaps[segments])
+
+
+  def testMatchesConnections(self):
+    self.assertMatchesConnections(
+      FrozenConnections(self.connections, CONNECTED_PERMANENCE))
+
+
+  def testMatchesCheckpoint(self):
+    frozenConnections = FrozenConnections(self.connections,
+                                          CONNECTED_PERMANENCE)
+
+    connections_checkpoint.saveConnections(self.connections, CELL_COUNT,
+                                           self.directory, "connections")
+    checkpoint = connections_checkpoint.loadConnections(self.directory,
+                                                        "connections")
+    frozenCheckpoint = FrozenConnections(checkpoint, CONNECTED_PERMANENCE)
+
+    np.testing.assert_equal(frozenCheckpoint.segments,
+                            frozenConnections.segments)
+    np.testing.assert_equal(frozenCheckpoint.inputStarts,
+                            frozenConnections.inputStarts)
+    self.assertMatchesConnections(frozenCheckpoint)
+
+
+  def testNoSegments(self):
+    frozenConnections = FrozenConnections(
+      SparseMatrixConnections(CELL_COUNT, INPUT_COUNT), CONNECTED_PERMANENCE)
+
+    segments, overlaps = frozenConnections.computeActivity(
+      np.arange(10, dtype="uint32"))
+    self.assertEqual(len(segments), 0)
+    self.assertEqual(len(overlaps), 0)
+
+
+
+if __name__ == "__main__":
+  unittest.main()
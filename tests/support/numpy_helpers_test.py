@@ -0,0 +1,131 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+
+"""
+Check that BitmapSetOperations matches the sort-based numpy_helpers functions.
+"""
+
+import unittest
+
+import numpy as np
+
+from htmresearch.support import numpy_helpers as np2
+
+
+
+class BitmapSetOperationsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = np.random.RandomState(42)
+    self.ops = np2.BitmapSetOperations(1000)
+
+
+  def testSetCompare(self):
+    for _ in xrange(500):
+      a = np.unique(self.rng.randint(0, 1000, self.rng.randint(0, 60)))
+      b = np.unique(self.rng.randint(0, 300, self.rng.randint(0, 30)))
+      aKey = a / 3
+
+      for leftMinusRight in (False, True):
+        for rightMinusLeft in (False, True):
+          expected = np2.setCompare(a, b, aKey,
+                                    leftMinusRight=leftMinusRight,
+                                    rightMinusLeft=rightMinusLeft)
+          actual = self.ops.setCompare(a, b, aKey,
+                                       leftMinusRight=leftMinusRight,
+                                       rightMinusLeft=rightMinusLeft)
+          np.testing.assert_equal(actual, expected)
+
+    self.assertFalse(self.ops._marked.any())
+
+
+  def testSetCompareEmpty(self):
+    a = np.array([1, 5, 7], dtype="uint32")
+    np.testing.assert_equal(self.ops.setCompare(a, np.asarray(()),
+                                                rightMinusLeft=True),
+                            (np.empty(0, dtype="uint32"), np.empty(0)))
+
+
+  def testArgmaxMulti(self):
+    for _ in xrange(500):
+      n = self.rng.randint(1, 60)
+      a = self.rng.randint(0, 5, n).astype("int32")
+      groupKeys = self.rng.randint(0, 40, n).astype("uint32")
+
+      np.testing.assert_equal(self.ops.argmaxMulti(a, groupKeys),
+                              np2.argmaxMulti(a, groupKeys))
+
+      groupKeys.sort()
+      np.testing.assert_equal(
+        self.ops.argmaxMulti(a, groupKeys, assumeSorted=True),
+        np2.argmaxMulti(a, groupKeys, assumeSorted=True))
+
+    self.assertTrue((self.ops._groupWinner == -1).all())
+
+
+  def testArgmaxMultiFirstOccurrenceWins(self):
+    np.testing.assert_equal(
+      self.ops.argmaxMulti(np.array([5, 4, 7, 2, 9, 8, 7, 9]),
+                           np.array([0, 0, 0, 1, 1, 1, 0, 1])),
+      [2, 4])
+
+
+  def testCreateSetOperations(self):
+    self.assertIsInstance(np2.createSetOperations(2048*32),
+                          np2.BitmapSetOperations)
+    self.assertIsInstance(np2.createSetOperations(np2.MAX_BITMAP_DOMAIN + 1),
+                          np2.SortSetOperations)
+
+
+
+
+class ArgminRowsTest(unittest.TestCase):
+
+  def testMatchesUniqueBasedTiebreak(self):
+    rng = np.random.RandomState(42)
+    for _ in xrange(200):
+      a = rng.randint(0, 3, (rng.randint(0, 30), 8))
+      offsetPercents = rng.rand(len(a)).astype("float32")
+
+      # Choose from the flattened minimums, like the temporal memories used to.
+      isMin = a == a.min(axis=1, keepdims=True)
+      minIndices = np.flatnonzero(isMin)
+      _, starts, counts = np.unique(minIndices // 8, return_index=True,
+                                    return_counts=True)
+      np.add(starts, offsetPercents*counts, out=starts, casting="unsafe")
+
+      np.testing.assert_equal(np2.argminRows(a, offsetPercents),
+                              minIndices[starts] % 8)
+
+
+  def testExample(self):
+    np.testing.assert_equal(
+      np2.argminRows(np.array([[3, 1, 1, 2],
+                               [0, 5, 0, 0]]),
+                     np.array([0.75, 0.5], dtype="float32")),
+      [2, 2])
+
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,203 @@
+# ----------------------------------------------------------------------
+# Numenta Platform for Intelligent Computing (NuPIC)
+# Copyright (C) 2017, Numenta, Inc.  Unless you have an agreement
+# with Numenta, Inc., for a separate license for this software code, the
+# following terms and conditions apply:
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU Affero Public License for more details.
+#
+# You should have received a copy of the GNU Affero Public License
+# along with this program.  If not, see http://www.gnu.org/licenses.
+#
+# http://numenta.org/licenses/
+# ----------------------------------------------------------------------
+
+
+
+"""
+Check the segment_activity functions against computing the connected and
+potential overlaps with two SparseMatrixConnections.computeActivity calls.
+"""
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from nupic.bindings.math import SparseMatrixConnections
+
+from htmresearch.support import connections_checkpoint
+from htmresearch.support import segment_activity
+
+
+
+CELL_COUNT = 200
+INPUT_COUNT = 400
+CONNECTED_PERMANENCE = 0.5
+
+
+
+class SegmentActivityTest(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = np.random.RandomState(42)
+
+
+  def createConnections(self, segmentCount, synapsesPerSegment):
+    connections = SparseMatrixConnections(CELL_COUNT, INPUT_COUNT)
+    segments = connections.createSegments(
+      self.rng.randint(0, CELL_COUNT, segmentCount).astype("uint32"))
+
+    for segment in segments:
+      presynapticInputs = np.sort(self.rng.choice(
+        INPUT_COUNT, synapsesPerSegment, replace=False)).astype("uint32")
+      connections.growSynapses(np.array([segment], dtype="uint32"),
+                               presynapticInputs, 0.3)
+
+      # Half of the synapses start out connected. Some are exactly at the
+      # connected permanence.
+      permanences = self.rng.choice([0.3, 0.49, CONNECTED_PERMANENCE, 0.8],
+                                    synapsesPerSegment)
+      for presynapticInput, permanence in zip(presynapticInputs, permanences):
+        connections.matrix.set(int(segment), int(presynapticInput),
+                               permanence)
+
+    return connections
+
+
+  def randomInput(self, activeCount):
+    return np.sort(self.rng.choice(INPUT_COUNT, activeCount,
+                                   replace=False)).astype("uint32")
+
+
+  def assertMatchesTwoPasses(self, connections, activeInput,
+                             activationThreshold):
+    expectedOverlaps = connections.computeActivity(activeInput,
+                                                   CONNECTED_PERMANENCE)
+    expectedPotentialOverlaps = connections.computeActivity(activeInput)
+
+    (overlaps,
+     potentialOverlaps) = segment_activity.computeSegmentActivity(
+       connections, activeInput, CONNECTED_PERMANENCE, activationThreshold)
+
+    np.testing.assert_equal(potentialOverlaps, expectedPotentialOverlaps)
+
+    # Connected overlaps are exact wherever they can reach the threshold,
+    # and may be 0 elsewhere.
+    canBeActive = expectedPotentialOverlaps >= activationThreshold
+    np.testing.assert_equal(overlaps[canBeActive],
+                            expectedOverlaps[canBeActive])
+    self.assertTrue(np.all((overlaps == expectedOverlaps) | (overlaps == 0)))
+
+    return canBeActive
+
+
+  def testCandidatePath(self):
+    connections = self.createConnections(300, 20)
+
+    for _ in xrange(20):
+      canBeActive = self.assertMatchesTwoPasses(connections,
+                                                self.randomInput(100), 8)
+      self.assertLessEqual(np.count_nonzero(canBeActive),
+                           segment_activity.MAX_ROW_LOOKUPS)
+
+
+  def testManyCandidatesFallBackToFullPass(self):
+    connections = self.createConnections(600, 20)
+
+    # Nearly every segment can reach a threshold of 1.
+    canBeActive = self.assertMatchesTwoPasses(connections,
+                                              self.randomInput(300), 1)
+    self.assertGreater(np.count_nonzero(canBeActive),
+                       segment_activity.MAX_ROW_LOOKUPS)
+
+
+  def testEmptyInput(self):
+    connections = self.createConnections(50, 20)
+    activeInput = np.array([], dtype="uint32")
+
+    (overlaps,
+     potentialOverlaps) = segment_activity.computeSegmentActivity(
+       connections, activeInput, CONNECTED_PERMANENCE, 0)
+
+    np.testing.assert_equal(overlaps, np.zeros(50))
+    np.testing.assert_equal(potentialOverlaps, np.zeros(50))
+
+
+  def testPermanencesAtConnectedPermanence(self):
+    connections = SparseMatrixConnections(CELL_COUNT, INPUT_COUNT)
+    segments = connections.createSegments(np.array([0, 1], dtype="uint32"))
+    activeInput = np.arange(10, dtype="uint32")
+    connections.growSynapses(segments[:1], activeInput, CONNECTED_PERMANENCE)
+    connections.growSynapses(segments[1:], activeInput,
+                             np.nextafter(np.float32(CONNECTED_PERMANENCE),
+                                          np.float32(0)))
+
+    (overlaps,
+     potentialOverlaps) = segment_activity.computeSegmentActivity(
+       connections, activeInput, CONNECTED_PERMANENCE, 5)
+
+    np.testing.assert_equal(overlaps, [10, 0])
+    np.testing.assert_equal(potentialOverlaps, [10, 10])
+    self.assertMatchesTwoPasses(connections, activeInput, 5)
+
+
+  def testCandidateSegmentActivity(self):
+    connections = self.createConnections(300, 20)
+
+    for candidateCount in (0, 10, segment_activity.MAX_ROW_LOOKUPS + 1):
+      activeInput = self.randomInput(100)
+      candidates = np.sort(self.rng.choice(300, candidateCount,
+                                           replace=False))
+
+      (overlaps,
+       potentialOverlaps) = segment_activity.computeCandidateSegmentActivity(
+         connections, activeInput, CONNECTED_PERMANENCE, candidates)
+
+      np.testing.assert_equal(
+        overlaps[candidates],
+        connections.computeActivity(activeInput,
+                                    CONNECTED_PERMANENCE)[candidates])
+      np.testing.assert_equal(
+        potentialOverlaps[candidates],
+        connections.computeActivity(activeInput)[candidates])
+
+
+  def testCheckpointConnections(self):
+    connections = self.createConnections(300, 20)
+
+    directory = tempfile.mkdtemp()
+    try:
+      connections_checkpoint.saveConnections(connections, CELL_COUNT,
+                                             directory, "connections")
+      checkpoint = connections_checkpoint.loadConnections(directory,
+                                                          "connections")
+
+      activeInput = self.randomInput(100)
+      expected = (connections.computeActivity(activeInput,
+                                              CONNECTED_PERMANENCE),
+                  connections.computeActivity(activeInput))
+      candidates = np.arange(10)
+
+      for actual in (segment_activity.computeSegmentActivity(
+                       checkpoint, activeInput, CONNECTED_PERMANENCE, 5),
+                     segment_activity.computeCandidateSegmentActivity(
+                       checkpoint, activeInput, CONNECTED_PERMANENCE,
+                       candidates)):
+        for actualOverlaps, expectedOverlaps in zip(actual, expected):
+          np.testing.assert_equal(actualOverlaps, expectedOverlaps)
+    finally:
+      shutil.rmtree(directory)
+
+
+
+if __name__ == "__main__":
+  unittest.main()